@@ -1,16 +1,91 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+PieceStats = namedtuple('PieceStats', ['name', 'symbol', 'health', 'attack_name', 'attack_damage',
+                                       'special_name', 'special_damage', 'special_uses'])
+
+# Stats shared by every piece of a type live in a data file next to this module.
+# Pieces only store what changes during a game.
+PIECE_STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pieces.json')
+
+
+def load_piece_stats(path=PIECE_STATS_FILE):
+    """
+    Read a table of piece stats from a JSON file that maps each piece name to its
+    symbol, health, attack_name, attack_damage, special_name, special_damage and special_uses.
+
+    :param path: The file to read.
+    :return: A dictionary mapping piece names to PieceStats.
+    """
+    with open(path) as file:
+        entries = json.load(file)
+    piece_stats = {}
+    for name in ('King', 'Rook', 'Bishop', 'Queen', 'Knight', 'Pawn'):
+        if name not in entries:
+            raise ValueError(f"{path} has no stats for the {name}")
+        fields = entries[name]
+        missing = [field for field in PieceStats._fields[1:] if field not in fields]
+        if missing:
+            raise ValueError(f"{path} is missing {', '.join(missing)} for the {name}")
+        piece_stats[name] = validate_piece_stats(PieceStats(name, *(fields[field] for field in PieceStats._fields[1:])),
+                                                 path)
+    return piece_stats
+
+
+def validate_piece_stats(stats, source):
+    """
+    Check that a piece's stats make a playable piece: whole, non-negative numbers, some
+    health and attacks that do damage, so every battle ends.
+
+    :param stats: The PieceStats.
+    :param source: Where the stats came from, for the error message.
+    :return: The stats.
+    """
+    numbers = (stats.health, stats.attack_damage, stats.special_damage, stats.special_uses)
+    if not all(isinstance(value, int) and value >= 0 for value in numbers):
+        raise ValueError(f"{source} has a health, damage or uses value for the {stats.name} that is not a whole number")
+    if stats.health == 0 or stats.attack_damage == 0 or stats.special_damage == 0:
+        raise ValueError(f"{source} gives the {stats.name} no health or an attack that does no damage")
+    return stats
+
+
+PIECE_STATS = load_piece_stats()
+
+# Rows and columns of the board. The engine is fixed at this size: its move tables,
+# MoveCache, bitboards and Zobrist keys all assume 64 squares, so this is not a setting.
+# Square names take a size so the larger boards of variants.py share the notation.
+BOARD_SIZE = 8
+
+# Material value of each piece type, used when weighing positions
+MATERIAL_VALUES = {'King': 0, 'Queen': 900, 'Rook': 500, 'Bishop': 330, 'Knight': 320, 'Pawn': 100}
+
+
 class ChessPiece:
-   def __init__(self, color, name, health):
+   __slots__ = ('color', 'health', 'special_uses')
+
+   def __init__(self, color):
        """
-       Initialize a chess piece with its color, name, and health.
+       Initialize a chess piece of the given color with full health and all of its special attack uses.
 
        :param color: The color of the chess piece ('white' or 'black').
-       :param name: The name of the chess piece.
-       :param health: The health points of the chess piece.
        """
        self.color = color
-       self.name = name
-       self.health = health
-       self.special_attack_uses = {}
+       self.health = self.stats.health
+       self.special_uses = self.stats.special_uses
+
+   @property
+   def symbol(self):
+       """
+       Return the board symbol of the piece: upper case for white, lower case for black.
+       """
+       return self.symbols[self.color]
 
    def decrease_health(self, damage):
        """
@@ -20,6 +95,20 @@ class ChessPiece:
        """
        self.health -= damage
 
+   @property
+   def basic_attack(self):
+       """
+       Return the name and damage of the piece's regular attack.
+       """
+       return self.stats.attack_name, self.stats.attack_damage
+
+   @property
+   def special_attack(self):
+       """
+       Return the name and damage of the piece's special attack.
+       """
+       return self.stats.special_name, self.stats.special_damage
+
    def __str__(self):
        """
        Return the symbol representing the chess piece when converted to a string.
@@ -35,7 +124,31 @@ class ChessPiece:
        :param board: The chess board as a 2D list.
        :return: A list of valid moves as (row, col) tuples.
        """
-       return []
+       return list(self.iter_moves(row, col, board))
+
+   def iter_moves(self, row, col, board):
+       """
+       Yield the valid moves of the chess piece one at a time, so callers can stop early.
+
+       :param row: The row index of the chess piece on the board.
+       :param col: The column index of the chess piece on the board.
+       :param board: The chess board as a 2D list.
+       :return: An iterator over (row, col) tuples.
+       """
+       return iter(())
+
+   def can_reach(self, row, col, end_row, end_col, board):
+       """
+       Check whether (end_row, end_col) is among the piece's valid moves without building the move list.
+
+       :param row: The row index of the chess piece on the board.
+       :param col: The column index of the chess piece on the board.
+       :param end_row: The row index of the destination.
+       :param end_col: The column index of the destination.
+       :param board: The chess board as a 2D list.
+       :return: True if the destination is a valid move, False otherwise.
+       """
+       return (end_row, end_col) in self.iter_moves(row, col, board)
 
    def attack(self, target_piece, attack_name):
        """
@@ -43,224 +156,230 @@ class ChessPiece:
 
        :param target_piece: The target chess piece to be attacked.
        :param attack_name: The name of the attack to be used.
-       :return: True if the attack was successful, False otherwise.
+       :return: True if the target piece was defeated, False otherwise.
        """
-       if attack_name in self.attacks:
-           if attack_name in self.special_attack_uses and self.special_attack_uses[attack_name] > 0:
-               damage = self.attacks[attack_name]
-               target_piece.health -= damage
-               self.special_attack_uses[attack_name] -= 1
-
-               if target_piece.health <= 0:
-                   return True
-               else:
-                   return False
-           elif attack_name not in self.special_attack_uses:
-               print(f"{self.name} doesn't have information on attack: {attack_name}")
-               return False
-           else:
-               if self.special_attack_uses[attack_name] <= 0:
-                   print(f"{self.name} has used up all special attack uses for {attack_name}.")
-               else:
-                   print(f"{self.name} doesn't have any remaining uses of {attack_name}.")
+       if attack_name == self.stats.attack_name:
+           damage = self.stats.attack_damage
+       elif attack_name == self.stats.special_name:
+           if self.special_uses <= 0:
+               print(f"{self.name} has used up all special attack uses for {attack_name}.")
                return False
+           damage = self.stats.special_damage
+           self.special_uses -= 1
        else:
            print(f"{self.name} doesn't know the attack: {attack_name}")
            return False
 
+       target_piece.health = max(target_piece.health - damage, 0)
+       return target_piece.health <= 0
+
+
+def piece_stats_digest():
+    """
+    Return a 64-bit digest of the piece stats installed now. Files whose contents depend on
+    the stats (game records, opening books) store it, so they are not read with other stats.
+    """
+    stats = {piece_class.__name__: list(piece_class.stats) for piece_class in PIECE_TYPES}
+    digest = hashlib.blake2b(json.dumps(stats, sort_keys=True).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def apply_piece_stats(piece_stats):
+    """
+    Install a table of PieceStats on the piece classes. Pieces created afterwards
+    start with the new health and special attack uses.
+
+    :param piece_stats: A dictionary mapping piece names to PieceStats.
+    """
+    for piece_class in PIECE_TYPES:
+        stats = piece_stats[piece_class.__name__]
+        piece_class.stats = stats
+        piece_class.name = stats.name
+        piece_class.symbols = {'white': stats.symbol.upper(), 'black': stats.symbol.lower()}
+        piece_class.attacks = MappingProxyType({stats.attack_name: stats.attack_damage})
+        piece_class.special_attacks = MappingProxyType({
+            stats.special_name: MappingProxyType({'damage': stats.special_damage, 'uses': stats.special_uses})
+        })
+
+
+def _build_jump_table(offsets):
+    """
+    Precompute, for every square, the on-board squares reached by the given offsets.
+
+    :param offsets: A list of (row, col) offsets, in the order moves are generated.
+    :return: An 8x8 table of tuples of (row, col) squares.
+    """
+    return [[tuple((row + dr, col + dc) for dr, dc in offsets if 0 <= row + dr < 8 and 0 <= col + dc < 8)
+             for col in range(8)] for row in range(8)]
+
+
+def _build_ray_table(dr, dc):
+    """
+    Precompute, for every square, the squares along one direction up to the board edge.
+
+    :return: An 8x8 table of tuples of (row, col) squares, nearest first.
+    """
+    return [[tuple((row + i * dr, col + i * dc) for i in range(1, 8)
+                   if 0 <= row + i * dr < 8 and 0 <= col + i * dc < 8)
+             for col in range(8)] for row in range(8)]
+
+
+# Offsets of the jumping moves; the King's table includes its own square, which move lists drop
+KING_OFFSETS = [(i, j) for i in [-1, 0, 1] for j in [-1, 0, 1]]
+KNIGHT_OFFSETS = [(2, 1), (1, 2), (-2, 1), (1, -2), (2, -1), (-1, 2), (-2, -1), (-1, -2)]
+PAWN_STEP_OFFSETS = [(-1, 0), (1, 0)]
+PAWN_CAPTURE_OFFSETS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+KING_JUMPS = _build_jump_table(KING_OFFSETS)
+KNIGHT_JUMPS = _build_jump_table(KNIGHT_OFFSETS)
+PAWN_STEPS = _build_jump_table(PAWN_STEP_OFFSETS)
+PAWN_CAPTURES = _build_jump_table(PAWN_CAPTURE_OFFSETS)
+KING_JUMP_SETS = [[frozenset(squares) for squares in row] for row in KING_JUMPS]
+KNIGHT_JUMP_SETS = [[frozenset(squares) for squares in row] for row in KNIGHT_JUMPS]
+
+ORTHOGONAL_DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+DIAGONAL_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+RAYS = {direction: _build_ray_table(*direction) for direction in ORTHOGONAL_DIRECTIONS + DIAGONAL_DIRECTIONS}
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+def slide_moves(piece, row, col, board, directions):
+    """
+    Yield the squares a sliding piece reaches along each direction, stopping at
+    the first piece in the way (which is included if it belongs to the opponent).
+    """
+    for direction in directions:
+        for new_row, new_col in RAYS[direction][row][col]:
+            target = board[new_row][new_col]
+            if target is None:
+                yield new_row, new_col
+            elif target.color != piece.color:
+                yield new_row, new_col
+                break
+            else:
+                break
+
+
+def slide_reaches(piece, row, col, end_row, end_col, board, diagonal):
+    """
+    Check whether a sliding piece reaches (end_row, end_col) by walking only the one
+    ray that leads there.
+
+    :param diagonal: True to follow diagonal rays, False for ranks and files.
+    """
+    d_row, d_col = end_row - row, end_col - col
+    if diagonal:
+        if d_row == 0 or abs(d_row) != abs(d_col):
+            return False
+    elif (d_row == 0) == (d_col == 0):
+        return False
+
+    for new_row, new_col in RAYS[(_sign(d_row), _sign(d_col))][row][col]:
+        target = board[new_row][new_col]
+        if (new_row, new_col) == (end_row, end_col):
+            return target is None or target.color != piece.color
+        if target is not None:
+            return False
+    return False
+
 
 class King(ChessPiece):
-   def __init__(self, color):
-       super().__init__(color, 'King', health=150)
-       self.symbol = 'K' if color == 'white' else 'k'
-       self.attacks = {
-           'Strike': 30,
-       }
-       self.special_attacks = {
-           'Royal Smash': {
-               'damage': 60,
-               'uses': 3
-           }
-       }
+   __slots__ = ()
 
-   def __str__(self):
-       return self.symbol
+   def iter_moves(self, row, col, board):
+       return iter(KING_JUMPS[row][col])
 
-   def valid_moves(self, row, col, board):
-       moves = []
-       for i in [-1, 0, 1]:
-           for j in [-1, 0, 1]:
-               new_row = row + i
-               new_col = col + j
-               if 0 <= new_row < 8 and 0 <= new_col < 8:
-                   moves.append((new_row, new_col))
-       return moves
+   def can_reach(self, row, col, end_row, end_col, board):
+       return (end_row, end_col) in KING_JUMP_SETS[row][col]
 
 
 class Rook(ChessPiece):
-   def __init__(self, color):
-       super().__init__(color, 'Rook', health=200)
-       self.symbol = 'R' if color == 'white' else 'r'
-       self.attacks = {
-           'Arrow Strike': 30,
-       }
-       self.special_attacks = {
-           'Rooks Charge': {
-               'damage': 45,
-               'uses': 4
-           }
-       }
+   __slots__ = ()
 
-   def __str__(self):
-       return self.symbol
+   def iter_moves(self, row, col, board):
+       for direction in ORTHOGONAL_DIRECTIONS:
+           yield from RAYS[direction][row][col]
 
-   def valid_moves(self, row, col, board):
-       moves = []
-       directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-       for dx, dy in directions:
-           for i in range(1, 8):
-               new_row, new_col = row + i * dx, col + i * dy
-               if 0 <= new_row < 8 and 0 <= new_col < 8:
-                   moves.append((new_row, new_col))
-               else:
-                   break
-       return moves
+   def can_reach(self, row, col, end_row, end_col, board):
+       # Rooks ignore pieces in the way, so any other square on the rank or file will do
+       return (end_row == row) != (end_col == col)
 
 
 class Bishop(ChessPiece):
-   def __init__(self, color):
-       super().__init__(color, 'Bishop', health=100)
-       self.symbol = 'B' if color == 'white' else 'b'
-       self.attacks = {
-           'Staff Strike': 30,
-       }
-       self.special_attacks = {
-           'Bishops Curse': {
-               'damage': 50,
-               'uses': 3
-           }
-       }
+   __slots__ = ()
 
-   def __str__(self):
-       return self.symbol
+   def iter_moves(self, row, col, board):
+       return slide_moves(self, row, col, board, DIAGONAL_DIRECTIONS)
 
-   def valid_moves(self, row, col, board):
-       moves = []
-       directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-       for dx, dy in directions:
-           for i in range(1, 8):
-               new_row, new_col = row + i * dx, col + i * dy
-               if 0 <= new_row < 8 and 0 <= new_col < 8:
-                   if board[new_row][new_col] is None:
-                       moves.append((new_row, new_col))
-                   elif board[new_row][new_col].color != self.color:
-                       moves.append((new_row, new_col))
-                       break
-                   else:
-                       break
-               else:
-                   break
-       return moves
+   def can_reach(self, row, col, end_row, end_col, board):
+       return slide_reaches(self, row, col, end_row, end_col, board, diagonal=True)
 
 
 class Queen(ChessPiece):
-    def __init__(self, color):
-        super().__init__(color, 'Queen', health=125)
-        self.symbol = 'Q' if color == 'white' else 'q'
-        self.attacks = {
-            'Highness Kick': 40,
-        }
-        self.special_attacks = {
-            'Queens Wrath': {
-                'damage': 80,
-                'uses': 2
-            }
-        }
-
-    def __str__(self):
-        return self.symbol
-
-    def valid_moves(self, row, col, board):
-        moves = []
-        directions = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
-
-        for dx, dy in directions:
-            for i in range(1, 8):
-                new_row, new_col = row + i * dx, col + i * dy
-                if 0 <= new_row < 8 and 0 <= new_col < 8:
-                    if board[new_row][new_col] is None:
-                        moves.append((new_row, new_col))
-                    elif board[new_row][new_col].color != self.color:
-                        moves.append((new_row, new_col))
-                        break
-                    else:
-                        break
-                else:
-                    break
+    __slots__ = ()
 
-        return moves
+    def iter_moves(self, row, col, board):
+        return slide_moves(self, row, col, board, [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)])
+
+    def can_reach(self, row, col, end_row, end_col, board):
+        return (slide_reaches(self, row, col, end_row, end_col, board, diagonal=False) or
+                slide_reaches(self, row, col, end_row, end_col, board, diagonal=True))
 
 
 class Knight(ChessPiece):
-   def __init__(self, color):
-       super().__init__(color, 'Knight', health=160)
-       self.symbol = 'N' if color == 'white' else 'n'
-       self.attacks = {
-           'Strike': 35,
-       }
-       self.special_attacks = {
-           'Knights Charge': {
-               'damage': 55,
-               'uses': 3
-           }
-       }
+   __slots__ = ()
 
-   def __str__(self):
-       return self.symbol
+   def iter_moves(self, row, col, board):
+       return iter(KNIGHT_JUMPS[row][col])
 
-   def valid_moves(self, row, col, board):
-       moves = []
-       directions = [(2, 1), (1, 2), (-2, 1), (1, -2), (2, -1), (-1, 2), (-2, -1), (-1, -2)]
-       for dx, dy in directions:
-           new_row, new_col = row + dx, col + dy
-           if 0 <= new_row < 8 and 0 <= new_col < 8:
-               moves.append((new_row, new_col))
-       return moves
+   def can_reach(self, row, col, end_row, end_col, board):
+       return (end_row, end_col) in KNIGHT_JUMP_SETS[row][col]
 
 
 class Pawn(ChessPiece):
-   def __init__(self, color):
-       super().__init__(color, 'Pawn', health=50)
-       self.symbol = 'P' if color == 'white' else 'p'
-       self.attacks = {
-           'Strike': 25,
-       }
-       self.special_attacks = {
-           'Pawn Punch': {
-               'damage': 35,
-               'uses': 3
-           }
-       }
-
-   def __str__(self):
-       return self.symbol
+   __slots__ = ()
+
+   def iter_moves(self, row, col, board):
+       # Pawns step both forward and backward, and move diagonally only onto an enemy piece
+       captures = PAWN_CAPTURES[row][col]
+       for new_row, new_col in PAWN_STEPS[row][col]:
+           yield new_row, new_col
+           for capture_row, capture_col in captures:
+               if capture_row == new_row:
+                   target = board[capture_row][capture_col]
+                   if target and target.color != self.color:
+                       yield capture_row, capture_col
+
+   def can_reach(self, row, col, end_row, end_col, board):
+       if abs(end_row - row) != 1:
+           return False
+       if end_col == col:
+           return True
+       if abs(end_col - col) != 1:
+           return False
+       target = board[end_row][end_col]
+       return target is not None and target.color != self.color
 
-   def valid_moves(self, row, col, board):
-       moves = []
 
-       for i in [-1, 1]:
-           new_row = row + i
-           new_col = col
+PIECE_TYPES = [King, Rook, Bishop, Queen, Knight, Pawn]
+apply_piece_stats(PIECE_STATS)
 
-           if 0 <= new_row < 8:
-               moves.append((new_row, new_col))
 
-               for j in [-1, 1]:
-                   new_col = col + j
-                   if 0 <= new_col < 8 and board[new_row][new_col] and board[new_row][new_col].color != self.color:
-                       moves.append((new_row, new_col))
+def can_reach(piece, start, end, board):
+    """
+    Check whether a piece can move from start to end, in time proportional to the
+    length of the ray it has to walk rather than the size of its move list.
 
-       return moves
+    :param piece: The chess piece to move.
+    :param start: The (row, col) the piece stands on.
+    :param end: The destination (row, col).
+    :param board: The chess board as a 2D list.
+    :return: True if end is one of the piece's valid moves, False otherwise.
+    """
+    return piece.can_reach(start[0], start[1], end[0], end[1], board)
 
 
 def initialize_board():
@@ -279,191 +398,155 @@ def initialize_board():
     return board
 
 
-def display_board(board, battle_grid=None):
+def format_board(board, battle_grid=None):
     """
-    Display the current state of the chess board, including the battle grid.
+    Build the text display_board shows, as one string.
 
     :param board: The chess board as a 2D list.
     :param battle_grid: The battle grid.
+    :return: The board text, ending with a newline.
     """
-    print("  a b c d e f g h")
+    lines = ["  a b c d e f g h"]
 
     for i, row in enumerate(board):
-      print(f"{8 - i} ", end="")
-      for piece in row:
-          if piece is None:
-              print(". ", end="")
-          else:
-              print(f"\033[1m{piece}\033[0m ", end="")
-      print(f"{8 - i}")
+      cells = "".join(". " if piece is None else f"\033[1m{piece}\033[0m " for piece in row)
+      lines.append(f"{8 - i} {cells}{8 - i}")
 
     if battle_grid:
-      print("\nBattle:")
+      lines.append("\nBattle:")
       for row in battle_grid:
-          for cell in row:
-              print(cell, end=" ")
-          print()
-      print("\nPlayers' Health:")
-      print("\nPlayers' Moves:")
-      print()
+          lines.append("".join(f"{cell} " for cell in row))
+      lines.append("\nPlayers' Health:")
+      lines.append("\nPlayers' Moves:")
+      lines.append("")
     else:
-      print("  a b c d e f g h")
+      lines.append("  a b c d e f g h")
+    return "\n".join(lines) + "\n"
 
 
-def battle_scene(piece1, piece2, board, start_pos, end_pos):
+def display_board(board, battle_grid=None, view=None, state=None):
     """
-    Simulate a battle scene between two chess pieces and update their health.
+    Display the current state of the chess board, including the battle grid.
+    Without a view the whole board is written at once; with one, only what changed is redrawn.
 
-    :param piece1: The first chess piece participating in the battle.
-    :param piece2: The second chess piece participating in the battle.
     :param board: The chess board as a 2D list.
-    :param start_pos: The starting position of the battle.
-    :param end_pos: The ending position of the battle.
-    :return: The winner of the battle (the surviving piece).
-    """
-    piece1_name = piece1.name
-    piece2_name = piece2.name
-    piece1_health = piece1.health
-    piece2_health = piece2.health
-    piece1_symbol = piece1.symbol
-    piece2_symbol = piece2.symbol
-    piece1_health = getattr(piece1, 'health', None)
-    piece2_health = getattr(piece2, 'health', None)
-    piece1_attacks = getattr(piece1, 'attacks', None)
-    piece2_attacks = getattr(piece2, 'attacks', None)
-    piece1_special_attacks = getattr(piece1, 'special_attacks', None)
-    piece2_special_attacks = getattr(piece2, 'special_attacks', None)
-
-    start_row, start_col = convert_to_coordinates(start_pos)
-    end_row, end_col = convert_to_coordinates(end_pos)
+    :param battle_grid: The battle grid.
+    :param view: A render.TerminalView that keeps the board on screen, or None.
+    :param state: The GameState of the board, for the view's health and status lines.
+    """
+    if view is not None and battle_grid is None:
+        if state is not None:
+            view.draw_state(state)
+        else:
+            view.draw(board)
+        return
+    sys.stdout.write(format_board(board, battle_grid))
+    sys.stdout.flush()
 
-    if piece1_attacks is not None:
-        current_turn = piece1_symbol
-    else:
-        current_turn = piece2_symbol
 
-    print(f"{piece1_symbol} vs {piece2_symbol}")
-    while True:
-        if piece1_attacks is not None:
-            print(f"White {piece1_name} Attacks:")
-            for attack, damage in piece1_attacks.items():
-                print(f"1: {attack}: {damage} damage")
-            if piece1_special_attacks is not None:
-                special_attack_name = list(piece1_special_attacks.keys())[0]
-                print(f"2: {special_attack_name}: {piece1_special_attacks[special_attack_name]['damage']} damage ({piece1_special_attacks[special_attack_name]['uses']} uses remaining)")
-        print("")
+BASIC_ATTACK = 1
+SPECIAL_ATTACK = 2
 
-        if piece2_attacks is not None:
-            print(f"Black {piece2_name} Attacks:")
-            for attack, damage in piece2_attacks.items():
-                print(f"1: {attack}: {damage} damage")
-            if piece2_special_attacks is not None:
-                special_attack_name = list(piece2_special_attacks.keys())[0]
-                print(f"2: {special_attack_name}: {piece2_special_attacks[special_attack_name]['damage']} damage ({piece2_special_attacks[special_attack_name]['uses']} uses remaining)")
-        print("")
 
-        print(f"{piece1_symbol} Current Health: {piece1_health}")
-        print(f"{piece2_symbol} Current Health: {piece2_health}")
+def file_name(col):
+    """
+    Return the letters of a file: 'a' to 'z', then 'aa', 'ab' and so on for boards wider than 26.
 
-        while True:
-            attack_choice = input(f"{current_turn}, choose your attack (Type in 1 or 2(special) ): ")
-            if attack_choice in ('1', '2'):
-                break
-            else:
-                print("Invalid choice. Please enter '1' for a regular attack or '2' for a special attack.")
+    :param col: The column index on the board.
+    """
+    letters = ""
+    col += 1
+    while col:
+        col, letter = divmod(col - 1, 26)
+        letters = chr(ord('a') + letter) + letters
+    return letters
 
-        if attack_choice == '1':
-            if current_turn == piece1_symbol:
-                current_damage = piece1_attacks[list(piece1_attacks.keys())[0]]
-            else:
-                current_damage = piece2_attacks[list(piece2_attacks.keys())[0]]
-        else:
-            if current_turn == piece1_symbol:
-                special_attack_name = list(piece1_special_attacks.keys())[0]
-                current_damage = piece1_special_attacks[special_attack_name]['damage']
-                piece1_special_attacks[special_attack_name]['uses'] -= 1
-            else:
-                special_attack_name = list(piece2_special_attacks.keys())[0]
-                current_damage = piece2_special_attacks[special_attack_name]['damage']
-                piece2_special_attacks[special_attack_name]['uses'] -= 1
 
-        if current_turn == piece1_symbol:
-            piece2_health -= current_damage
-        else:
-            piece1_health -= current_damage
+def convert_to_coordinates(pos, size=BOARD_SIZE):
+    """
+    Convert a chess position string (e.g., 'e2') to row and column coordinates.
 
-        piece1.health = max(piece1_health, 0)
-        piece2.health = max(piece2_health, 0)
+    :param pos: The position string (e.g., 'e2').
+    :param size: The number of rows and columns of the board.
+    :return: A tuple containing row and column coordinates.
+    """
+    letters = pos.rstrip('0123456789')
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - ord('a') + 1
+    row = size - int(pos[len(letters):])
+    return row, col - 1
 
-        print(f"{current_turn} deals {current_damage} damage.")
-        print(f"{piece1_name} Current Health: {piece1.health}")
-        print(f"{piece2_name} Current Health: {piece2.health}")
 
-        if piece1_health <= 0:
-            if piece1_symbol in ('K', 'k'):
-                print(f"{piece1_symbol} has lost the battle, and the game is over.")
-                exit()
-            else:
-                print(f"{piece2_symbol} wins the battle!")
-                return piece2
-        elif piece2_health <= 0:
-            if piece2_symbol in ('K', 'k'):
-                print(f"{piece2_symbol} has lost the battle, and the game is over.")
-                exit()
-            else:
-                print(f"{piece1_symbol} wins the battle!")
-                return piece1
+def convert_to_position(row, col, size=BOARD_SIZE):
+    """
+    Convert row and column coordinates to a chess position string (e.g., 'e2').
 
-        current_turn = piece1_symbol if current_turn == piece2_symbol else piece2_symbol
+    :param row: The row index on the board.
+    :param col: The column index on the board.
+    :param size: The number of rows and columns of the board.
+    :return: The position string.
+    """
+    return f"{file_name(col)}{size - row}"
 
 
-def convert_to_coordinates(pos):
+def opponent(color):
     """
-    Convert a chess position string (e.g., 'e2') to row and column coordinates.
+    Return the color playing against the given color.
 
-    :param pos: The position string (e.g., 'e2').
-    :return: A tuple containing row and column coordinates.
+    :param color: 'white' or 'black'.
+    :return: The other color.
     """
-    col = ord(pos[0]) - ord('a')
-    row = 8 - int(pos[1])
-    return row, col
+    return 'black' if color == 'white' else 'white'
 
 
-def is_valid_move(start_pos, end_pos, board, current_turn):
+def move_error(board, start, end, current_turn):
     """
-   Check if a move from start_pos to end_pos is a valid chess move.
+    Explain why a move is not allowed, without printing anything.
 
-   :param start_pos: The starting position of the move.
-   :param end_pos: The ending position of the move.
-   :param board: The chess board as a 2D list.
-   :param current_turn: The current player's turn ('white' or 'black').
-   :return: True if the move is valid, otherwise False.
-   """
-    start_row, start_col = convert_to_coordinates(start_pos)
-    end_row, end_col = convert_to_coordinates(end_pos)
+    :param board: The chess board as a 2D list.
+    :param start: The starting (row, col) of the move.
+    :param end: The ending (row, col) of the move.
+    :param current_turn: The current player's turn ('white' or 'black').
+    :return: A message describing the problem, or None if the move is valid.
+    """
+    start_row, start_col = start
+    end_row, end_col = end
 
     piece = board[start_row][start_col]
 
     if not piece:
-        print(f"No piece at {start_pos}")
-        return False
+        return f"No piece at {convert_to_position(start_row, start_col)}"
 
     if piece.color != current_turn:
-        print(f"Wrong turn: It's {current_turn}'s turn but the piece is {piece.color}")
-        return False
+        return f"Wrong turn: It's {current_turn}'s turn but the piece is {piece.color}"
 
-    if start_pos == end_pos:
-        print("Invalid move: Starting and ending positions are the same.")
-        return False
+    if start == end:
+        return "Invalid move: Starting and ending positions are the same."
 
-    valid_moves = piece.valid_moves(start_row, start_col, board)
-
-    if (end_row, end_col) not in valid_moves:
-        print("Invalid move: Not a valid move for the selected piece.")
-        return False
+    if not piece.can_reach(start_row, start_col, end_row, end_col, board):
+        return "Invalid move: Not a valid move for the selected piece."
 
     if board[end_row][end_col] and board[end_row][end_col].color == current_turn:
-        print("Invalid move: Cannot move to a position occupied by a piece of the same color.")
+        return "Invalid move: Cannot move to a position occupied by a piece of the same color."
+
+    return None
+
+
+def is_valid_move(start_pos, end_pos, board, current_turn):
+    """
+   Check if a move from start_pos to end_pos is a valid chess move.
+
+   :param start_pos: The starting position of the move.
+   :param end_pos: The ending position of the move.
+   :param board: The chess board as a 2D list.
+   :param current_turn: The current player's turn ('white' or 'black').
+   :return: True if the move is valid, otherwise False.
+   """
+    error = move_error(board, convert_to_coordinates(start_pos), convert_to_coordinates(end_pos), current_turn)
+
+    if error:
+        print(error)
         return False
 
     return True
@@ -487,6 +570,826 @@ def check_collision(board, start_pos, end_pos):
     return end_piece is not None and end_piece.color != start_piece.color
 
 
+def is_game_over(board, turn):
+    """
+    Check if the game is over (one of the kings is defeated).
+
+    :param board: The chess board as a 2D list.
+    :param turn: The current player's turn ('white' or 'black').
+    :return: True if the game is over, False otherwise.
+    """
+
+    king_symbol = 'K' if turn == 'black' else 'k'
+    for row in board:
+       for piece in row:
+           if isinstance(piece, King) and piece.symbol == king_symbol:
+               return False
+    return True
+
+
+def legal_moves(board, turn, squares=None):
+    """
+    Return every move a player may make on a board.
+
+    :param board: The chess board as a 2D list.
+    :param turn: The player to move ('white' or 'black').
+    :param squares: The squares holding the player's pieces, if already known (see PieceIndex).
+    :return: A list of ((start_row, start_col), (end_row, end_col)) tuples.
+    """
+    if squares is None:
+        squares = [(row, col) for row in range(8) for col in range(8)
+                   if board[row][col] is not None and board[row][col].color == turn]
+
+    moves = []
+    for row, col in squares:
+        for end_row, end_col in board[row][col].iter_moves(row, col, board):
+            target = board[end_row][end_col]
+            if (end_row, end_col) != (row, col) and (target is None or target.color != turn):
+                moves.append(((row, col), (end_row, end_col)))
+    return moves
+
+
+def piece_targets(piece, row, col, board):
+    """
+    Return the squares a piece may move to: its moves without its own square and
+    without squares held by its own side.
+
+    :return: A list of (row, col) squares in the order iter_moves produces them.
+    """
+    color = piece.color
+    targets = []
+    for end_row, end_col in piece.iter_moves(row, col, board):
+        target = board[end_row][end_col]
+        if (end_row != row or end_col != col) and (target is None or target.color != color):
+            targets.append((end_row, end_col))
+    return targets
+
+
+def piece_attacks(piece, row, col, board, targets=None):
+    """
+    Return the squares on which an enemy piece could be attacked by a piece. These are
+    its move targets, plus the empty diagonal squares next to a Pawn, which it only
+    moves to when an enemy stands there.
+
+    :param targets: The piece's move targets, if already known.
+    :return: A tuple of (row, col) squares.
+    """
+    if targets is None:
+        targets = piece_targets(piece, row, col, board)
+    if not isinstance(piece, Pawn):
+        return tuple(targets)
+    return tuple(targets) + tuple((end_row, end_col) for end_row, end_col in PAWN_CAPTURES[row][col]
+                                  if board[end_row][end_col] is None)
+
+
+def attacked_squares(board, color, squares=None):
+    """
+    Return every square on which a piece of the other side could be attacked by a player.
+
+    :param board: The chess board as a 2D list.
+    :param color: The attacking player.
+    :param squares: The squares holding the player's pieces, if already known (see PieceIndex).
+    :return: A set of (row, col) squares.
+    """
+    if squares is None:
+        squares = [(row, col) for row in range(8) for col in range(8)
+                   if board[row][col] is not None and board[row][col].color == color]
+    attacked = set()
+    for row, col in squares:
+        attacked.update(piece_attacks(board[row][col], row, col, board))
+    return attacked
+
+
+def _footprint_table(*tables):
+    """
+    Combine jump and ray tables into, for every square (row * 8 + col), the tuple of
+    squares (as row * 8 + col) whose contents can change the moves of a piece there.
+    """
+    return [tuple(sorted({end_row * 8 + end_col for table in tables for end_row, end_col in table[sq // 8][sq % 8]}))
+            for sq in range(64)]
+
+
+ORTHOGONAL_RAYS = [RAYS[direction] for direction in ORTHOGONAL_DIRECTIONS]
+DIAGONAL_RAYS = [RAYS[direction] for direction in DIAGONAL_DIRECTIONS]
+# The squares whose contents can change the moves of a piece, for the pieces that
+# do not stop at a blocker (Rooks ignore pieces in the way)
+MOVE_FOOTPRINTS = {
+    King: _footprint_table(KING_JUMPS),
+    Rook: _footprint_table(*ORTHOGONAL_RAYS),
+    Knight: _footprint_table(KNIGHT_JUMPS),
+    Pawn: _footprint_table(PAWN_STEPS, PAWN_CAPTURES),
+}
+SLIDER_RAYS = {Bishop: DIAGONAL_RAYS, Queen: ORTHOGONAL_RAYS + DIAGONAL_RAYS}
+
+
+def move_dependencies(piece, row, col, board):
+    """
+    Return the squares (as row * 8 + col) whose contents the moves of a piece depend on
+    right now: its jump targets, or each ray up to and including the first piece in the way.
+    """
+    rays = SLIDER_RAYS.get(type(piece))
+    if rays is None:
+        return MOVE_FOOTPRINTS[type(piece)][row * 8 + col]
+    squares = []
+    for ray in rays:
+        for end_row, end_col in ray[row][col]:
+            squares.append(end_row * 8 + end_col)
+            if board[end_row][end_col] is not None:
+                break
+    return squares
+
+
+class MoveCache:
+    __slots__ = ('board', 'moves', 'attacks', 'dependents', 'hits', 'misses', 'invalidations')
+
+    def __init__(self, board):
+        """
+        Cache every piece's legal moves and attacked squares on a board.
+
+        Entries are computed when first asked for. Each one registers with the squares
+        it depends on (see move_dependencies) and is dropped when touch() reports that
+        one of them, or the piece's own square, changed.
+
+        :param board: The chess board as a 2D list, which the cache reads but never changes.
+        """
+        self.board = board
+        self.moves = [None] * 64
+        self.attacks = [None] * 64
+        # A square's set of watching entries is created when the first entry registers there
+        self.dependents = [None] * 64
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def touch(self, square):
+        """
+        Forget the entries a change to the contents of a square can affect.
+
+        :param square: The (row, col) whose piece arrived, left or was replaced.
+        """
+        sq = square[0] * 8 + square[1]
+        moves, attacks = self.moves, self.attacks
+        if moves[sq] is not None:
+            moves[sq] = attacks[sq] = None
+            self.invalidations += 1
+        dependents = self.dependents[sq]
+        if dependents:
+            # An entry may have been recomputed since it registered here; dropping it again is harmless
+            for watcher in dependents:
+                if moves[watcher] is not None:
+                    moves[watcher] = attacks[watcher] = None
+                    self.invalidations += 1
+            dependents.clear()
+
+    def clear(self):
+        """
+        Forget every entry, e.g. after the board was changed without touch().
+        """
+        for sq in range(64):
+            self.moves[sq] = self.attacks[sq] = self.dependents[sq] = None
+
+    def _compute(self, row, col):
+        self.misses += 1
+        board = self.board
+        piece = board[row][col]
+        start = (row, col)
+        sq = row * 8 + col
+        moves = self.moves[sq] = tuple((start, end) for end in piece_targets(piece, row, col, board))
+        dependents = self.dependents
+        for dependency in move_dependencies(piece, row, col, board):
+            watchers = dependents[dependency]
+            if watchers is None:
+                dependents[dependency] = {sq}
+            else:
+                watchers.add(sq)
+        return moves
+
+    def piece_moves(self, row, col):
+        """
+        Return the legal moves of the piece on a square, as (start, end) pairs.
+        """
+        moves = self.moves[row * 8 + col]
+        if moves is None:
+            return self._compute(row, col)
+        self.hits += 1
+        return moves
+
+    def piece_attacks(self, row, col):
+        """
+        Return piece_attacks() for the piece on a square.
+        """
+        sq = row * 8 + col
+        attacks = self.attacks[sq]
+        if attacks is None:
+            board = self.board
+            targets = [end for _, end in self.piece_moves(row, col)]
+            attacks = self.attacks[sq] = piece_attacks(board[row][col], row, col, board, targets)
+        else:
+            self.hits += 1
+        return attacks
+
+    def legal_moves(self, squares):
+        """
+        Return legal_moves() for the pieces on the given squares, in the same order.
+        """
+        moves = []
+        cache = self.moves
+        hits = 0
+        for row, col in squares:
+            cached = cache[row * 8 + col]
+            if cached is None:
+                cached = self._compute(row, col)
+            else:
+                hits += 1
+            moves += cached
+        self.hits += hits
+        return moves
+
+    def attacked_squares(self, squares):
+        """
+        Return attacked_squares() for the pieces on the given squares.
+        """
+        attacked = set()
+        for row, col in squares:
+            attacked.update(self.piece_attacks(row, col))
+        return attacked
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class PieceIndex:
+    __slots__ = ('squares', 'kings', 'material', 'health', 'special_damage')
+
+    def __init__(self):
+        """
+        Create an empty index of the pieces on a board, kept up to date as the game changes:
+
+        squares[color] maps each square holding one of that side's pieces to the piece,
+        kings[color] is the square of that side's King (None once it is defeated), and
+        material, health and special_damage hold per-side totals of MATERIAL_VALUES,
+        current health and the damage left in unused special attacks.
+        """
+        self.squares = {'white': {}, 'black': {}}
+        self.kings = {'white': None, 'black': None}
+        self.material = {'white': 0, 'black': 0}
+        self.health = {'white': 0, 'black': 0}
+        self.special_damage = {'white': 0, 'black': 0}
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Build the index by scanning a board once.
+
+        :param board: The chess board as a 2D list.
+        :return: A PieceIndex.
+        """
+        index = cls()
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] is not None:
+                    index.add(board[row][col], (row, col))
+        return index
+
+    def add(self, piece, square):
+        color = piece.color
+        self.squares[color][square] = piece
+        if piece.name == 'King':
+            self.kings[color] = square
+        self.material[color] += MATERIAL_VALUES[piece.name]
+        self.health[color] += piece.health
+        self.special_damage[color] += piece.special_uses * piece.stats.special_damage
+
+    def remove(self, piece, square):
+        color = piece.color
+        del self.squares[color][square]
+        if piece.name == 'King':
+            self.kings[color] = None
+        self.material[color] -= MATERIAL_VALUES[piece.name]
+        self.health[color] -= piece.health
+        self.special_damage[color] -= piece.special_uses * piece.stats.special_damage
+
+    def move(self, piece, start, end):
+        squares = self.squares[piece.color]
+        del squares[start]
+        squares[end] = piece
+        if piece.name == 'King':
+            self.kings[piece.color] = end
+
+    def update_piece(self, piece, health_before, uses_before):
+        """
+        Account for a piece's health and special uses having changed, e.g. after a strike.
+        """
+        self.health[piece.color] += piece.health - health_before
+        self.special_damage[piece.color] += (piece.special_uses - uses_before) * piece.stats.special_damage
+
+
+class Battle:
+    def __init__(self, attacker, defender):
+        """
+        Start a battle between the piece making a capture and the piece being captured.
+
+        The attacker always strikes first, then the two pieces alternate until one
+        of them reaches 0 health.
+
+        :param attacker: The chess piece that initiated the capture.
+        :param defender: The chess piece being captured.
+        """
+        self.reset(attacker, defender)
+
+    def reset(self, attacker, defender):
+        """
+        Start over with a new pair of pieces, so one Battle object can be reused.
+        """
+        self.attacker = attacker
+        self.defender = defender
+        self.current = attacker
+        self.winner = None
+        self.loser = None
+        self.last_attack = None
+        self.last_damage = 0
+
+    def opponent_of(self, piece):
+        """
+        Return the other piece taking part in the battle.
+        """
+        return self.defender if piece is self.attacker else self.attacker
+
+    def attack_choices(self):
+        """
+        Return the attack choices available to the piece whose turn it is.
+
+        :return: A tuple containing BASIC_ATTACK and, while uses remain, SPECIAL_ATTACK.
+        """
+        if self.current.special_uses > 0:
+            return (BASIC_ATTACK, SPECIAL_ATTACK)
+        return (BASIC_ATTACK,)
+
+    def strike(self, choice):
+        """
+        Let the piece whose turn it is attack with the chosen attack.
+
+        :param choice: BASIC_ATTACK or SPECIAL_ATTACK.
+        :return: A 'damage_dealt' event describing the strike.
+        """
+        piece = self.current
+        target = self.opponent_of(piece)
+        self.hit(choice)
+        return {'type': 'damage_dealt', 'piece': piece, 'target': target, 'choice': choice,
+                'attack': self.last_attack, 'damage': self.last_damage, 'health': target.health}
+
+    def hit(self, choice):
+        """
+        Make the same strike as strike() without building an event, recording the
+        attack used in last_attack and last_damage.
+
+        :param choice: BASIC_ATTACK or SPECIAL_ATTACK.
+        """
+        if self.winner is not None:
+            raise ValueError("The battle is already over.")
+
+        piece = self.current
+        target = self.opponent_of(piece)
+
+        if choice == BASIC_ATTACK:
+            attack_name, damage = piece.basic_attack
+        elif choice == SPECIAL_ATTACK:
+            attack_name, damage = piece.special_attack
+            if piece.special_uses <= 0:
+                raise ValueError(f"{piece.name} has used up all special attack uses for {attack_name}.")
+            piece.special_uses -= 1
+        else:
+            raise ValueError(f"Unknown attack choice: {choice!r}")
+
+        target.health = max(target.health - damage, 0)
+
+        if target.health <= 0:
+            self.winner = piece
+            self.loser = target
+        else:
+            self.current = target
+
+        self.last_attack = attack_name
+        self.last_damage = damage
+
+
+class UndoRecord:
+    __slots__ = ('start', 'end', 'piece', 'target', 'piece_health', 'piece_uses',
+                 'target_health', 'target_uses', 'attacker_won', 'turn', 'winner')
+
+    def __init__(self):
+        """
+        What make_move changed: the squares and pieces involved, the health and special
+        uses both pieces had before any battle, who won it (None for a quiet move), and
+        the turn and winner of the game before the move.
+        """
+        self.start = self.end = self.piece = self.target = None
+        self.piece_health = self.piece_uses = self.target_health = self.target_uses = 0
+        self.attacker_won = self.turn = self.winner = None
+
+
+class GameState:
+    def __init__(self, board=None, turn='white'):
+        """
+        Create a game that is driven by method calls instead of console input.
+
+        Every method that changes the game returns a list of event dictionaries
+        describing what happened, so frontends decide how (or whether) to show it.
+
+        :param board: The chess board as a 2D list, or None for the initial position.
+        :param turn: The player to move ('white' or 'black').
+        """
+        self.board = initialize_board() if board is None else board
+        self.turn = turn
+        self.battle = None
+        self.battle_squares = None
+        self.winner = None
+        self.move_count = 0
+        self.battle_count = 0
+        self.index = PieceIndex.from_board(self.board)
+        self.move_cache = MoveCache(self.board)
+        self._undo_records = []
+        self._undo_depth = 0
+        self._scratch_battle = Battle(None, None)
+
+    def legal_moves(self):
+        """
+        Return every move the current player may make, from the move cache.
+
+        :return: A list of ((start_row, start_col), (end_row, end_col)) tuples.
+        """
+        if self.winner is not None or self.battle is not None:
+            return []
+        if self._undo_depth:
+            return legal_moves(self.board, self.turn, self.index.squares[self.turn])
+        return self.move_cache.legal_moves(self.index.squares[self.turn])
+
+    def attacked_squares(self, color):
+        """
+        Return the squares on which a piece of the other side could be attacked by a player.
+
+        :param color: The attacking player.
+        :return: A set of (row, col) squares.
+        """
+        if self._undo_depth:
+            return attacked_squares(self.board, color, self.index.squares[color])
+        return self.move_cache.attacked_squares(self.index.squares[color])
+
+    def is_game_over(self):
+        """
+        Check in constant time whether either King has been defeated.
+        """
+        return self.index.kings['white'] is None or self.index.kings['black'] is None
+
+    def evaluate(self):
+        """
+        Score the position in constant time from the point of view of the player to move:
+        material, plus remaining health and half the damage left in special attacks.
+        """
+        index, us, them = self.index, self.turn, opponent(self.turn)
+        return ((index.material[us] + index.health[us] + index.special_damage[us] // 2) -
+                (index.material[them] + index.health[them] + index.special_damage[them] // 2))
+
+    def apply_move(self, start, end):
+        """
+        Move a piece for the current player. Moving onto an enemy piece starts a battle,
+        which has to be fought out with apply_attack_choice before the next move.
+
+        :param start: The starting (row, col) of the move.
+        :param end: The ending (row, col) of the move.
+        :return: A list of events.
+        """
+        if self.winner is not None:
+            raise ValueError("The game is already over.")
+        if self.battle is not None:
+            raise ValueError("The battle in progress has to be finished first.")
+
+        start_row, start_col = start
+        end_row, end_col = end
+        piece = self.board[start_row][start_col]
+        # Moves found among the piece's targets are valid; anything else gets move_error's message.
+        # While make_move moves are outstanding the cache describes another board, so it is not used.
+        if piece is None or piece.color != self.turn:
+            valid = False
+        elif self._undo_depth:
+            valid = end in piece_targets(piece, start_row, start_col, self.board)
+        else:
+            valid = (start, end) in self.move_cache.piece_moves(start_row, start_col)
+        if not valid:
+            error = move_error(self.board, start, end, self.turn)
+            if error:
+                raise ValueError(error)
+
+        target = self.board[end_row][end_col]
+        self.move_count += 1
+
+        if target is not None:
+            self.battle = Battle(piece, target)
+            self.battle_squares = (start, end)
+            self.battle_count += 1
+            return [{'type': 'battle_started', 'attacker': piece, 'defender': target,
+                     'from': start, 'to': end}]
+
+        self.board[end_row][end_col] = piece
+        self.board[start_row][start_col] = None
+        self.index.move(piece, start, end)
+        self.move_cache.touch(start)
+        self.move_cache.touch(end)
+        self.turn = opponent(self.turn)
+        return [{'type': 'piece_moved', 'piece': piece, 'from': start, 'to': end}]
+
+    def apply_attack_choice(self, choice):
+        """
+        Make the next strike in the battle in progress.
+
+        :param choice: BASIC_ATTACK or SPECIAL_ATTACK.
+        :return: A list of events.
+        """
+        if self.battle is None:
+            raise ValueError("There is no battle in progress.")
+
+        piece = self.battle.current
+        target = self.battle.opponent_of(piece)
+        uses_before, health_before = piece.special_uses, target.health
+
+        events = [self.battle.strike(choice)]
+        self.index.update_piece(piece, piece.health, uses_before)
+        self.index.update_piece(target, health_before, target.special_uses)
+
+        if self.battle.winner is not None:
+            events.extend(self._finish_battle())
+        return events
+
+    def make_move(self, start, end, choose_attack=None):
+        """
+        Play a move, including the whole battle it starts, so that unmake_move can take
+        it back. Moves are not checked; they should come from legal_moves().
+
+        Undo records and the Battle used for fighting are reused, so making and
+        unmaking moves does not build new objects once the stack has been deep enough.
+        The move cache is left alone: while made moves are outstanding legal_moves()
+        generates moves from scratch, and once all are taken back the board is the one
+        the cache describes again.
+
+        :param start: The starting (row, col) of the move.
+        :param end: The ending (row, col) of the move.
+        :param choose_attack: Called with the Battle before each strike and returns
+                              BASIC_ATTACK or SPECIAL_ATTACK; needed for captures.
+        """
+        board = self.board
+        start_row, start_col = start
+        end_row, end_col = end
+        piece = board[start_row][start_col]
+        target = board[end_row][end_col]
+
+        if self._undo_depth == len(self._undo_records):
+            self._undo_records.append(UndoRecord())
+        record = self._undo_records[self._undo_depth]
+        self._undo_depth += 1
+        record.start = start
+        record.end = end
+        record.piece = piece
+        record.target = target
+        record.turn = self.turn
+        record.winner = self.winner
+        self.move_count += 1
+
+        if target is None:
+            board[end_row][end_col] = piece
+            board[start_row][start_col] = None
+            self.index.move(piece, start, end)
+            record.attacker_won = None
+            self.turn = opponent(self.turn)
+            return
+
+        if choose_attack is None:
+            raise ValueError("A capture needs choose_attack to fight out its battle.")
+
+        record.piece_health = piece.health
+        record.piece_uses = piece.special_uses
+        record.target_health = target.health
+        record.target_uses = target.special_uses
+        battle = self._scratch_battle
+        battle.reset(piece, target)
+        while battle.winner is None:
+            battle.hit(choose_attack(battle))
+        self.battle_count += 1
+
+        index = self.index
+        index.update_piece(piece, record.piece_health, record.piece_uses)
+        index.update_piece(target, record.target_health, record.target_uses)
+        if battle.winner is piece:
+            board[end_row][end_col] = piece
+            board[start_row][start_col] = None
+            index.remove(target, end)
+            index.move(piece, start, end)
+            record.attacker_won = True
+        else:
+            board[start_row][start_col] = None
+            index.remove(piece, start)
+            record.attacker_won = False
+
+        if battle.loser.name == 'King':
+            self.winner = battle.winner.color
+        else:
+            self.turn = opponent(self.turn)
+
+    def unmake_move(self):
+        """
+        Take back the last move made with make_move, restoring the board, the piece
+        index, and the health and special uses of any pieces that fought.
+        """
+        self._undo_depth -= 1
+        record = self._undo_records[self._undo_depth]
+        board, index = self.board, self.index
+        start, end, piece, target = record.start, record.end, record.piece, record.target
+        start_row, start_col = start
+        end_row, end_col = end
+
+        board[start_row][start_col] = piece
+        board[end_row][end_col] = target
+        self.turn = record.turn
+        self.winner = record.winner
+        self.move_count -= 1
+
+        if record.attacker_won is None:
+            index.move(piece, end, start)
+            return
+
+        self.battle_count -= 1
+        if record.attacker_won:
+            index.move(piece, end, start)
+        else:
+            index.add(piece, start)
+        health, uses = piece.health, piece.special_uses
+        piece.health, piece.special_uses = record.piece_health, record.piece_uses
+        index.update_piece(piece, health, uses)
+
+        if record.attacker_won:
+            target.health, target.special_uses = record.target_health, record.target_uses
+            index.add(target, end)
+        else:
+            health, uses = target.health, target.special_uses
+            target.health, target.special_uses = record.target_health, record.target_uses
+            index.update_piece(target, health, uses)
+
+    def _finish_battle(self):
+        battle = self.battle
+        start, end = self.battle_squares
+        start_row, start_col = start
+        end_row, end_col = end
+
+        events = [{'type': 'battle_won', 'winner': battle.winner, 'loser': battle.loser}]
+        if battle.winner is battle.attacker:
+            self.board[end_row][end_col] = battle.attacker
+            self.board[start_row][start_col] = None
+            self.index.remove(battle.loser, end)
+            self.index.move(battle.attacker, start, end)
+            self.move_cache.touch(end)
+            events.append({'type': 'piece_removed', 'piece': battle.loser, 'square': end})
+            events.append({'type': 'piece_moved', 'piece': battle.attacker, 'from': start, 'to': end})
+        else:
+            # The defender won the battle, so the attacking piece is removed
+            self.board[start_row][start_col] = None
+            self.index.remove(battle.loser, start)
+            events.append({'type': 'piece_removed', 'piece': battle.loser, 'square': start})
+
+        self.move_cache.touch(start)
+
+        if isinstance(battle.loser, King):
+            self.winner = battle.winner.color
+            events.append({'type': 'king_defeated', 'piece': battle.loser, 'winner': self.winner})
+        else:
+            self.turn = opponent(self.turn)
+
+        self.battle = None
+        self.battle_squares = None
+        return events
+
+    def result(self):
+        """
+        Return the winning color, or None while the game is still going.
+        """
+        return self.winner
+
+
+def display_battle(battle):
+    """
+    Display the attacks and health of both pieces in a battle.
+
+    :param battle: The Battle in progress.
+    """
+    for piece in (battle.attacker, battle.defender):
+        attack_name, damage = piece.basic_attack
+        special_name, special_damage = piece.special_attack
+        print(f"{piece.color.capitalize()} {piece.name} Attacks:")
+        print(f"1: {attack_name}: {damage} damage")
+        print(f"2: {special_name}: {special_damage} damage ({piece.special_uses} uses remaining)")
+        print("")
+
+    print(f"{battle.attacker.symbol} Current Health: {battle.attacker.health}")
+    print(f"{battle.defender.symbol} Current Health: {battle.defender.health}")
+
+
+def describe_event(event):
+    """
+    Return the console message for an engine event, or None if it needs no message.
+
+    :param event: An event dictionary produced by GameState.
+    """
+    if event['type'] == 'battle_started':
+        return f"{event['attacker'].symbol} vs {event['defender'].symbol}"
+    if event['type'] == 'damage_dealt':
+        return (f"{event['piece'].symbol} deals {event['damage']} damage.\n"
+                f"{event['target'].name} Current Health: {event['health']}")
+    if event['type'] == 'battle_won':
+        return f"{event['winner'].symbol} wins the battle!"
+    if event['type'] == 'king_defeated':
+        return f"{event['piece'].symbol} has lost the battle, and the game is over."
+    return None
+
+
+def report_events(events):
+    """
+    Print the console messages for a list of engine events.
+    """
+    for event in events:
+        message = describe_event(event)
+        if message:
+            print(message)
+
+
+def get_attack_choice(battle):
+    """
+    Ask the piece whose turn it is in a battle for its attack.
+
+    :param battle: The Battle in progress.
+    :return: BASIC_ATTACK or SPECIAL_ATTACK.
+    """
+    while True:
+        attack_choice = input(f"{battle.current.symbol}, choose your attack (Type in 1 or 2(special) ): ")
+        if attack_choice not in ('1', '2'):
+            print("Invalid choice. Please enter '1' for a regular attack or '2' for a special attack.")
+            continue
+
+        choice = int(attack_choice)
+        if choice not in battle.attack_choices():
+            special_name, _ = battle.current.special_attack
+            print(f"{battle.current.name} has used up all special attack uses for {special_name}.")
+            continue
+
+        return choice
+
+
+def battle_scene(state, players=None, view=None):
+    """
+    Play out the battle in progress on the game state, asking each side for its attacks.
+
+    :param state: The GameState with a battle in progress.
+    :param players: A dictionary mapping colors to computer players; other colors are asked for input.
+    :param view: A render.TerminalView showing the board, whose status lines follow the battle, or None.
+    :return: The events produced while resolving the battle.
+    """
+    players = players or {}
+    events = []
+    while state.battle is not None:
+        display_board(state.board, view=view, state=state)
+        display_battle(state.battle)
+        player = players.get(state.battle.current.color)
+        if player is not None:
+            choice = player.choose_attack(state)
+        else:
+            choice = get_attack_choice(state.battle)
+        new_events = state.apply_attack_choice(choice)
+        report_events(new_events)
+        events.extend(new_events)
+    return events
+
+
+def parse_move(move, size=BOARD_SIZE):
+    """
+    Split a move typed as 'e2 e3' into its two positions.
+
+    :param move: The move text, already stripped and lowercased.
+    :param size: The number of rows and columns of the board.
+    :return: A tuple of the starting and ending positions, or None if the text is not a move.
+    """
+    positions = move.split(' ')
+    if len(positions) != 2:
+        return None
+    for position in positions:
+        letters = position.rstrip('0123456789')
+        digits = position[len(letters):]
+        if not letters or not digits or not letters.isalpha() or not letters.isascii():
+            return None
+        row, col = convert_to_coordinates(position, size)
+        # Only the exact spelling convert_to_position gives (no '02', no 'e9' on 8x8) is a position
+        if not (0 <= row < size and 0 <= col < size) or convert_to_position(row, col, size) != position:
+            return None
+    return positions[0], positions[1]
+
+
 def get_move(turn, board, collision=False):
     """
     Get a valid move from the player for their current turn.
@@ -494,21 +1397,22 @@ def get_move(turn, board, collision=False):
     :param turn: The current player's turn ('white' or 'black').
     :param board: The chess board as a 2D list.
     :param collision: Whether collision checking is enabled for the move.
-    :return: A tuple containing the starting and ending positions of the move.
+    :return: A tuple containing the starting and ending positions of the move,
+             or None if the player quits.
     """
 
     while True:
        move = input(f"{turn.capitalize()}'s turn. Enter your move (e.g., 'e2 e3'): ").strip().lower()
 
        if not move:
-           print("Quitting the game.")
-           exit()
+           return None
 
-       if len(move) != 5 or move[0] not in 'abcdefgh' or move[1] not in '12345678' or move[2] != ' ' or move[3] not in 'abcdefgh' or move[4] not in '12345678':
+       parsed = parse_move(move)
+       if parsed is None:
            print("Invalid input format. Please enter your move in the format 'e2 e3'.")
            continue
 
-       start, end = move.split(' ')
+       start, end = parsed
 
        if is_valid_move(start, end, board, turn):
            if collision and board[convert_to_coordinates(start)[0]][convert_to_coordinates(start)[1]].color == turn:
@@ -519,92 +1423,307 @@ def get_move(turn, board, collision=False):
            print("Invalid move. Please try again.")
 
 
-def update_board(board, start, end, turn):
+def update_board(state, start, end, players=None, view=None):
     """
-    Update the chess board after a valid move is made.
+    Update the chess board after a valid move is made, fighting out any battle it starts.
 
-    :param board: The chess board as a 2D list.
+    :param state: The GameState to update.
     :param start: The starting position of the move.
     :param end: The ending position of the move.
-    :param turn: The current player's turn ('white' or 'black').
+    :param players: A dictionary mapping colors to computer players, passed on to battle_scene.
+    :param view: A render.TerminalView showing the board, passed on to battle_scene, or None.
+    :return: The events produced by the move.
     """
-    start_row, start_col = convert_to_coordinates(start)
-    end_row, end_col = convert_to_coordinates(end)
-    piece = board[start_row][start_col]
-
-    if board[end_row][end_col] and board[end_row][end_col].color != turn:
-        winner = battle_scene(piece, board[end_row][end_col], board, start, end)
+    events = state.apply_move(convert_to_coordinates(start), convert_to_coordinates(end))
+    report_events(events)
 
-        if winner == piece:
-            board[end_row][end_col] = piece
-            board[start_row][start_col] = None
+    if state.battle is not None:
+        events.extend(battle_scene(state, players, view))
 
-            # Check if the game is over after the battle
-            if is_game_over(board, turn):
-                display_board(board)
-                print(f"Game over! {turn.capitalize()} wins by defeating the opponent's king.")
-                exit()
-        else:
-            # The opponent won the battle, so the current player's piece is removed
-            board[start_row][start_col] = None
-    else:
-        board[end_row][end_col] = piece
-        board[start_row][start_col] = None
+    return events
 
 
-def play_game():
+def play_game(players=None, record=None):
     """
     Play a game of chess until it's over.
-    """
-    board = initialize_board()
-    turn = 'white'
-
-    while True:
-        display_board(board)
 
-        start, end = get_move(turn, board)
-
-        start_row, start_col = convert_to_coordinates(start)
-        end_row, end_col = convert_to_coordinates(end)
-        piece1 = board[start_row][start_col]
-        piece2 = board[end_row][end_col]
+    :param players: A dictionary mapping colors to computer players; other colors are played from the keyboard.
+    :param record: A gamerecord.GameWriter to store the game in when it ends, or None.
+    :return: The winning color, or None if the players quit.
+    """
+    players = players or {}
+    state = GameState()
+    recorder = None
+    if record is not None:
+        from gamerecord import GameRecorder
+        recorder = GameRecorder(state)
+
+    # On a terminal the board stays at the top of the screen and only changed squares are redrawn
+    view = None
+    if sys.stdout.isatty():
+        from render import TerminalView
+        view = TerminalView()
+        view.start()
+
+    try:
+        while state.result() is None:
+            display_board(state.board, view=view, state=state)
+
+            player = players.get(state.turn)
+            if player is not None:
+                move = player.choose_move(state)
+                if move is None:
+                    print(f"{state.turn.capitalize()} has no legal move. The game is a draw.")
+                    if recorder is not None:
+                        record.write(recorder.record())
+                    return None
+                start, end = (convert_to_position(*square) for square in move)
+                print(f"{state.turn.capitalize()} plays {start} {end}")
+            else:
+                move = get_move(state.turn, state.board)
+                if move is None:
+                    print("Quitting the game.")
+                    if recorder is not None:
+                        record.write(recorder.record())
+                    return None
+                start, end = move
+
+            events = update_board(state, start, end, players, view)
+            if recorder is not None:
+                recorder.observe(events)
+
+        if recorder is not None:
+            record.write(recorder.record())
+        display_board(state.board, view=view, state=state)
+        print(f"Game over! {state.result().capitalize()} wins by defeating the opponent's king.")
+        return state.result()
+    finally:
+        if view is not None:
+            view.stop()
+
+
+def script_games(lines):
+    """
+    Split the lines of a batch script into games.
 
-        if piece2 and piece2.color != turn:
-            winner = battle_scene(piece1, piece2, board, start, end)
+    A script holds one move ('e2 e3') or attack choice ('1' or '2') per line, in the
+    order they are played; a blank line ends a game and lines starting with '#' are
+    comments.
 
-            if winner == piece1:
-                board[end_row][end_col] = piece1
-                board[start_row][start_col] = None
-            else:
-                pass
+    :param lines: An iterable of lines, such as an open file.
+    :return: A generator of lists of (line number, text), one list per game.
+    """
+    steps = []
+    for number, line in enumerate(lines, 1):
+        text = line.strip().lower()
+        if text.startswith('#'):
+            continue
+        if text:
+            steps.append((number, text))
+        elif steps:
+            yield steps
+            steps = []
+    if steps:
+        yield steps
+
+
+def play_script_game(steps, recorder_class=None):
+    """
+    Play one game of a batch script without any console input or output.
 
+    :param steps: The (line number, text) steps of the game, from script_games().
+    :param recorder_class: A class like gamerecord.GameRecorder to record the game with, or None.
+    :return: (state, error, recorder): the GameState, a message for the first bad line or None,
+             and the recorder.
+    """
+    state = GameState()
+    recorder = recorder_class(state) if recorder_class is not None else None
+    for number, text in steps:
+        if state.result() is not None:
+            return state, f"line {number}: the game is already over", recorder
+        if state.battle is not None:
+            if text not in ('1', '2'):
+                return state, f"line {number}: expected an attack choice, 1 or 2(special)", recorder
+            choice = int(text)
+            if choice not in state.battle.attack_choices():
+                special_name, _ = state.battle.current.special_attack
+                return state, (f"line {number}: {state.battle.current.name} has used up all special "
+                               f"attack uses for {special_name}."), recorder
+            events = state.apply_attack_choice(choice)
         else:
-            update_board(board, start, end, turn)
+            parsed = parse_move(text)
+            if parsed is None:
+                return state, f"line {number}: Invalid input format. Moves look like 'e2 e3'.", recorder
+            try:
+                events = state.apply_move(convert_to_coordinates(parsed[0]), convert_to_coordinates(parsed[1]))
+            except ValueError as error:
+                return state, f"line {number}: {error}", recorder
+        if recorder is not None:
+            recorder.observe(events)
+    return state, None, recorder
+
+
+def run_batch(lines, output, record=None):
+    """
+    Play every game of a batch script back to back, writing one result line per game:
 
-        if is_game_over(board, turn):
-            display_board(board)
-            print(f"Game over! {turn.capitalize()} wins by defeating the opponent's king.")
-            exit()
+        game <n> <white|black|unfinished> moves=<moves> battles=<battles> [error=<message>]
 
-        turn = 'black' if turn == 'white' else 'white'
+    :param lines: The script lines (see script_games).
+    :param output: The text stream to write result lines to.
+    :param record: A gamerecord.GameWriter to store every game in, or None.
+    :return: A dictionary with the number of games, errors, moves and battles.
+    """
+    recorder_class = None
+    if record is not None:
+        from gamerecord import GameRecorder
+        recorder_class = GameRecorder
+
+    totals = {'games': 0, 'errors': 0, 'moves': 0, 'battles': 0}
+    for number, steps in enumerate(script_games(lines), 1):
+        state, error, recorder = play_script_game(steps, recorder_class)
+        line = (f"game {number} {state.result() or 'unfinished'} "
+                f"moves={state.move_count} battles={state.battle_count}")
+        if error:
+            line += f" error={error}"
+            totals['errors'] += 1
+        output.write(line + "\n")
+        if recorder is not None:
+            record.write(recorder.record())
+        totals['games'] += 1
+        totals['moves'] += state.move_count
+        totals['battles'] += state.battle_count
+    return totals
+
+
+def check_move_cache(games=20, seed=0):
+    """
+    Play seeded random games, with random make/unmake detours along the way, and check
+    after every step that the move cache gives exactly what computing from scratch gives:
+    the same legal moves in the same order, the same attacked squares for both sides, and
+    the same verdict on random moves, valid or not.
 
+    Also run on its own with: python BattleBoards.py --check-cache GAMES
 
-def is_game_over(board, turn):
+    :raise AssertionError: At the first difference.
     """
-    Check if the game is over (one of the kings is defeated).
+    rng = random.Random(seed)
+    squares = [(row, col) for row in range(8) for col in range(8)]
+    for game in range(games):
+        state = GameState()
+        # Each game draws its moves and attack choices from a generator of its own
+        player_rng = random.Random(rng.random())
+        while state.result() is None and state.move_count < 300:
+            if state.battle is not None:
+                state.apply_attack_choice(player_rng.choice(state.battle.attack_choices()))
+                continue
+
+            board, turn = state.board, state.turn
+            expected = legal_moves(board, turn, state.index.squares[turn])
+            assert state.legal_moves() == expected, f"legal moves differ in game {game}"
+            assert sorted(expected) == sorted(legal_moves(board, turn)), f"piece index is off in game {game}"
+            for color in ('white', 'black'):
+                assert state.attacked_squares(color) == attacked_squares(board, color), \
+                    f"attacked squares differ in game {game}"
+
+            start, end = rng.choice(squares), rng.choice(squares)
+            expected = move_error(board, start, end, turn)
+            try:
+                state.apply_move(start, end)
+            except ValueError as error:
+                assert str(error) == expected, f"valid move refused in game {game}"
+            else:
+                assert expected is None, f"invalid move accepted in game {game}"
+                continue
+
+            if rng.random() < 0.2:
+                # Wander off with make_move and come back; the cache has to be right afterwards
+                made, depth = 0, rng.randint(1, 4)
+                while made < depth and state.winner is None and state.legal_moves():
+                    state.make_move(*rng.choice(state.legal_moves()), choose_attack=lambda battle: BASIC_ATTACK)
+                    made += 1
+                for _ in range(made):
+                    state.unmake_move()
+
+            moves = state.legal_moves()
+            if not moves:
+                break
+            state.apply_move(*player_rng.choice(moves))
 
-    :param board: The chess board as a 2D list.
-    :param turn: The current player's turn ('white' or 'black').
-    :return: True if the game is over, False otherwise.
+
+def main():
+    """
+    Run the terminal game, optionally against the computer, or play a batch script.
     """
+    parser = argparse.ArgumentParser(description="Play BattleBoards in the terminal.")
+    parser.add_argument('--computer', choices=['white', 'black'], help="let the computer play this color")
+    parser.add_argument('--depth', type=int, default=3, help="search depth of the computer player")
+    parser.add_argument('--pieces', help="read piece stats from this JSON file instead of pieces.json")
+    parser.add_argument('--tablebase', help="let the computer player use this endgame tablebase file (see tablebase.py)")
+    parser.add_argument('--book', help="let the computer player play openings from this book file (see book.py)")
+    parser.add_argument('--profile', action='store_true', help="time the engine's hot paths and print a report at the end")
+    parser.add_argument('--profile-output', help="also write the profiling numbers to this JSON file")
+    parser.add_argument('--record', help="append the game to this game record file (see gamerecord.py)")
+    parser.add_argument('--batch', metavar='SCRIPT',
+                        help="play the games in this script file ('-' for stdin) without prompting, "
+                             "printing one result line per game")
+    parser.add_argument('--check-cache', type=int, metavar='GAMES',
+                        help="check the move cache against computing from scratch over this many random games")
+    args = parser.parse_args()
+
+    if args.pieces:
+        apply_piece_stats(load_piece_stats(args.pieces))
+
+    if args.check_cache is not None:
+        check_move_cache(args.check_cache)
+        print(f"The move cache matches computing from scratch over {args.check_cache} random games.")
+        return
+
+    players = {}
+    if args.computer:
+        from search import AlphaBetaPlayer
+        tablebase = None
+        if args.tablebase:
+            from tablebase import Tablebase
+            tablebase = Tablebase(args.tablebase)
+        book = None
+        if args.book:
+            from book import OpeningBook
+            book = OpeningBook(args.book)
+        players[args.computer] = AlphaBetaPlayer(max_depth=args.depth, tablebase=tablebase, book=book)
+
+    if args.profile or args.profile_output:
+        import instrumentation
+        instrumentation.enable()
+
+    record = None
+    if args.record:
+        from gamerecord import GameWriter
+        record = GameWriter(args.record, append=True)
+
+    try:
+        if args.batch:
+            script = sys.stdin if args.batch == '-' else open(args.batch)
+            started = time.perf_counter()
+            with script:
+                totals = run_batch(script, sys.stdout, record)
+            elapsed = time.perf_counter() - started
+            print(f"{totals['games']} games, {totals['errors']} with errors, {totals['moves']} moves in "
+                  f"{elapsed:.2f}s ({totals['moves'] / elapsed if elapsed > 0 else 0:.0f} moves/sec)",
+                  file=sys.stderr)
+        else:
+            play_game(players, record)
+    finally:
+        if record is not None:
+            record.close()
 
-    king_symbol = 'K' if turn == 'black' else 'k'
-    for row in board:
-       for piece in row:
-           if isinstance(piece, King) and piece.symbol == king_symbol:
-               return False
-    return True
+    if args.profile or args.profile_output:
+        print(instrumentation.report())
+        if args.profile_output:
+            instrumentation.export_json(args.profile_output)
 
 
 if __name__ == "__main__":
-   play_game()
+   # Run from the imported module so the game and the computer player share the same piece classes
+   import BattleBoards
+   BattleBoards.main()
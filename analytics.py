@@ -0,0 +1,232 @@
+"""
+Aggregate statistics over archived BattleBoards games.
+
+Games come from game record files (see gamerecord.py). Each file is cut
+into chunks of consecutive games, and a process pool maps over the chunks:
+a worker opens the file through its memory map, replays only its own games
+and returns a partial aggregate. The main process merges the partials as
+they arrive. Partials are sums over fixed keys (piece pairs, piece types,
+length bins), so memory stays the same however many games the archive
+holds, and no process ever holds more than one game's record.
+
+The summary has four tables:
+    battles     battles and attacker win rate for every attacker/defender pairing
+    specials    special attacks used per piece type against the uses the
+                pieces started with
+    lengths     the distribution of game lengths in moves, in bins
+    kings       how each King fell: the piece that beat it and whether the
+                King was attacking or defending
+
+Example:
+    python tournament.py --games 1000 --record games.bbgr
+    python analytics.py games.bbgr --output summary.json
+    python analytics.py archive/*.bbgr --chunk 500 --workers 4
+"""
+
+import argparse
+import json
+import struct
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+
+from BattleBoards import PIECE_TYPES, SPECIAL_ATTACK, initialize_board
+from compact import CompactBoard
+from gamerecord import GameReader, iter_replay
+
+PIECE_NAMES = [piece_class.stats.name for piece_class in PIECE_TYPES]
+
+
+def new_aggregate():
+    """
+    Return an empty aggregate. Every field is a Counter, so aggregates merge by adding.
+    """
+    return {
+        'games': Counter(),        # games, moves, battles, wins by color, and skipped games
+        'battles': Counter(),      # (attacker, defender, 'battles' or 'wins')
+        'specials': Counter(),     # (piece, 'used' or 'budget')
+        'lengths': Counter(),      # first move count of the bin
+        'kings': Counter(),        # (winning piece, 'attacking' or 'defending')
+    }
+
+
+def merge(total, part):
+    """
+    Add a partial aggregate into a running total.
+
+    :return: The total.
+    """
+    for name, counts in part.items():
+        total[name].update(counts)
+    return total
+
+
+def add_game(aggregate, record, bin_width=10):
+    """
+    Replay one GameRecord and count it into an aggregate.
+
+    :param bin_width: The number of move counts in each bin of the length distribution.
+    """
+    games, battles, specials, kings = (aggregate['games'], aggregate['battles'], aggregate['specials'],
+                                       aggregate['kings'])
+    board = initialize_board() if record.board is None else CompactBoard(record.board).to_board()
+    for row in board:
+        for piece in row:
+            if piece is not None:
+                specials[(piece.name, 'budget')] += piece.special_uses
+
+    attacker = defender = winner = None
+    for _, events in iter_replay(record):
+        for event in events:
+            kind = event['type']
+            if kind == 'battle_started':
+                attacker, defender = event['attacker'], event['defender']
+                battles[(attacker.name, defender.name, 'battles')] += 1
+            elif kind == 'damage_dealt':
+                if event['choice'] == SPECIAL_ATTACK:
+                    specials[(event['piece'].name, 'used')] += 1
+            elif kind == 'battle_won':
+                winner = event['winner']
+                if winner is attacker:
+                    battles[(attacker.name, defender.name, 'wins')] += 1
+            elif kind == 'king_defeated':
+                kings[(winner.name, 'attacking' if event['piece'] is attacker else 'defending')] += 1
+
+    moves = len(record.moves)
+    games['games'] += 1
+    games['moves'] += moves
+    games['battles'] += sum(1 for _, _, choices in record.moves if choices is not None)
+    games[record.winner or 'unfinished'] += 1
+    aggregate['lengths'][moves // bin_width * bin_width] += 1
+
+
+def map_chunk(job):
+    """
+    Aggregate one chunk of a game record file in a worker process.
+
+    A game that cannot be decoded or replayed is counted as skipped instead of stopping the run;
+    each game is counted into its own aggregate first, so a skipped game adds nothing else.
+
+    :param job: (path, first game, end game, length bin width).
+    :return: The partial aggregate.
+    """
+    path, first, end, bin_width = job
+    aggregate = new_aggregate()
+    with GameReader(path) as reader:
+        for number in range(first, end):
+            game = new_aggregate()
+            try:
+                add_game(game, reader.game(number), bin_width)
+            except (ValueError, IndexError, struct.error):
+                aggregate['games']['skipped'] += 1
+                continue
+            merge(aggregate, game)
+    return aggregate
+
+
+def chunks(paths, chunk, bin_width):
+    """
+    Yield a job for every chunk of at most chunk games in each file, opening each file only to count its games.
+    """
+    for path in paths:
+        with GameReader(path) as reader:
+            count = len(reader)
+        for first in range(0, count, chunk):
+            yield path, first, min(first + chunk, count), bin_width
+
+
+def run_analytics(paths, chunk=200, bin_width=10, workers=None, on_progress=None):
+    """
+    Aggregate every game in a list of game record files across a process pool.
+
+    :param paths: The game record files.
+    :param chunk: Games per task handed to a worker.
+    :param bin_width: Move counts per bin of the length distribution.
+    :param workers: The number of worker processes (defaults to the CPU count).
+    :param on_progress: Called with the running total after every merged chunk.
+    :return: The merged aggregate.
+    """
+    total = new_aggregate()
+    with Pool(workers or cpu_count()) as pool:
+        for part in pool.imap_unordered(map_chunk, chunks(paths, chunk, bin_width)):
+            merge(total, part)
+            if on_progress is not None:
+                on_progress(total)
+    return total
+
+
+def summary_tables(aggregate):
+    """
+    Turn an aggregate into the summary tables, as lists of rows.
+
+    :return: A JSON-serialisable dictionary.
+    """
+    games, battles, specials = aggregate['games'], aggregate['battles'], aggregate['specials']
+    count = games['games']
+    summary = {
+        'games': count,
+        'skipped': games['skipped'],
+        'white_win_rate': games['white'] / count if count else 0.0,
+        'black_win_rate': games['black'] / count if count else 0.0,
+        'unfinished_rate': games['unfinished'] / count if count else 0.0,
+        'mean_moves': games['moves'] / count if count else 0.0,
+        'mean_battles': games['battles'] / count if count else 0.0,
+    }
+    summary['battles'] = [
+        [attacker, defender, battles[(attacker, defender, 'battles')],
+         round(battles[(attacker, defender, 'wins')] / battles[(attacker, defender, 'battles')], 4)]
+        for attacker in PIECE_NAMES for defender in PIECE_NAMES if battles[(attacker, defender, 'battles')]]
+    summary['specials'] = [
+        [name, specials[(name, 'used')], specials[(name, 'budget')],
+         round(specials[(name, 'used')] / specials[(name, 'budget')], 4) if specials[(name, 'budget')] else 0.0]
+        for name in PIECE_NAMES]
+    summary['lengths'] = [[start, games_in_bin] for start, games_in_bin in sorted(aggregate['lengths'].items())]
+    summary['kings'] = [[name, side, defeats] for (name, side), defeats in
+                        sorted(aggregate['kings'].items(), key=lambda item: -item[1])]
+    return summary
+
+
+def format_tables(summary, bin_width=10):
+    """
+    Format summary tables as plain text.
+    """
+    lines = [f"{summary['games']} games: white {summary['white_win_rate']:.1%}, black {summary['black_win_rate']:.1%}, "
+             f"unfinished {summary['unfinished_rate']:.1%}; mean {summary['mean_moves']:.1f} moves, "
+             f"{summary['mean_battles']:.1f} battles"
+             + (f"; skipped {summary['skipped']} unreadable" if summary['skipped'] else ""),
+             "", f"{'attacker':10} {'defender':10} {'battles':>8} {'win rate':>9}"]
+    lines += [f"{attacker:10} {defender:10} {count:8} {rate:9.1%}" for attacker, defender, count, rate in summary['battles']]
+    lines += ["", f"{'piece':10} {'specials':>9} {'budget':>8} {'used':>7}"]
+    lines += [f"{name:10} {used:9} {budget:8} {rate:7.1%}" for name, used, budget, rate in summary['specials']]
+    lines += ["", f"{'moves':>11} {'games':>8}"]
+    lines += [f"{start:5}-{start + bin_width - 1:<5} {count:8}" for start, count in summary['lengths']]
+    lines += ["", f"{'King beaten by':15} {'King was':10} {'games':>7}"]
+    lines += [f"{name:15} {side:10} {count:7}" for name, side, count in summary['kings']]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate statistics over archived BattleBoards games.")
+    parser.add_argument('paths', nargs='+', help="game record files (see gamerecord.py)")
+    parser.add_argument('--chunk', type=int, default=200, help="games per task handed to a worker")
+    parser.add_argument('--bin-width', type=int, default=10, help="moves per bin of the game length table")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--output', help="also write the summary tables to this JSON file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    aggregate = run_analytics(args.paths, args.chunk, args.bin_width, args.workers)
+    elapsed = time.perf_counter() - started
+    summary = summary_tables(aggregate)
+
+    print(format_tables(summary, args.bin_width))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(summary, output, separators=(',', ':'))
+    print(f"{summary['games']} games in {elapsed:.1f}s ({summary['games'] / elapsed if elapsed > 0 else 0:.0f} games/sec)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+NumPy batch battle simulator for BattleBoards balance tuning.
+
+N battles are held as arrays of health, remaining special uses and whose
+turn it is, and every unfinished battle takes one strike per step until all
+of them are over. The rules are the ones Battle uses: the attacker strikes
+first, health is clamped at 0, a special attack needs a remaining use, and
+the battle ends as soon as one piece reaches 0 health.
+
+Attack policies:
+    basic   - always the regular attack
+    greedy  - the special attack while uses remain
+    random  - uniformly among the available attacks
+    optimal - the solver's choice
+
+Example:
+    python batch_battles.py --battles 10000 --attacker-policy greedy --defender-policy optimal
+"""
+
+import argparse
+import random
+
+import numpy as np
+
+from BattleBoards import BASIC_ATTACK, PIECE_TYPES, SPECIAL_ATTACK, Battle
+from solver import best_attack_choice, solve
+
+POLICIES = ('basic', 'greedy', 'random', 'optimal')
+
+
+def _special_mask(policy, rng, basic, special, other_basic, other_special, health, other_health, uses, other_uses):
+    """
+    Return a boolean array telling which strikers use their special attack.
+    """
+    can_special = uses > 0
+    if policy == 'basic':
+        return np.zeros_like(can_special)
+    if policy == 'greedy':
+        return can_special
+    if policy == 'random':
+        return can_special & (rng.random(len(uses)) < 0.5)
+    if policy == 'optimal':
+        states = np.stack([basic, special, other_basic, other_special, health, other_health, uses, other_uses], axis=1)
+        unique, inverse = np.unique(states, axis=0, return_inverse=True)
+        choices = np.array([solve(*map(int, row))[1] == SPECIAL_ATTACK for row in unique], dtype=bool)
+        return choices[inverse.reshape(-1)]
+    raise ValueError(f"Unknown policy: {policy}")
+
+
+def simulate(attacker, defender, attacker_policy='optimal', defender_policy='optimal', seed=0):
+    """
+    Fight a batch of battles in lockstep.
+
+    :param attacker: A dictionary of equal-length integer arrays for the attacking pieces:
+                     'basic', 'special', 'health' and 'uses'.
+    :param defender: The same for the defending pieces.
+    :param attacker_policy: The attack policy of the attackers.
+    :param defender_policy: The attack policy of the defenders.
+    :param seed: The seed for the 'random' policy.
+    :return: (attacker_won, strikes): a boolean array and the number of strikes each battle took.
+    """
+    rng = np.random.default_rng(seed)
+    basic = np.stack([np.asarray(attacker['basic']), np.asarray(defender['basic'])]).astype(np.int64)
+    special = np.stack([np.asarray(attacker['special']), np.asarray(defender['special'])]).astype(np.int64)
+    health = np.stack([np.asarray(attacker['health']), np.asarray(defender['health'])]).astype(np.int64)
+    uses = np.stack([np.asarray(attacker['uses']), np.asarray(defender['uses'])]).astype(np.int64)
+    policies = (attacker_policy, defender_policy)
+
+    count = health.shape[1]
+    index = np.arange(count)
+    turn = np.zeros(count, dtype=np.int64)
+    strikes = np.zeros(count, dtype=np.int64)
+    active = np.ones(count, dtype=bool)
+
+    while active.any():
+        for side in (0, 1):
+            striking = index[active & (turn == side)]
+            if len(striking) == 0:
+                continue
+            other = 1 - side
+            use_special = _special_mask(policies[side], rng,
+                                        basic[side, striking], special[side, striking],
+                                        basic[other, striking], special[other, striking],
+                                        health[side, striking], health[other, striking],
+                                        uses[side, striking], uses[other, striking])
+            damage = np.where(use_special, special[side, striking], basic[side, striking])
+            uses[side, striking] -= use_special
+            health[other, striking] = np.maximum(health[other, striking] - damage, 0)
+            strikes[striking] += 1
+
+        active &= (health[0] > 0) & (health[1] > 0)
+        turn[active] = 1 - turn[active]
+
+    return health[0] > 0, strikes
+
+
+def _piece_arrays(piece_class, battles):
+    stats = piece_class.stats
+    return {
+        'basic': np.full(battles, stats.attack_damage),
+        'special': np.full(battles, stats.special_damage),
+        'health': np.full(battles, stats.health),
+        'uses': np.full(battles, stats.special_uses),
+    }
+
+
+def simulate_matchups(battles, attacker_policy='optimal', defender_policy='optimal', seed=0):
+    """
+    Fight every pairing of piece types at full health, all in one batch.
+
+    :param battles: The number of battles per pairing.
+    :return: A dictionary mapping (attacker name, defender name) to a dictionary with
+             'attacker_win_rate' and 'strikes', the count of battles per number of strikes.
+    """
+    pairs = [(a, d) for a in PIECE_TYPES for d in PIECE_TYPES]
+    attacker = {key: np.concatenate([_piece_arrays(a, battles)[key] for a, _ in pairs]) for key in
+                ('basic', 'special', 'health', 'uses')}
+    defender = {key: np.concatenate([_piece_arrays(d, battles)[key] for _, d in pairs]) for key in
+                ('basic', 'special', 'health', 'uses')}
+
+    attacker_won, strikes = simulate(attacker, defender, attacker_policy, defender_policy, seed)
+
+    results = {}
+    for number, (a, d) in enumerate(pairs):
+        window = slice(number * battles, (number + 1) * battles)
+        results[a.stats.name, d.stats.name] = {
+            'attacker_win_rate': float(attacker_won[window].mean()),
+            'strikes': {int(n): int(c) for n, c in enumerate(np.bincount(strikes[window])) if c},
+        }
+    return results
+
+
+def check_against_battle(attacker_policy, defender_policy, battles=50, seed=0):
+    """
+    Fight the same battles with the engine's Battle class and check that every one
+    ends the same way after the same number of strikes. Policies that make random
+    choices draw different numbers than the batch, so they are only run, not compared.
+    """
+    deterministic = 'random' not in (attacker_policy, defender_policy)
+    for a in PIECE_TYPES:
+        for d in PIECE_TYPES:
+            attacker_won, strikes = simulate(_piece_arrays(a, battles), _piece_arrays(d, battles),
+                                             attacker_policy, defender_policy, seed)
+            rng = random.Random(seed)
+            for number in range(battles):
+                battle = Battle(a('white'), d('black'))
+                count = 0
+                while battle.winner is None:
+                    policy = attacker_policy if battle.current is battle.attacker else defender_policy
+                    choices = battle.attack_choices()
+                    if policy == 'basic':
+                        choice = BASIC_ATTACK
+                    elif policy == 'greedy':
+                        choice = choices[-1]
+                    elif policy == 'optimal':
+                        choice = best_attack_choice(battle)
+                    else:
+                        choice = rng.choice(choices)
+                    battle.strike(choice)
+                    count += 1
+                if deterministic and ((battle.winner is battle.attacker) != attacker_won[number] or
+                                      count != strikes[number]):
+                    raise AssertionError(f"{a.stats.name} vs {d.stats.name} differs from Battle")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate BattleBoards battles in bulk.")
+    parser.add_argument('--battles', type=int, default=10000, help="battles per pairing")
+    parser.add_argument('--attacker-policy', choices=POLICIES, default='optimal')
+    parser.add_argument('--defender-policy', choices=POLICIES, default='optimal')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    check_against_battle(args.attacker_policy, args.defender_policy)
+
+    results = simulate_matchups(args.battles, args.attacker_policy, args.defender_policy, args.seed)
+    print(f"{'attacker':>8} {'defender':>8} {'win rate':>9}  strikes (count)")
+    for (attacker, defender), result in results.items():
+        strikes = ", ".join(f"{n} ({c})" for n, c in result['strikes'].items())
+        print(f"{attacker:>8} {defender:>8} {result['attacker_win_rate']:>9.3f}  {strikes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Benchmark suite for BattleBoards.
+
+Three parts:
+    perft     - counts positions reachable from initialize_board to a given depth,
+                giving node counts that must stay the same between runs and nodes/sec.
+                Captures are resolved as optimal battles with the solver, the way the
+                search sees them.
+    micro     - calls/sec of every valid_moves implementation, with the uncached
+                piece_targets to compare bitboard move_mask against, is_valid_move,
+                is_game_over, cached and uncached legal moves and attacked squares,
+                batched evaluator encoding and scoring, and battle resolution over
+                positions from seeded games.
+    rollouts  - complete random games per second.
+    scaling   - for variant boards of several sizes, with the full-width 'ranks'
+                layout and the 32-piece 'centred' one: legal moves/sec from the
+                sparse board's piece list against finding the pieces by scanning
+                a dense grid, random playout moves/sec, and the memory of both
+                representations.
+
+Before measuring anything, the move cache is checked against computing from
+scratch over seeded random games. Results are written as JSON. Comparing
+against an earlier result file reports the speed ratio of every measurement
+and fails on changed perft counts or on slowdowns beyond the tolerance.
+
+Example:
+    python benchmarks.py --output before.json
+    python benchmarks.py --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from BattleBoards import (BASIC_ATTACK, PIECE_TYPES, Battle, GameState, attacked_squares, check_move_cache,
+                          convert_to_position, is_game_over, is_valid_move, legal_moves, piece_targets)
+from bitboards import Bitboards, COLOR_INDEX, PIECE_INDEX, move_mask
+from evaluator import Evaluator, LeafBatch
+from solver import best_attack_choice, fight, solve_pieces
+from tournament import RandomPlayer, play_one_game
+from variants import LAYOUTS, SparseBoard, VariantGame, grid_bytes
+from variants import piece_targets as variant_targets
+
+
+def perft(state, depth, counts):
+    """
+    Count the positions reachable in exactly 1..depth moves.
+
+    :param state: The GameState to count from; every move is taken back before returning.
+    :param depth: The number of moves to look ahead.
+    :param counts: A list of {'nodes', 'captures', 'kings_defeated'} dictionaries, one per ply, to add to.
+    """
+    ply = len(counts) - depth
+    board = state.board
+    for start, end in state.legal_moves():
+        counts[ply]['nodes'] += 1
+        if board[end[0]][end[1]] is not None:
+            counts[ply]['captures'] += 1
+
+        state.make_move(start, end, best_attack_choice)
+        if state.winner is not None:
+            counts[ply]['kings_defeated'] += 1
+        elif depth > 1:
+            perft(state, depth - 1, counts)
+        state.unmake_move()
+
+
+def run_perft(depth):
+    counts = [{'nodes': 0, 'captures': 0, 'kings_defeated': 0} for _ in range(depth)]
+    started = time.perf_counter()
+    perft(GameState(), depth, counts)
+    elapsed = time.perf_counter() - started
+    nodes = sum(count['nodes'] for count in counts)
+    return {
+        'depth': depth,
+        'plies': counts,
+        'seconds': elapsed,
+        'nodes_per_sec': nodes / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def sample_positions(count, seed):
+    """
+    Collect positions (board, turn) from seeded random games.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = GameState()
+        player = RandomPlayer(rng.random())
+        while state.result() is None and len(positions) < count:
+            if state.battle is not None:
+                state.apply_attack_choice(player.choose_attack(state))
+                continue
+            if rng.random() < 0.1:
+                snapshot = [[piece for piece in row] for row in state.board]
+                positions.append((snapshot, state.turn))
+            state.apply_move(*player.choose_move(state))
+    return positions
+
+
+def _rate(function, calls_per_round, min_seconds):
+    """
+    Call function repeatedly for at least min_seconds and return calls/sec.
+    """
+    rounds = 0
+    started = time.perf_counter()
+    while True:
+        function()
+        rounds += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return rounds * calls_per_round / elapsed
+
+
+def run_micro(positions, min_seconds):
+    results = {}
+
+    for piece_class in PIECE_TYPES:
+        name = piece_class.stats.name
+        placed = [(board, row, col, board[row][col]) for board, _ in positions
+                  for row in range(8) for col in range(8)
+                  if board[row][col] is not None and type(board[row][col]) is piece_class]
+        if not placed:
+            continue
+        bitboards = [(Bitboards.from_board(board), row * 8 + col, COLOR_INDEX[piece.color])
+                     for board, row, col, piece in placed]
+
+        def list_moves():
+            for board, row, col, piece in placed:
+                piece.valid_moves(row, col, board)
+
+        def uncached_targets():
+            for board, row, col, piece in placed:
+                piece_targets(piece, row, col, board)
+
+        def lazy_first_move():
+            for board, row, col, piece in placed:
+                next(piece.iter_moves(row, col, board), None)
+
+        def bitboard_moves():
+            for boards, sq, color in bitboards:
+                move_mask(PIECE_INDEX[name], sq, boards.occupancy[color], boards.occupancy[1 - color])
+
+        results[f'valid_moves[{name}]'] = _rate(list_moves, len(placed), min_seconds)
+        results[f'piece_targets[{name}]'] = _rate(uncached_targets, len(placed), min_seconds)
+        results[f'iter_moves first[{name}]'] = _rate(lazy_first_move, len(placed), min_seconds)
+        results[f'bitboard move_mask[{name}]'] = _rate(bitboard_moves, len(placed), min_seconds)
+
+    checks = []
+    for board, turn in positions:
+        for start, end in legal_moves(board, turn)[:5]:
+            checks.append((convert_to_position(*start), convert_to_position(*end), board, turn))
+
+    def valid_checks():
+        for start, end, board, turn in checks:
+            is_valid_move(start, end, board, turn)
+
+    def game_over_checks():
+        for board, turn in positions:
+            is_game_over(board, turn)
+
+    results['is_valid_move'] = _rate(valid_checks, len(checks), min_seconds)
+    results['is_game_over'] = _rate(game_over_checks, len(positions), min_seconds)
+    results['legal_moves'] = _rate(lambda: [legal_moves(board, turn) for board, turn in positions],
+                                   len(positions), min_seconds)
+    states = [GameState(board, turn) for board, turn in positions]
+    results['legal_moves (MoveCache, warm)'] = _rate(lambda: [state.legal_moves() for state in states],
+                                                     len(states), min_seconds)
+    results['attacked_squares'] = _rate(lambda: [attacked_squares(board, turn) for board, turn in positions],
+                                        len(positions), min_seconds)
+    results['attacked_squares (MoveCache, warm)'] = _rate(
+        lambda: [state.attacked_squares(state.turn) for state in states], len(states), min_seconds)
+
+    leaves = LeafBatch(Evaluator(), len(states))
+
+    def encode_leaves():
+        leaves.clear()
+        for state in states:
+            leaves.add(state)
+
+    results['evaluator encode'] = _rate(encode_leaves, len(states), min_seconds)
+    results['evaluator batch scoring'] = _rate(leaves.scores, len(states), min_seconds)
+
+    pairs = [(a, d) for a in PIECE_TYPES for d in PIECE_TYPES]
+
+    def basic_battles():
+        for a, d in pairs:
+            battle = Battle(a('white'), d('black'))
+            while battle.winner is None:
+                battle.strike(BASIC_ATTACK)
+
+    def optimal_battles():
+        for a, d in pairs:
+            fight(a('white'), d('black'))
+
+    def solver_lookups():
+        for a, d in pairs:
+            solve_pieces(a('white'), d('black'))
+
+    results['battle (Battle, basic attacks)'] = _rate(basic_battles, len(pairs), min_seconds)
+    results['battle (solver.fight)'] = _rate(optimal_battles, len(pairs), min_seconds)
+    results['battle outcome lookup'] = _rate(solver_lookups, len(pairs), min_seconds)
+    return results
+
+
+def run_rollouts(games, seed):
+    started = time.perf_counter()
+    moves = 0
+    for game in range(games):
+        players = {'white': RandomPlayer(seed + 2 * game), 'black': RandomPlayer(seed + 2 * game + 1)}
+        moves += play_one_game(players)['moves']
+    elapsed = time.perf_counter() - started
+    return {
+        'games': games,
+        'games_per_sec': games / elapsed if elapsed > 0 else 0.0,
+        'moves_per_sec': moves / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def run_scaling(sizes, seed, min_seconds, opening_moves=20, playout_moves=200):
+    """
+    Measure move generation, playouts and memory on variant boards of each size and layout, in a
+    position reached by opening_moves seeded random moves. Legal moves are generated with the
+    same rules from the sparse board's own dictionary of the side's pieces, and after finding the
+    pieces by scanning a dense grid, as a board without a piece list has to.
+
+    :return: A dictionary keyed by "layout size".
+    """
+    results = {}
+    for layout in LAYOUTS:
+        for size in sizes:
+            rng = random.Random(seed)
+            game = VariantGame(size, layout=layout)
+            for _ in range(opening_moves):
+                game.play(*rng.choice(game.legal_moves()))
+            if game.winner is not None:
+                continue
+            board, turn = game.board, game.turn
+            grid = board.to_grid()
+
+            def scanned_moves():
+                moves = []
+                for row in range(size):
+                    pieces = grid[row]
+                    for col in range(size):
+                        piece = pieces[col]
+                        if piece is not None and piece.color == turn:
+                            start = row * size + col
+                            moves.extend((start, end) for end in variant_targets(piece, start, board))
+                return moves
+
+            snapshot = list(board.squares.items())
+            moves_played = 0
+            started = time.perf_counter()
+            while moves_played == 0 or time.perf_counter() - started < min_seconds:
+                copy = SparseBoard(size)
+                for square, piece in snapshot:
+                    copy.place(square, type(piece)(piece.color))
+                played = VariantGame(board=copy, turn=turn)
+                while played.winner is None and played.move_count < playout_moves:
+                    played.play(*rng.choice(played.legal_moves()))
+                moves_played += played.move_count
+            elapsed = time.perf_counter() - started
+
+            results[f"{layout} {size}"] = {
+                'pieces': len(board.squares),
+                'moves': len(game.legal_moves()),
+                'legal_moves_per_sec': _rate(game.legal_moves, 1, min_seconds),
+                'grid_scan_legal_moves_per_sec': _rate(scanned_moves, 1, min_seconds),
+                'playout_moves_per_sec': moves_played / elapsed,
+                'sparse_bytes': board.nbytes(),
+                'grid_bytes': grid_bytes(grid),
+            }
+    return results
+
+
+def run_all(depth=3, positions=200, rollouts=100, seed=0, min_seconds=0.2, sizes=(8, 16, 32, 64)):
+    """
+    Run the whole suite.
+
+    :return: A JSON-serialisable dictionary of results.
+    """
+    return {
+        'meta': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seed': seed,
+        },
+        'perft': run_perft(depth),
+        'micro': run_micro(sample_positions(positions, seed), min_seconds),
+        'rollouts': run_rollouts(rollouts, seed),
+        'scaling': run_scaling(sizes, seed, min_seconds),
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    Print how each measurement changed against an earlier run.
+
+    :param tolerance: The fraction by which a measurement may slow down before it counts as a regression.
+    :return: A list of problems found (perft count changes and regressions).
+    """
+    problems = []
+    if current['perft']['depth'] == baseline['perft']['depth'] and \
+            current['perft']['plies'] != baseline['perft']['plies']:
+        problems.append("perft counts changed")
+
+    rates = [('perft nodes/sec', current['perft']['nodes_per_sec'], baseline['perft']['nodes_per_sec']),
+             ('rollout games/sec', current['rollouts']['games_per_sec'], baseline['rollouts']['games_per_sec'])]
+    rates += [(name, rate, baseline['micro'][name]) for name, rate in current['micro'].items()
+              if name in baseline['micro']]
+    for variant, scaling in current.get('scaling', {}).items():
+        old = baseline.get('scaling', {}).get(variant)
+        if old is not None:
+            rates += [(f'{variant} legal moves/sec', scaling['legal_moves_per_sec'], old['legal_moves_per_sec']),
+                      (f'{variant} playout moves/sec', scaling['playout_moves_per_sec'],
+                       old['playout_moves_per_sec'])]
+
+    for name, rate, old_rate in rates:
+        ratio = rate / old_rate if old_rate else float('inf')
+        marker = ""
+        if ratio < 1 - tolerance:
+            marker = "  REGRESSION"
+            problems.append(f"{name} slowed down to {ratio:.2f}x")
+        print(f"{name:40} {old_rate:14.0f} -> {rate:14.0f}  {ratio:5.2f}x{marker}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BattleBoards move generation, battles and games.")
+    parser.add_argument('--depth', type=int, default=3, help="perft depth")
+    parser.add_argument('--positions', type=int, default=200, help="sampled positions for the microbenchmarks")
+    parser.add_argument('--rollouts', type=int, default=100, help="random games to play")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-seconds', type=float, default=0.2, help="minimum time per microbenchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8, 16, 32, 64], help="variant board sizes to scale to")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="compare against an earlier JSON result file")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed slowdown before a regression")
+    args = parser.parse_args()
+
+    check_move_cache(seed=args.seed)
+    results = run_all(args.depth, args.positions, args.rollouts, args.seed, args.min_seconds, args.sizes)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            problems = compare(results, json.load(baseline_file), args.tolerance)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Bitboard move generation for BattleBoards.
+
+Each side keeps one 64-bit integer per piece type, with bit (row * 8 + col)
+set when that side has such a piece on the square. Moves are produced from
+precomputed jump masks and ray masks, and follow the same rules as the
+valid_moves methods in BattleBoards.py, including their quirks: Rooks move
+along their whole rank and file regardless of blockers, and Pawns step both
+forward and backward (onto any square not held by their own side) while only
+moving diagonally onto enemy pieces.
+
+The engine does not generate its moves here. A full move list from bitboards
+is about twice as fast as legal_moves without the move cache, but GameState
+keeps its position as a 2D list, and building bitboards from one costs more
+than that saves; the warm MoveCache is faster than both. The evaluator uses
+move_mask to count mobility from bitboards it builds anyway.
+"""
+
+import random
+import time
+
+from BattleBoards import (DIAGONAL_DIRECTIONS, KING_OFFSETS, KNIGHT_OFFSETS, ORTHOGONAL_DIRECTIONS,
+                          PAWN_CAPTURE_OFFSETS, PAWN_STEP_OFFSETS, GameState, initialize_board)
+from BattleBoards import legal_moves as engine_legal_moves
+
+COLORS = ('white', 'black')
+PIECE_NAMES = ('King', 'Rook', 'Bishop', 'Queen', 'Knight', 'Pawn')
+KING, ROOK, BISHOP, QUEEN, KNIGHT, PAWN = range(6)
+PIECE_INDEX = {name: index for index, name in enumerate(PIECE_NAMES)}
+COLOR_INDEX = {color: index for index, color in enumerate(COLORS)}
+
+FULL = (1 << 64) - 1
+
+
+def _on_board(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _jump_masks(offsets):
+    masks = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        mask = 0
+        for dr, dc in offsets:
+            if _on_board(row + dr, col + dc):
+                mask |= 1 << ((row + dr) * 8 + col + dc)
+        masks.append(mask)
+    return masks
+
+
+def _ray_masks(dr, dc):
+    masks = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        mask = 0
+        row, col = row + dr, col + dc
+        while _on_board(row, col):
+            mask |= 1 << (row * 8 + col)
+            row, col = row + dr, col + dc
+        masks.append(mask)
+    return masks
+
+
+# The offsets and directions are the engine's, so both move generators follow the same rules
+KING_MASKS = _jump_masks([offset for offset in KING_OFFSETS if offset != (0, 0)])
+KNIGHT_MASKS = _jump_masks(KNIGHT_OFFSETS)
+PAWN_STEP_MASKS = _jump_masks(PAWN_STEP_OFFSETS)
+PAWN_CAPTURE_MASKS = _jump_masks(PAWN_CAPTURE_OFFSETS)
+
+# Ray directions that walk towards higher square indices find their nearest
+# blocker with the lowest set bit, the others with the highest set bit.
+ORTHOGONAL_RAYS = [(_ray_masks(dr, dc), (dr, dc) > (0, 0)) for dr, dc in ORTHOGONAL_DIRECTIONS]
+DIAGONAL_RAYS = [(_ray_masks(dr, dc), (dr, dc) > (0, 0)) for dr, dc in DIAGONAL_DIRECTIONS]
+ROOK_MASKS = [ORTHOGONAL_RAYS[0][0][sq] | ORTHOGONAL_RAYS[1][0][sq] |
+              ORTHOGONAL_RAYS[2][0][sq] | ORTHOGONAL_RAYS[3][0][sq] for sq in range(64)]
+
+
+def iter_squares(bitboard):
+    """
+    Yield the index of every set bit in a bitboard, lowest first.
+
+    :param bitboard: A 64-bit occupancy integer.
+    """
+    while bitboard:
+        low = bitboard & -bitboard
+        yield low.bit_length() - 1
+        bitboard ^= low
+
+
+def slide(sq, occupied, rays):
+    """
+    Return the squares reached by sliding from sq until the first occupied square
+    (which is included) along each of the given rays.
+
+    :param sq: The starting square index.
+    :param occupied: The bitboard of all occupied squares.
+    :param rays: ORTHOGONAL_RAYS or DIAGONAL_RAYS.
+    :return: A bitboard of reachable squares.
+    """
+    reached = 0
+    for masks, ascending in rays:
+        ray = masks[sq]
+        blockers = ray & occupied
+        if blockers:
+            if ascending:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= masks[first]
+        reached |= ray
+    return reached
+
+
+def move_mask(piece_type, sq, own, enemy):
+    """
+    Return the bitboard of destinations for a piece, excluding squares held by its own side.
+
+    :param piece_type: One of KING, ROOK, BISHOP, QUEEN, KNIGHT or PAWN.
+    :param sq: The square index of the piece.
+    :param own: The bitboard of the moving side's pieces.
+    :param enemy: The bitboard of the other side's pieces.
+    :return: A bitboard of destination squares.
+    """
+    if piece_type == KING:
+        targets = KING_MASKS[sq]
+    elif piece_type == KNIGHT:
+        targets = KNIGHT_MASKS[sq]
+    elif piece_type == ROOK:
+        targets = ROOK_MASKS[sq]
+    elif piece_type == BISHOP:
+        targets = slide(sq, own | enemy, DIAGONAL_RAYS)
+    elif piece_type == QUEEN:
+        occupied = own | enemy
+        targets = slide(sq, occupied, ORTHOGONAL_RAYS) | slide(sq, occupied, DIAGONAL_RAYS)
+    else:
+        targets = PAWN_STEP_MASKS[sq] | (PAWN_CAPTURE_MASKS[sq] & enemy)
+    return targets & ~own & FULL
+
+
+class Bitboards:
+    __slots__ = ('pieces', 'occupancy')
+
+    def __init__(self):
+        """
+        Create an empty set of bitboards: pieces[color][piece_type] and occupancy[color].
+        """
+        self.pieces = [[0] * 6, [0] * 6]
+        self.occupancy = [0, 0]
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Build bitboards from a 2D board of ChessPiece objects.
+
+        :param board: The chess board as a 2D list.
+        :return: A Bitboards instance.
+        """
+        bitboards = cls()
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece is not None:
+                    bitboards.add_piece(COLOR_INDEX[piece.color], PIECE_INDEX[piece.name], row * 8 + col)
+        return bitboards
+
+    def add_piece(self, color, piece_type, sq):
+        bit = 1 << sq
+        self.pieces[color][piece_type] |= bit
+        self.occupancy[color] |= bit
+
+    def remove_piece(self, color, piece_type, sq):
+        bit = ~(1 << sq)
+        self.pieces[color][piece_type] &= bit
+        self.occupancy[color] &= bit
+
+    def move_piece(self, color, piece_type, from_sq, to_sq):
+        """
+        Move a piece to an empty square, or onto a square whose occupant was already removed.
+        """
+        self.remove_piece(color, piece_type, from_sq)
+        self.add_piece(color, piece_type, to_sq)
+
+    def piece_at(self, sq):
+        """
+        Return (color, piece_type) for the piece on a square, or None if it is empty.
+        """
+        bit = 1 << sq
+        for color in (0, 1):
+            if self.occupancy[color] & bit:
+                for piece_type, bitboard in enumerate(self.pieces[color]):
+                    if bitboard & bit:
+                        return color, piece_type
+        return None
+
+    def move_targets(self, color):
+        """
+        Return the destination bitboard of every piece on one side. This is the
+        cheapest form of the move list; counting moves needs no more than this.
+
+        :param color: 0 for white, 1 for black.
+        :return: A list of (from_sq, targets) pairs.
+        """
+        own = self.occupancy[color]
+        enemy = self.occupancy[1 - color]
+        targets = []
+        for piece_type, bitboard in enumerate(self.pieces[color]):
+            while bitboard:
+                low = bitboard & -bitboard
+                sq = low.bit_length() - 1
+                bitboard ^= low
+                targets.append((sq, move_mask(piece_type, sq, own, enemy)))
+        return targets
+
+    def count_moves(self, color):
+        """
+        Return the number of moves available to one side without listing them.
+        """
+        return sum(targets.bit_count() for _, targets in self.move_targets(color))
+
+    def generate_moves(self, color):
+        """
+        Return every move for one side.
+
+        :param color: 0 for white, 1 for black.
+        :return: A list of (from_sq, to_sq) square index pairs.
+        """
+        moves = []
+        for sq, targets in self.move_targets(color):
+            while targets:
+                low = targets & -targets
+                moves.append((sq, low.bit_length() - 1))
+                targets ^= low
+        return moves
+
+
+def legal_moves(board, turn):
+    """
+    Return the same moves as GameState.legal_moves, generated with bitboards.
+
+    :param board: The chess board as a 2D list.
+    :param turn: The player to move ('white' or 'black').
+    :return: A list of ((start_row, start_col), (end_row, end_col)) tuples.
+    """
+    moves = Bitboards.from_board(board).generate_moves(COLOR_INDEX[turn])
+    return [(divmod(start, 8), divmod(end, 8)) for start, end in moves]
+
+
+def compare_with_valid_moves(games=20, seed=0):
+    """
+    Play random games and check that bitboard move generation agrees with
+    GameState.legal_moves in every position reached.
+
+    :param games: The number of random games to play.
+    :param seed: The random seed.
+    :return: The number of positions compared.
+    """
+    rng = random.Random(seed)
+    positions = 0
+    for _ in range(games):
+        state = GameState()
+        while state.result() is None:
+            if state.battle is not None:
+                state.apply_attack_choice(rng.choice(state.battle.attack_choices()))
+                continue
+            expected = state.legal_moves()
+            if sorted(expected) != sorted(legal_moves(state.board, state.turn)):
+                raise AssertionError(f"Bitboard moves differ after {state.move_count} moves")
+            positions += 1
+            state.apply_move(*rng.choice(expected))
+    return positions
+
+
+if __name__ == "__main__":
+    positions = compare_with_valid_moves()
+    print(f"Bitboard moves match valid_moves in {positions} positions.")
+
+    board = initialize_board()
+    state = GameState(board)
+    bitboards = Bitboards.from_board(board)
+    for label, generate in (("legal_moves (uncached)", lambda: engine_legal_moves(board, 'white')),
+                            ("legal_moves (MoveCache, warm)", state.legal_moves),
+                            ("bitboards", lambda: bitboards.generate_moves(0)),
+                            ("bitboard targets", lambda: bitboards.move_targets(0)),
+                            ("bitboards built from the board", lambda: legal_moves(board, 'white'))):
+        start = time.perf_counter()
+        for _ in range(2000):
+            generate()
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {2000 / elapsed:.0f} move lists/sec")
@@ -0,0 +1,300 @@
+"""
+Opening book for BattleBoards, built from self-play games.
+
+The book holds, for every position seen in the first plies of recorded
+games, each move played there with how many games it was played in and how
+many of those the player who made it went on to win or lose. Positions are
+keyed by the search's Zobrist key, which covers every piece's health and
+special uses, so positions that only differ after a battle stay apart.
+
+File layout (all integers little-endian):
+    header      b'BBOB', u16 version, u16 plies, u64 record count,
+                u64 digest of the piece stats the games were played with
+    records     u64 key, u16 move (start | end << 6), u16 first ply seen,
+                u32 games, u32 wins, u32 losses, sorted by key, then move
+
+Records have a fixed size and are sorted, so a probe is a binary search
+over the keys read straight from the file's memory map; the moves of one
+position are neighbours. The builder replays a batch of new games into
+records, sorts them and merges them with the existing file in one pass,
+so growing the book never replays the games already in it.
+
+A player only takes a move from the book once it has been played in enough
+games and won more of them than it lost; anywhere else it searches.
+
+Example:
+    python tournament.py --games 500 --white alphabeta --black alphabeta --record batch1.bbgr
+    python book.py book.bbob --add batch1.bbgr --plies 12
+    python tournament.py --games 500 --white alphabeta --black alphabeta --book book.bbob --record batch2.bbgr
+    python book.py book.bbob --add batch2.bbgr
+    python book.py book.bbob --min-games 10
+"""
+
+import argparse
+import mmap
+import os
+import struct
+
+from BattleBoards import GameState, convert_to_position, initialize_board, piece_stats_digest
+from compact import CompactBoard
+from search import ZOBRIST
+from solver import best_attack_choice
+
+MAGIC = b'BBOB'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHHQQ')
+_RECORD = struct.Struct('<QHHIII')
+_KEY_WORDS = _RECORD.size // 8
+
+# A book move is only played after this many games, and only if it won more than it lost
+MIN_GAMES = 5
+MIN_SCORE = 0.0
+
+
+def pack_move(start, end):
+    return start[0] * 8 + start[1] | (end[0] * 8 + end[1]) << 6
+
+
+def unpack_move(packed):
+    start, end = packed & 63, packed >> 6 & 63
+    return (start >> 3, start & 7), (end >> 3, end & 7)
+
+
+def book_entries(records, plies):
+    """
+    Replay the first plies of games and count the moves played in each position.
+
+    :param records: GameRecords, such as a gamerecord.GameReader.
+    :param plies: The number of moves from the start of each game to count.
+    :return: A dictionary mapping (key, packed move) to [first ply, games, wins, losses], with
+             wins and losses counted for the player who made the move.
+    """
+    entries = {}
+    for record in records:
+        board = initialize_board() if record.board is None else CompactBoard(record.board).to_board()
+        state = GameState(board, record.turn)
+        for ply, (start, end, choices) in enumerate(record.moves[:plies]):
+            mover = state.turn
+            slot = (ZOBRIST.position_key(state.board, mover), pack_move(start, end))
+            entry = entries.get(slot)
+            if entry is None:
+                entry = entries[slot] = [ply, 0, 0, 0]
+            entry[0] = min(entry[0], ply)
+            entry[1] += 1
+            if record.winner == mover:
+                entry[2] += 1
+            elif record.winner is not None:
+                entry[3] += 1
+            state.apply_move(start, end)
+            for choice in choices or ():
+                state.apply_attack_choice(choice)
+    return entries
+
+
+def merge_records(old, new):
+    """
+    Merge two sorted streams of (key, move, first ply, games, wins, losses) records, adding up
+    the records of the same key and move.
+    """
+    old, new = iter(old), iter(new)
+    a, b = next(old, None), next(new, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[:2] < b[:2]):
+            yield a
+            a = next(old, None)
+        elif a is None or b[:2] < a[:2]:
+            yield b
+            b = next(new, None)
+        else:
+            yield a[0], a[1], min(a[2], b[2]), a[3] + b[3], a[4] + b[4], a[5] + b[5]
+            a, b = next(old, None), next(new, None)
+
+
+def write_book(path, records, plies):
+    """
+    Write sorted records to a book file, through a temporary file so an open book is not disturbed.
+
+    :return: The number of records written.
+    """
+    count = 0
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, plies, 0, piece_stats_digest()))
+        pack = _RECORD.pack
+        for record in records:
+            file.write(pack(*record))
+            count += 1
+        file.seek(0)
+        file.write(_HEADER.pack(MAGIC, VERSION, plies, count, piece_stats_digest()))
+    os.replace(temporary, path)
+    return count
+
+
+def add_games(path, records, plies=12):
+    """
+    Merge a batch of games into a book file, creating it if it does not exist.
+
+    :param records: GameRecords of the new games.
+    :param plies: Moves counted from the start of each game; an existing book keeps its own.
+    :return: (records in the book, records the batch touched).
+    """
+    if not os.path.exists(path):
+        new = sorted((key, move) + tuple(entry) for (key, move), entry in book_entries(records, plies).items())
+        return write_book(path, new, plies), len(new)
+
+    with OpeningBook(path) as book:
+        new = sorted((key, move) + tuple(entry) for (key, move), entry in book_entries(records, book.plies).items())
+        count = write_book(path, merge_records(book.records(), new), book.plies)
+    return count, len(new)
+
+
+class OpeningBook:
+    def __init__(self, path, min_games=MIN_GAMES, min_score=MIN_SCORE):
+        """
+        Open a book file through a memory map.
+
+        :param path: The file to read.
+        :param min_games: Games a move must have been played in before best_move picks it.
+        :param min_score: The score (see score()) a move must beat before best_move picks it.
+        """
+        self.file = open(path, 'rb')
+        size = self.file.seek(0, 2)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        try:
+            magic, version, self.plies, self.count, digest = _HEADER.unpack_from(self.map, 0)
+        except (struct.error, TypeError):
+            magic = version = None
+        if magic != MAGIC or version != VERSION or size != _HEADER.size + self.count * _RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} opening book file.")
+        if digest != piece_stats_digest():
+            self.close()
+            raise ValueError(f"{path} was built from games with different piece stats.")
+        # Every record starts with its key, so the keys are every third u64 after the header
+        self.keys = memoryview(self.map)[_HEADER.size:].cast('Q')
+        self.min_games = min_games
+        self.min_score = min_score
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self):
+        return self.count
+
+    def records(self):
+        """
+        Yield every record in file order.
+        """
+        for number in range(self.count):
+            yield _RECORD.unpack_from(self.map, _HEADER.size + number * _RECORD.size)
+
+    def _first(self, key):
+        keys = self.keys
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if keys[middle * _KEY_WORDS] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def probe_key(self, key):
+        """
+        Return the book's moves for a Zobrist key.
+
+        :return: A list of (move, games, wins, losses), empty if the position is not in the book.
+        """
+        self.probes += 1
+        moves = []
+        number = self._first(key)
+        while number < self.count and self.keys[number * _KEY_WORDS] == key:
+            _, packed, _, games, wins, losses = _RECORD.unpack_from(self.map, _HEADER.size + number * _RECORD.size)
+            moves.append((unpack_move(packed), games, wins, losses))
+            number += 1
+        if moves:
+            self.hits += 1
+        return moves
+
+    def probe(self, state):
+        """
+        Return the book's moves for the position of a GameState, as probe_key does.
+        """
+        return self.probe_key(ZOBRIST.position_key(state.board, state.turn))
+
+    def best_move(self, state):
+        """
+        Return the book move with the best score among the legal moves played at least min_games
+        times that score above min_score, or None, so the player searches positions the book
+        has no trusted winning move for.
+        """
+        candidates = [(move, games, wins, losses) for move, games, wins, losses in self.probe(state)
+                      if games >= self.min_games and score(games, wins, losses) > self.min_score]
+        if not candidates:
+            return None
+        legal = set(state.legal_moves())
+        candidates = [candidate for candidate in candidates if candidate[0] in legal]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda candidate: (score(*candidate[1:]), candidate[1]))[0]
+
+    def close(self):
+        keys = getattr(self, 'keys', None)
+        if keys is not None:
+            keys.release()
+        self.keys = None
+        if self.map is not None and not self.map.closed:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def score(games, wins, losses):
+    """
+    Return a move's score from the point of view of the player who makes it, from -1 to 1.
+    """
+    return (wins - losses) / games if games else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect BattleBoards opening books.")
+    parser.add_argument('path', help="the book file")
+    parser.add_argument('--add', nargs='+', metavar='RECORDS', help="merge the games of these game record files into the book")
+    parser.add_argument('--plies', type=int, default=12, help="moves counted from the start of each game (new books only)")
+    parser.add_argument('--min-games', type=int, default=MIN_GAMES,
+                        help="games a move needs before it is played from the book")
+    parser.add_argument('--min-score', type=float, default=MIN_SCORE,
+                        help="score ((wins - losses) / games) a book move has to beat")
+    args = parser.parse_args()
+
+    if args.add:
+        from gamerecord import GameReader
+        for records_path in args.add:
+            with GameReader(records_path) as reader:
+                games = len(reader)
+                count, touched = add_games(args.path, reader, args.plies)
+            print(f"{records_path}: {games} games, {touched} moves merged, {count} records in the book")
+
+    with OpeningBook(args.path, args.min_games, args.min_score) as book:
+        positions = sum(1 for number in range(book.count)
+                        if number == 0 or book.keys[number * _KEY_WORDS] != book.keys[(number - 1) * _KEY_WORDS])
+        print(f"{book.count} moves in {positions} positions, first {book.plies} plies")
+        state = GameState()
+        for _ in range(book.plies):
+            move = book.best_move(state)
+            if move is None:
+                break
+            moves = {entry[0]: entry for entry in book.probe(state)}
+            _, games, wins, losses = moves[move]
+            print(f"{state.turn} {convert_to_position(*move[0])} {convert_to_position(*move[1])}: "
+                  f"{games} games, score {score(games, wins, losses):+.2f}")
+            state.make_move(move[0], move[1], best_attack_choice)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Compact struct-of-arrays board for storing large numbers of BattleBoards positions.
+
+A CompactBoard keeps one bytearray split into four flat arrays indexed by
+square (row * 8 + col): piece type, color, remaining special attack uses and
+health. Everything a piece type shares (name, attacks, full health) lives in
+the PIECE_STATS table in BattleBoards.py, so a position costs a few hundred
+bytes instead of a list of lists of piece objects.
+"""
+
+import sys
+
+from BattleBoards import PIECE_TYPES, initialize_board
+
+EMPTY = 0
+COLORS = ('white', 'black')
+COLOR_INDEX = {'white': 0, 'black': 1}
+
+# Piece type codes are 1-based positions in PIECE_TYPES, 0 marks an empty square
+TYPE_CODES = {piece_class.__name__: code for code, piece_class in enumerate(PIECE_TYPES, 1)}
+
+_TYPES = 0
+_COLORS = 64
+_USES = 128
+_HEALTH = 192
+_SIZE = 320
+
+
+class CompactBoard:
+    __slots__ = ('data',)
+
+    def __init__(self, data=None):
+        """
+        Create a compact board, empty unless raw data from to_bytes() is given.
+
+        :param data: Bytes previously produced by to_bytes().
+        """
+        self.data = bytearray(_SIZE) if data is None else bytearray(data)
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Build a compact board from a 2D board of ChessPiece objects.
+
+        :param board: The chess board as a 2D list.
+        :return: A CompactBoard.
+        """
+        compact = cls()
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece is not None:
+                    compact.set_square(row * 8 + col, TYPE_CODES[piece.name], COLOR_INDEX[piece.color],
+                                       piece.health, piece.special_uses)
+        return compact
+
+    def to_board(self):
+        """
+        Rebuild the 2D board of ChessPiece objects this compact board was made from.
+
+        :return: The chess board as a 2D list.
+        """
+        board = [[None for _ in range(8)] for _ in range(8)]
+        data = self.data
+        for sq in range(64):
+            code = data[_TYPES + sq]
+            if code != EMPTY:
+                piece = PIECE_TYPES[code - 1](COLORS[data[_COLORS + sq]])
+                piece.health = self.health(sq)
+                piece.special_uses = data[_USES + sq]
+                board[sq // 8][sq % 8] = piece
+        return board
+
+    def set_square(self, sq, code, color, health, uses):
+        """
+        Put a piece on a square.
+
+        :param sq: The square index (row * 8 + col).
+        :param code: The piece type code from TYPE_CODES.
+        :param color: 0 for white, 1 for black.
+        :param health: The piece's current health (0 to 65535).
+        :param uses: The piece's remaining special attack uses (0 to 255).
+        """
+        data = self.data
+        data[_TYPES + sq] = code
+        data[_COLORS + sq] = color
+        data[_USES + sq] = uses
+        data[_HEALTH + 2 * sq] = health & 0xFF
+        data[_HEALTH + 2 * sq + 1] = health >> 8
+
+    def clear_square(self, sq):
+        self.set_square(sq, EMPTY, 0, 0, 0)
+
+    def piece_type(self, sq):
+        """
+        Return the piece class on a square, or None if it is empty.
+        """
+        code = self.data[_TYPES + sq]
+        return PIECE_TYPES[code - 1] if code != EMPTY else None
+
+    def color(self, sq):
+        return COLORS[self.data[_COLORS + sq]]
+
+    def health(self, sq):
+        return self.data[_HEALTH + 2 * sq] | (self.data[_HEALTH + 2 * sq + 1] << 8)
+
+    def special_uses(self, sq):
+        return self.data[_USES + sq]
+
+    def copy(self):
+        return CompactBoard(self.data)
+
+    def to_bytes(self):
+        """
+        Return the board as immutable bytes, suitable as a dictionary key or for writing to disk.
+        """
+        return bytes(self.data)
+
+    def __eq__(self, other):
+        return isinstance(other, CompactBoard) and self.data == other.data
+
+    def __hash__(self):
+        return hash(bytes(self.data))
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Return the memory used by an object and everything it references that is not
+    shared with other objects of its kind (classes, type-level stats and interned
+    strings are left out).
+
+    :param obj: The object to measure.
+    :return: The size in bytes.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, (type, str, int)) or obj is None:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    else:
+        if hasattr(obj, '__dict__'):
+            size += deep_sizeof(obj.__dict__, seen)
+        for slot in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, slot):
+                size += deep_sizeof(getattr(obj, slot), seen)
+    return size
+
+
+def memory_report():
+    """
+    Measure the per-position memory footprint of the initial position in each representation.
+
+    :return: A dictionary mapping representation names to sizes in bytes.
+    """
+    board = initialize_board()
+    compact = CompactBoard.from_board(board)
+    return {
+        '2D board of pieces': deep_sizeof(board),
+        'CompactBoard': deep_sizeof(compact),
+        'CompactBoard.to_bytes()': deep_sizeof(compact.to_bytes()),
+    }
+
+
+if __name__ == "__main__":
+    board = initialize_board()
+    board[6][4].health = 20
+    board[7][3].special_uses = 1
+    restored = CompactBoard.from_board(board).to_board()
+    assert all((a is None and b is None) or
+               (type(a) is type(b) and (a.color, a.health, a.special_uses) == (b.color, b.health, b.special_uses))
+               for row_a, row_b in zip(board, restored) for a, b in zip(row_a, row_b))
+
+    print("Per-position memory footprint (initial position):")
+    for name, size in memory_report().items():
+        print(f"  {name}: {size} bytes")
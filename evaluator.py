@@ -0,0 +1,250 @@
+"""
+Batched NumPy position evaluator for BattleBoards.
+
+A position is encoded as a fixed-size float32 feature row, always from the
+point of view of the player to move ("own" pieces first, the board mirrored
+top to bottom when black is to move, so both colors share the same weights):
+
+    occupancy   2 sides x 6 piece types x 64 squares, 1 where such a piece stands
+    health      2 sides x 6 piece types, total current health
+    uses        2 sides x 6 piece types, total remaining special attack uses
+    mobility    2 sides x 6 piece types, total move count by the valid_moves rules
+
+A score is the dot product of a row with a weight vector plus a bias, so
+any number of rows is scored by one matrix-vector product. The default
+weights reproduce GameState.evaluate (material, health and half the damage
+left in special attacks); learned weights are loaded from .npy or .npz
+files. Search gathers the positions one ply above its horizon into a
+LeafBatch and scores them together.
+
+Example:
+    python evaluator.py --positions 4096
+    python evaluator.py --weights learned.npz --positions 4096
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from BattleBoards import MATERIAL_VALUES, PIECE_TYPES, GameState
+from bitboards import PIECE_INDEX, move_mask
+
+SIDES = 2
+TYPES = len(PIECE_TYPES)
+OCCUPANCY = 0
+HEALTH = OCCUPANCY + SIDES * TYPES * 64
+USES = HEALTH + SIDES * TYPES
+MOBILITY = USES + SIDES * TYPES
+FEATURES = MOBILITY + SIDES * TYPES
+
+# PIECE_TYPES and bitboards.PIECE_NAMES list the types in the same order
+TYPE_INDEX = {piece_class.__name__: number for number, piece_class in enumerate(PIECE_TYPES)}
+
+
+def default_weights():
+    """
+    Return the weight vector that scores like GameState.evaluate, for the piece stats installed now.
+    """
+    weights = np.zeros(FEATURES, dtype=np.float32)
+    for side, sign in enumerate((1, -1)):
+        for piece_class in PIECE_TYPES:
+            number = TYPE_INDEX[piece_class.__name__]
+            plane = OCCUPANCY + (side * TYPES + number) * 64
+            weights[plane:plane + 64] = sign * MATERIAL_VALUES[piece_class.__name__]
+            weights[HEALTH + side * TYPES + number] = sign
+            weights[USES + side * TYPES + number] = sign * piece_class.stats.special_damage / 2
+    return weights
+
+
+def encode(state, out=None):
+    """
+    Encode the position of a GameState as one feature row.
+
+    :param state: A GameState; its piece index supplies the pieces, so the board is not scanned.
+    :param out: A float32 array of FEATURES values to fill, or None for a new one.
+    :return: The row.
+    """
+    row = np.zeros(FEATURES, dtype=np.float32) if out is None else out
+    if out is not None:
+        row.fill(0)
+    us = state.turn
+    flip = 56 if us == 'black' else 0
+    squares = state.index.squares
+    occupancy = [0, 0]
+    placed = [[], []]
+    for side, color in enumerate((us, 'white' if us == 'black' else 'black')):
+        bits = 0
+        for (row_number, col), piece in squares[color].items():
+            sq = row_number * 8 + col
+            bits |= 1 << sq
+            placed[side].append((sq, piece))
+        occupancy[side] = bits
+
+    ones = []
+    # Health, uses and mobility totals are summed in Python and written with one slice assignment
+    totals = [0] * (FEATURES - HEALTH)
+    for side in (0, 1):
+        own, enemy = occupancy[side], occupancy[1 - side]
+        for sq, piece in placed[side]:
+            name = piece.name
+            slot = side * TYPES + TYPE_INDEX[name]
+            ones.append(OCCUPANCY + slot * 64 + (sq ^ flip))
+            totals[slot] += piece.health
+            totals[USES - HEALTH + slot] += piece.special_uses
+            totals[MOBILITY - HEALTH + slot] += move_mask(PIECE_INDEX[name], sq, own, enemy).bit_count()
+    row[ones] = 1
+    row[HEALTH:] = totals
+    return row
+
+
+class Evaluator:
+    def __init__(self, weights=None, bias=0.0):
+        """
+        Create an evaluator.
+
+        :param weights: A vector of FEATURES weights, or None for default_weights().
+        :param bias: Added to every score.
+        """
+        weights = default_weights() if weights is None else np.asarray(weights, dtype=np.float32)
+        if weights.shape != (FEATURES,):
+            raise ValueError(f"Expected {FEATURES} weights, got an array of shape {weights.shape}")
+        self.weights = weights
+        self.bias = float(bias)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load weights saved with save(), or a bare .npy weight vector.
+        """
+        data = np.load(path)
+        if isinstance(data, np.ndarray):
+            return cls(data)
+        with data:
+            return cls(data['weights'], float(data['bias']) if 'bias' in data else 0.0)
+
+    def save(self, path):
+        """
+        Save the weights and bias as an .npz file.
+        """
+        np.savez(path, weights=self.weights, bias=np.float32(self.bias))
+
+    def evaluate_batch(self, features):
+        """
+        Score a batch of encoded positions in one call.
+
+        :param features: An (n, FEATURES) array of rows from encode().
+        :return: A float array of n scores, each from the point of view of its player to move.
+        """
+        return features @ self.weights + self.bias
+
+    def evaluate(self, state):
+        """
+        Score a single GameState. Use a LeafBatch to score many.
+        """
+        return float(encode(state) @ self.weights) + self.bias
+
+
+class LeafBatch:
+    def __init__(self, evaluator, capacity=256):
+        """
+        Collect positions to score together. The feature buffer grows as needed and is reused
+        between batches.
+
+        :param evaluator: The Evaluator that scores the batch.
+        :param capacity: The number of rows allocated at first.
+        """
+        self.evaluator = evaluator
+        self.features = np.zeros((capacity, FEATURES), dtype=np.float32)
+        self.size = 0
+
+    def add(self, state):
+        """
+        Encode a position into the batch.
+
+        :return: Its row number, which indexes the result of scores().
+        """
+        if self.size == len(self.features):
+            grown = np.zeros((2 * len(self.features), FEATURES), dtype=np.float32)
+            grown[:self.size] = self.features
+            self.features = grown
+        encode(state, self.features[self.size])
+        self.size += 1
+        return self.size - 1
+
+    def scores(self):
+        """
+        Score every position added since the last clear() in one call.
+        """
+        return self.evaluator.evaluate_batch(self.features[:self.size])
+
+    def clear(self):
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+
+def _copy_piece(piece):
+    if piece is None:
+        return None
+    copy = type(piece)(piece.color)
+    copy.health = piece.health
+    copy.special_uses = piece.special_uses
+    return copy
+
+
+def sample_states(count, seed=0):
+    """
+    Collect GameStates from seeded random games, one every few moves.
+    """
+    from tournament import RandomPlayer
+
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        state = GameState()
+        player = RandomPlayer(rng.random())
+        while state.result() is None and len(states) < count:
+            if state.battle is not None:
+                state.apply_attack_choice(player.choose_attack(state))
+                continue
+            if rng.random() < 0.1:
+                states.append(GameState([[_copy_piece(piece) for piece in row] for row in state.board], state.turn))
+            state.apply_move(*player.choose_move(state))
+    return states
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the batched position evaluator.")
+    parser.add_argument('--positions', type=int, default=4096, help="positions per batch")
+    parser.add_argument('--weights', help="load weights from this .npz or .npy file")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    evaluator = Evaluator.load(args.weights) if args.weights else Evaluator()
+    states = sample_states(args.positions, args.seed)
+
+    batch = LeafBatch(evaluator, len(states))
+    started = time.perf_counter()
+    for state in states:
+        batch.add(state)
+    encoded = time.perf_counter()
+    scores = batch.scores()
+    scored = time.perf_counter()
+    one_by_one = [state.evaluate() for state in states]
+    evaluated = time.perf_counter()
+
+    if not args.weights:
+        # Default weights halve special damage exactly; evaluate() rounds each side's total down
+        difference = np.abs(scores - np.array(one_by_one, dtype=np.float64)).max()
+        print(f"largest difference from GameState.evaluate: {difference:.1f}")
+    count = len(states)
+    print(f"encode:         {count / (encoded - started):12.0f} positions/sec")
+    print(f"batch scoring:  {count / (scored - encoded):12.0f} positions/sec ({count} in one call)")
+    print(f"GameState.evaluate: {count / (evaluated - scored):8.0f} positions/sec")
+
+
+if __name__ == "__main__":
+    main()
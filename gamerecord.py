@@ -0,0 +1,427 @@
+"""
+Compact binary record format for archiving BattleBoards games.
+
+A game is stored as its starting position, its moves as packed square
+indices and, for every capture, the attack choices of the battle it
+started. Replaying those through GameState.apply_move and
+apply_attack_choice (what update_board and battle_scene do) reproduces the
+game exactly, since the engine has no hidden randomness, as long as the
+piece stats are the same: files store a digest of the stats they were
+played with and are only read with those stats installed.
+
+File layout (all integers little-endian):
+    header      b'BBGR', u16 version, u16 reserved, u64 digest of the piece stats
+    games       b'BG', u32 length, then the encoded game, one after another
+    index       u64 file offset of every game       (written on close)
+    footer      u64 game count, u64 index offset, b'BBIX'
+
+Encoded game:
+    u32 tag, u8 flags, u8 winner, u16 move count
+    320 bytes of CompactBoard         only if flags has CUSTOM_START
+    per move: u16 start | end << 6 | capture << 12
+              for captures: u8 strike count, then the choices one bit per
+              strike (set for SPECIAL_ATTACK), low bit first
+
+The writer appends games as they finish, so a tournament can stream into it,
+and only writes the index when it is closed. The reader maps the file and
+decodes one game at a time, so it can go through millions of games without
+loading them; a file whose writer never closed is read by walking the
+length prefixes instead.
+
+Example:
+    python gamerecord.py games.bbgr --replay 12
+    python gamerecord.py games.bbgr --script | python BattleBoards.py --batch -
+"""
+
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+from BattleBoards import (BASIC_ATTACK, SPECIAL_ATTACK, GameState, convert_to_position, initialize_board,
+                          piece_stats_digest)
+from compact import CompactBoard
+
+MAGIC = b'BBGR'
+GAME_MAGIC = b'BG'
+INDEX_MAGIC = b'BBIX'
+VERSION = 2
+
+CUSTOM_START = 1
+BLACK_TO_MOVE = 2
+
+WINNER_CODES = {None: 0, 'white': 1, 'black': 2}
+WINNERS = (None, 'white', 'black')
+
+_HEADER = struct.Struct('<4sHHQ')
+_GAME_PREFIX = struct.Struct('<2sI')
+_GAME_HEADER = struct.Struct('<IBBH')
+_MOVE = struct.Struct('<H')
+_FOOTER = struct.Struct('<QQ4s')
+_BOARD_SIZE = len(CompactBoard().to_bytes())
+
+# moves is a list of (start, end, choices), choices being None for a quiet move
+# and the battle's attack choices in order for a capture
+GameRecord = namedtuple('GameRecord', ['tag', 'turn', 'board', 'winner', 'moves'])
+
+
+def _square(row, col):
+    return row * 8 + col
+
+
+def encode_game(record):
+    """
+    Encode a game into its binary form.
+
+    :param record: A GameRecord; board is CompactBoard bytes, or None for the initial position.
+    :return: The encoded bytes, without the length prefix.
+    """
+    if len(record.moves) > 0xFFFF:
+        raise ValueError("A game cannot have more than 65535 moves.")
+    flags = BLACK_TO_MOVE if record.turn == 'black' else 0
+    if record.board is not None:
+        flags |= CUSTOM_START
+    parts = [_GAME_HEADER.pack(record.tag, flags, WINNER_CODES[record.winner], len(record.moves))]
+    if record.board is not None:
+        parts.append(bytes(record.board))
+
+    for start, end, choices in record.moves:
+        packed = _square(*start) | _square(*end) << 6
+        if choices is None:
+            parts.append(_MOVE.pack(packed))
+            continue
+        if len(choices) > 255:
+            raise ValueError("A battle cannot take more than 255 strikes.")
+        bits = bytearray((len(choices) + 7) // 8)
+        for number, choice in enumerate(choices):
+            if choice == SPECIAL_ATTACK:
+                bits[number >> 3] |= 1 << (number & 7)
+        parts.append(_MOVE.pack(packed | 1 << 12))
+        parts.append(bytes((len(choices),)))
+        parts.append(bytes(bits))
+    return b''.join(parts)
+
+
+def decode_game(data, offset=0):
+    """
+    Decode a game from its binary form.
+
+    :param data: A bytes-like object holding the encoded game.
+    :param offset: Where the game starts in data.
+    :return: The GameRecord.
+    """
+    return _decode(data, offset)[0]
+
+
+def _decode(data, offset):
+    tag, flags, winner, count = _GAME_HEADER.unpack_from(data, offset)
+    position = offset + _GAME_HEADER.size
+    board = None
+    if flags & CUSTOM_START:
+        board = bytes(data[position:position + _BOARD_SIZE])
+        position += _BOARD_SIZE
+
+    moves = []
+    for _ in range(count):
+        packed, = _MOVE.unpack_from(data, position)
+        position += 2
+        start, end = packed & 63, (packed >> 6) & 63
+        choices = None
+        if packed & (1 << 12):
+            strikes = data[position]
+            bits = data[position + 1:position + 1 + (strikes + 7) // 8]
+            position += 1 + len(bits)
+            choices = tuple(SPECIAL_ATTACK if bits[number >> 3] >> (number & 7) & 1 else BASIC_ATTACK
+                            for number in range(strikes))
+        moves.append(((start >> 3, start & 7), (end >> 3, end & 7), choices))
+
+    return GameRecord(tag, 'black' if flags & BLACK_TO_MOVE else 'white', board, WINNERS[winner], moves), position
+
+
+class GameRecorder:
+    def __init__(self, state, tag=0):
+        """
+        Record a game as it is played on a GameState, from the events the state returns.
+
+        :param state: The GameState, before the first move to record.
+        :param tag: A number stored with the game, such as its number in a tournament.
+        """
+        self.state = state
+        self.tag = tag
+        self.turn = state.turn
+        board = CompactBoard.from_board(state.board)
+        initial = state.turn == 'white' and board == CompactBoard.from_board(initialize_board())
+        self.board = None if initial else board.to_bytes()
+        self.moves = []
+        self._choices = None
+
+    def observe(self, events):
+        """
+        Record the moves and attack choices in a list of events from the GameState.
+        """
+        battle_over = False
+        for event in events:
+            kind = event['type']
+            if kind == 'battle_started':
+                self._choices = []
+                self.moves.append((event['from'], event['to'], self._choices))
+            elif kind == 'damage_dealt':
+                self._choices.append(event['choice'])
+            elif kind == 'battle_won':
+                self._choices = None
+                battle_over = True
+            elif kind == 'piece_moved' and not battle_over:
+                # The winning attacker moving in after a battle is part of the capture already recorded
+                self.moves.append((event['from'], event['to'], None))
+
+    def record(self):
+        """
+        Return the game recorded so far as a GameRecord. A capture whose battle is still being
+        fought is left out, since it could not be replayed; the game ends before it.
+        """
+        moves = self.moves if self._choices is None else self.moves[:-1]
+        moves = [(start, end, None if choices is None else tuple(choices)) for start, end, choices in moves]
+        return GameRecord(self.tag, self.turn, self.board, self.state.result(), moves)
+
+
+def iter_replay(record):
+    """
+    Play a recorded game again on a new GameState one step at a time.
+
+    :param record: The GameRecord.
+    :return: A generator of (state, events) after every move and every strike, with the
+             events as update_board and battle_scene would report them.
+    """
+    board = initialize_board() if record.board is None else CompactBoard(record.board).to_board()
+    state = GameState(board, record.turn)
+    for start, end, choices in record.moves:
+        yield state, state.apply_move(start, end)
+        for choice in choices or ():
+            yield state, state.apply_attack_choice(choice)
+        if state.battle is not None:
+            raise ValueError(f"The recorded battle on move {start} {end} did not finish.")
+
+
+def replay(record, on_events=None):
+    """
+    Play a recorded game again on a new GameState.
+
+    :param record: The GameRecord.
+    :param on_events: Called with the events of every move and strike.
+    :return: The GameState after the last move.
+    """
+    state = None
+    for state, events in iter_replay(record):
+        if on_events is not None:
+            on_events(events)
+    if state is None:
+        board = initialize_board() if record.board is None else CompactBoard(record.board).to_board()
+        state = GameState(board, record.turn)
+    return state
+
+
+def format_script(record):
+    """
+    Write a game as a batch script for BattleBoards.py --batch: one move or attack
+    choice per line, ending with a blank line.
+
+    :param record: A GameRecord that starts from the initial position.
+    :return: The script text.
+    """
+    if record.board is not None or record.turn != 'white':
+        raise ValueError("Batch scripts always start from the initial position.")
+    lines = []
+    for start, end, choices in record.moves:
+        lines.append(f"{convert_to_position(*start)} {convert_to_position(*end)}")
+        lines.extend(str(choice) for choice in choices or ())
+    return "\n".join(lines) + "\n\n"
+
+
+class GameWriter:
+    def __init__(self, path, append=False):
+        """
+        Open a game record file for writing.
+
+        :param path: The file to write.
+        :param append: Add to the games already in the file instead of starting a new one.
+        """
+        self.offsets = array('Q')
+        if append:
+            try:
+                with GameReader(path) as reader:
+                    self.offsets.extend(reader.offsets)
+                    end = reader.data_end
+            except FileNotFoundError:
+                append = False
+        if append:
+            self.file = open(path, 'r+b')
+            # The old index is overwritten by the new games and written again on close
+            self.file.seek(end)
+            self.file.truncate()
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(_HEADER.pack(MAGIC, VERSION, 0, piece_stats_digest()))
+
+    def write_encoded(self, data):
+        """
+        Append a game already encoded with encode_game.
+        """
+        self.offsets.append(self.file.tell())
+        self.file.write(_GAME_PREFIX.pack(GAME_MAGIC, len(data)))
+        self.file.write(data)
+
+    def write(self, record):
+        """
+        Append a GameRecord.
+        """
+        self.write_encoded(encode_game(record))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def close(self):
+        """
+        Write the index and footer and close the file.
+        """
+        if self.file.closed:
+            return
+        index_offset = self.file.tell()
+        self.file.write(self.offsets.tobytes())
+        self.file.write(_FOOTER.pack(len(self.offsets), index_offset, INDEX_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class GameReader:
+    def __init__(self, path):
+        """
+        Open a game record file for reading through a memory map.
+
+        :param path: The file to read.
+        """
+        self.file = open(path, 'rb')
+        size = self.file.seek(0, 2)
+        if size < _HEADER.size:
+            self.file.close()
+            raise ValueError(f"{path} is not a game record file.")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, digest = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} game record file.")
+        if digest != piece_stats_digest():
+            self.close()
+            raise ValueError(f"{path} was played with different piece stats.")
+
+        count, index_offset, index_magic = (0, 0, b'')
+        if size >= _HEADER.size + _FOOTER.size:
+            count, index_offset, index_magic = _FOOTER.unpack_from(self.map, size - _FOOTER.size)
+        if index_magic == INDEX_MAGIC and index_offset + 8 * count == size - _FOOTER.size:
+            # Offsets are read straight from the map, not copied
+            self.offsets = memoryview(self.map)[index_offset:index_offset + 8 * count].cast('Q')
+            self.data_end = index_offset
+        else:
+            # The writer did not finish; find the games from their length prefixes, stopping at
+            # the first one that is not marked as a game or does not decode to exactly its length
+            self.offsets = array('Q')
+            position = _HEADER.size
+            while position + _GAME_PREFIX.size <= size:
+                magic, length = _GAME_PREFIX.unpack_from(self.map, position)
+                start = position + _GAME_PREFIX.size
+                if magic != GAME_MAGIC or start + length > size:
+                    break
+                try:
+                    if _decode(self.map, start)[1] != start + length:
+                        break
+                except (struct.error, IndexError, ValueError):
+                    break
+                self.offsets.append(position)
+                position += _GAME_PREFIX.size + length
+            self.data_end = position
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def game(self, number):
+        """
+        Decode game number (0-based) without reading any other game.
+        """
+        return decode_game(self.map, self.offsets[number] + _GAME_PREFIX.size)
+
+    def __getitem__(self, number):
+        return self.game(number)
+
+    def __iter__(self):
+        for number in range(len(self.offsets)):
+            yield self.game(number)
+
+    def close(self):
+        offsets = getattr(self, 'offsets', None)
+        if isinstance(offsets, memoryview):
+            offsets.release()
+        self.offsets = array('Q')
+        if not self.map.closed:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise or replay a BattleBoards game record file.")
+    parser.add_argument('path', help="the game record file")
+    parser.add_argument('--replay', type=int, metavar='N', help="replay game N (0-based) and print its moves")
+    parser.add_argument('--script', action='store_true',
+                        help="print the games as a batch script for BattleBoards.py --batch")
+    args = parser.parse_args()
+
+    with GameReader(args.path) as reader:
+        if args.script:
+            for record in reader:
+                sys.stdout.write(format_script(record))
+            return
+
+        if args.replay is not None:
+            from BattleBoards import describe_event
+
+            def show(events):
+                for event in events:
+                    if event['type'] == 'piece_moved':
+                        message = (f"{event['piece'].symbol} {convert_to_position(*event['from'])} "
+                                   f"{convert_to_position(*event['to'])}")
+                    else:
+                        message = describe_event(event)
+                    if message:
+                        print(message)
+
+            record = reader.game(args.replay)
+            print(f"Game {args.replay} (tag {record.tag}): {len(record.moves)} moves")
+            state = replay(record, show)
+            print(f"Winner: {state.result() or 'none'}")
+            return
+
+        wins = {'white': 0, 'black': 0, None: 0}
+        moves = battles = 0
+        for record in reader:
+            wins[record.winner] += 1
+            moves += len(record.moves)
+            battles += sum(1 for _, _, choices in record.moves if choices is not None)
+        games = len(reader) or 1
+        print(f"{len(reader)} games: {wins['white']} white wins, {wins['black']} black wins, "
+              f"{wins[None]} unfinished")
+        print(f"mean moves {moves / games:.1f}, mean battles {battles / games:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Opt-in instrumentation for the BattleBoards hot paths.
+
+enable() wraps the functions the engine runs while games are played with
+timers: piece_targets (every piece's move generation goes through it),
+the uncached legal_moves and attacked_squares used while make_move moves
+are outstanding, the MoveCache lookups and recomputations, and the
+GameState methods for moves, battles, game over checks and evaluation.
+The functions of the interactive game are wrapped too: valid_moves and
+can_reach of every piece class, is_valid_move, move_error,
+check_collision, update_board, battle_scene and is_game_over. Wrappers are
+installed on the classes, on BattleBoards and on every loaded module that
+imported one of the functions by name, and disable() puts the originals
+back. While disabled nothing is wrapped, so the engine runs exactly as
+without this module.
+
+Each hook records call counts, total time and a bounded sample of
+latencies for percentiles, plus a per-piece-type breakdown where a call
+is about one piece.
+
+Example:
+    import instrumentation
+    instrumentation.enable()
+    ... play games ...
+    print(instrumentation.report())
+"""
+
+import json
+import random
+import sys
+import time
+
+import BattleBoards
+
+SAMPLE_SIZE = 4096
+
+# Sampling has its own generator so profiling never changes the random choices of games
+_rng = random.Random(0)
+
+
+class CallStats:
+    __slots__ = ('calls', 'total_ns', 'max_ns', 'samples')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.samples = []
+
+    def add(self, elapsed):
+        self.calls += 1
+        self.total_ns += elapsed
+        if elapsed > self.max_ns:
+            self.max_ns = elapsed
+        # Reservoir sampling keeps a uniform sample of latencies in bounded memory
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(elapsed)
+        else:
+            slot = _rng.randrange(self.calls)
+            if slot < SAMPLE_SIZE:
+                self.samples[slot] = elapsed
+
+    def merge(self, raw):
+        """
+        Add the counters from another process, as produced by raw_snapshot().
+        """
+        calls, total_ns, max_ns, samples = raw
+        combined = self.calls + calls
+        if combined == 0:
+            return
+        # Keep each side's samples in proportion to its share of the calls
+        keep_own = round(SAMPLE_SIZE * self.calls / combined)
+        own = self.samples if len(self.samples) <= keep_own else _rng.sample(self.samples, keep_own)
+        theirs = samples if len(samples) <= SAMPLE_SIZE - len(own) else _rng.sample(samples, SAMPLE_SIZE - len(own))
+        self.samples = own + theirs
+        self.calls = combined
+        self.total_ns += total_ns
+        self.max_ns = max(self.max_ns, max_ns)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+
+        def percentile(fraction):
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] / 1000
+
+        return {
+            'calls': self.calls,
+            'total_ms': self.total_ns / 1e6,
+            'mean_us': self.total_ns / self.calls / 1000 if self.calls else 0.0,
+            'p50_us': percentile(0.5),
+            'p90_us': percentile(0.9),
+            'p99_us': percentile(0.99),
+            'max_us': self.max_ns / 1000,
+        }
+
+
+_stats = {}
+_installed = []
+_INHERITED = object()
+
+
+def _piece_at(board, square):
+    piece = board[square[0]][square[1]]
+    return piece.name if piece is not None else None
+
+
+def _piece_at_position(board, position):
+    return _piece_at(board, BattleBoards.convert_to_coordinates(position))
+
+
+# (name, function to find the piece a call is about, or None)
+FUNCTION_HOOKS = [
+    ('piece_targets', lambda piece, row, col, board: piece.name),
+    ('legal_moves', None),
+    ('attacked_squares', None),
+    ('is_valid_move', lambda start, end, board, turn: _piece_at_position(board, start)),
+    ('move_error', lambda board, start, end, turn: _piece_at(board, start)),
+    ('check_collision', lambda board, start, end: _piece_at_position(board, start)),
+    ('update_board', lambda state, start, end, players=None: _piece_at_position(state.board, start)),
+    ('battle_scene', lambda state, players=None: state.battle.attacker.name),
+    ('is_game_over', None),
+]
+GAME_STATE_HOOKS = [
+    ('legal_moves', None),
+    ('attacked_squares', None),
+    ('is_game_over', None),
+    ('evaluate', None),
+    ('apply_move', lambda state, start, end: _piece_at(state.board, start)),
+    ('apply_attack_choice', lambda state, choice: state.battle.current.name),
+    ('make_move', lambda state, start, end, choose_attack=None: _piece_at(state.board, start)),
+    ('unmake_move', None),
+]
+MOVE_CACHE_HOOKS = [
+    ('legal_moves', None),
+    ('piece_moves', None),
+    ('_compute', lambda cache, row, col: _piece_at(cache.board, (row, col))),
+]
+PIECE_METHOD_HOOKS = ['valid_moves', 'can_reach']
+
+
+def _stats_for(key):
+    stats = _stats.get(key)
+    if stats is None:
+        stats = _stats[key] = CallStats()
+    return stats
+
+
+def _wrap(key, function, piece_of):
+    stats = _stats_for(key)
+    perf_counter_ns = time.perf_counter_ns
+
+    def wrapper(*args, **kwargs):
+        piece = None
+        if piece_of is not None:
+            try:
+                piece = piece_of(*args, **kwargs)
+            except Exception:
+                piece = None
+        started = perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = perf_counter_ns() - started
+            stats.add(elapsed)
+            if piece is not None:
+                _stats_for(f"{key}[{piece}]").add(elapsed)
+
+    wrapper.__wrapped__ = function
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+def _replace_everywhere(original, wrapper):
+    for module in list(sys.modules.values()):
+        namespace = getattr(module, '__dict__', None)
+        if not namespace:
+            continue
+        for name, value in list(namespace.items()):
+            if value is original:
+                setattr(module, name, wrapper)
+                _installed.append((module, name, original))
+
+
+def is_enabled():
+    return bool(_installed)
+
+
+def enable():
+    """
+    Install the timing wrappers. Calling it again while enabled does nothing.
+    """
+    if _installed:
+        return
+
+    for name, piece_of in FUNCTION_HOOKS:
+        original = getattr(BattleBoards, name)
+        _replace_everywhere(original, _wrap(name, original, piece_of))
+
+    for owner, hooks in ((BattleBoards.GameState, GAME_STATE_HOOKS), (BattleBoards.MoveCache, MOVE_CACHE_HOOKS)):
+        for name, piece_of in hooks:
+            original = owner.__dict__[name]
+            setattr(owner, name, _wrap(f"{owner.__name__}.{name}", original, piece_of))
+            _installed.append((owner, name, original))
+
+    for piece_class in BattleBoards.PIECE_TYPES:
+        for name in PIECE_METHOD_HOOKS:
+            own = vars(piece_class).get(name, _INHERITED)
+            setattr(piece_class, name, _wrap(f"{name}[{piece_class.stats.name}]", getattr(piece_class, name), None))
+            _installed.append((piece_class, name, own))
+
+
+def disable():
+    """
+    Put the original functions and methods back. Collected numbers are kept.
+    """
+    while _installed:
+        owner, name, original = _installed.pop()
+        if original is _INHERITED:
+            delattr(owner, name)
+        else:
+            setattr(owner, name, original)
+
+
+def reset():
+    """
+    Forget all collected numbers.
+    """
+    for stats in _stats.values():
+        stats.__init__()
+
+
+def snapshot():
+    """
+    Return the collected numbers for every hook that was called.
+
+    :return: A dictionary mapping hook names to dictionaries of calls, total_ms,
+             mean_us, p50_us, p90_us, p99_us and max_us.
+    """
+    return {key: stats.summary() for key, stats in sorted(_stats.items()) if stats.calls}
+
+
+def raw_snapshot():
+    """
+    Return the raw counters, for sending to another process and merge().
+    """
+    return {key: (stats.calls, stats.total_ns, stats.max_ns, list(stats.samples))
+            for key, stats in _stats.items() if stats.calls}
+
+
+def merge(raw):
+    """
+    Add raw counters from another process (see raw_snapshot) to the ones collected here.
+    """
+    for key, counters in raw.items():
+        _stats_for(key).merge(counters)
+
+
+def export_json(path):
+    with open(path, 'w') as output:
+        json.dump(snapshot(), output, indent=2)
+
+
+def report():
+    """
+    Return the collected numbers as a text table, busiest hooks first.
+    """
+    rows = sorted(snapshot().items(), key=lambda item: item[1]['total_ms'], reverse=True)
+    lines = [f"{'hook':36} {'calls':>10} {'total ms':>10} {'mean us':>9} {'p50 us':>9} {'p90 us':>9} "
+             f"{'p99 us':>9} {'max us':>9}"]
+    for key, row in rows:
+        lines.append(f"{key:36} {row['calls']:>10} {row['total_ms']:>10.1f} {row['mean_us']:>9.2f} "
+                     f"{row['p50_us']:>9.2f} {row['p90_us']:>9.2f} {row['p99_us']:>9.2f} {row['max_us']:>9.2f}")
+    return "\n".join(lines)
@@ -0,0 +1,156 @@
+"""
+Scripted load client for the BattleBoards server.
+
+Opens a number of connections and keeps each one busy playing complete games
+with random moves and attacks. The client mirrors every game on a local
+GameState to pick its moves, and checks that the server ends every game the
+same way. Reports games/sec, round-trip latency and the server's metrics.
+
+Example:
+    python loadclient.py --games 2000 --concurrency 500
+    python loadclient.py --port 8765 --games 100       # against a running server
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from BattleBoards import GameState, convert_to_position
+from instrumentation import CallStats
+from server import BattleServer
+
+
+class LoadStats:
+    def __init__(self):
+        """
+        Totals over all games the client played.
+        """
+        self.games = 0
+        self.commands = 0
+        self.mismatches = 0
+        self.peak_in_flight = 0
+        self.in_flight = 0
+        self.round_trip = CallStats()
+
+
+async def _command(reader, writer, line, stats):
+    """
+    Send a command and collect the reply lines up to and including its OK, GAME, STATS or ERR line.
+    """
+    started = time.perf_counter_ns()
+    writer.write(line.encode() + b"\n")
+    await writer.drain()
+    replies = []
+    while True:
+        reply = (await reader.readline()).decode().rstrip("\n")
+        if not reply:
+            raise ConnectionError("The server closed the connection")
+        replies.append(reply)
+        if reply.split(' ', 1)[0] in ('OK', 'GAME', 'ERR', 'STATS'):
+            break
+    stats.round_trip.add(time.perf_counter_ns() - started)
+    stats.commands += 1
+    return replies
+
+
+async def _play(host, port, games, rng, stats, max_moves):
+    """
+    Play games over one connection until the shared game budget runs out.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while games[0] > 0:
+            games[0] -= 1
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+
+            game_id = (await _command(reader, writer, "NEW both", stats))[-1].split()[1]
+            state = GameState()
+            replies = []
+            while state.result() is None and state.move_count < max_moves:
+                if state.battle is not None:
+                    choice = rng.choice(state.battle.attack_choices())
+                    state.apply_attack_choice(choice)
+                    replies = await _command(reader, writer, f"ATTACK {game_id} {choice}", stats)
+                else:
+                    start, end = rng.choice(state.legal_moves())
+                    state.apply_move(start, end)
+                    replies = await _command(
+                        reader, writer,
+                        f"MOVE {game_id} {convert_to_position(*start)} {convert_to_position(*end)}", stats)
+
+            if state.result() is None:
+                await _command(reader, writer, f"LEAVE {game_id}", stats)
+            elif replies[-1] != f"OK {game_id} over" or f"EVENT {game_id} game_over {state.result()}" not in replies:
+                stats.mismatches += 1
+
+            stats.in_flight -= 1
+            stats.games += 1
+    finally:
+        writer.close()
+
+
+async def run_load(games, concurrency, host='127.0.0.1', port=None, seed=0, max_moves=500):
+    """
+    Play games against a server with a number of connections at once.
+
+    :param games: The number of games to play in total.
+    :param concurrency: The number of connections, each playing one game at a time.
+    :param port: The server's port, or None to start a server in this process.
+    :return: A report dictionary.
+    """
+    server = None
+    if port is None:
+        server = BattleServer()
+        port = await server.start(host, 0)
+
+    stats = LoadStats()
+    budget = [games]
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    await asyncio.gather(*(_play(host, port, budget, random.Random(rng.random()), stats, max_moves)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    reader, writer = await asyncio.open_connection(host, port)
+    server_metrics = json.loads((await _command(reader, writer, "STATS", LoadStats()))[-1].split(' ', 1)[1])
+    writer.close()
+    await writer.wait_closed()
+    if server is not None:
+        # Let the server notice the connections closing before it shuts down
+        while server.sessions:
+            await asyncio.sleep(0.01)
+        server.server.close()
+        await server.server.wait_closed()
+
+    return {
+        'games': stats.games,
+        'concurrency': concurrency,
+        'peak_games_in_flight': stats.peak_in_flight,
+        'mismatched_results': stats.mismatches,
+        'seconds': elapsed,
+        'games_per_sec': stats.games / elapsed if elapsed > 0 else 0.0,
+        'commands_per_sec': stats.commands / elapsed if elapsed > 0 else 0.0,
+        'round_trip': stats.round_trip.summary(),
+        'server': server_metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the BattleBoards server with random games.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help="server port (default: start a server in this process)")
+    parser.add_argument('--games', type=int, default=200, help="games to play in total")
+    parser.add_argument('--concurrency', type=int, default=100, help="connections playing at once")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-moves', type=int, default=500, help="moves before a game is left unfinished")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.games, args.concurrency, args.host, args.port, args.seed, args.max_moves))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
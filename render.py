@@ -0,0 +1,319 @@
+"""
+Diff-based ANSI renderer for watching BattleBoards games.
+
+A BoardRenderer remembers what it last drew for one board and produces only
+the escape sequences for squares and status lines that changed since, each
+addressed with cursor positioning. A Screen tiles any number of boards in
+the terminal and writes every frame as a single buffer, so watching dozens
+of games over SSH costs a few bytes per move instead of a full redraw.
+
+The terminal game in BattleBoards.py draws its board through a
+TerminalView when its output is a terminal: the board stays at the top of
+the screen, is updated square by square, and prompts scroll below it. Only
+the terminal game imports this module, so headless runs never load it.
+
+Example:
+    python render.py --boards 6 --columns 3             # six live random games
+    python render.py --record games.bbgr --boards 9     # replay archived games
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ESC = "\033["
+BOLD = ESC + "1m"
+RESET = ESC + "0m"
+
+# Lines of a tile: title, file letters, 8 ranks, file letters, health, status
+TILE_HEIGHT = 13
+TILE_WIDTH = 24
+
+
+def _goto(line, column):
+    return f"{ESC}{line};{column}H"
+
+
+class BoardRenderer:
+    def __init__(self, top=1, left=1, width=TILE_WIDTH):
+        """
+        Draw one board at a fixed place in the terminal.
+
+        :param top: The terminal line (1-based) of the tile's first line.
+        :param left: The terminal column (1-based) of the tile's first column.
+        :param width: The columns text lines are padded to, so they overwrite what was there.
+        """
+        self.top = top
+        self.left = left
+        self.width = width
+        self.cells = None
+        self.lines = {}
+
+    def _line(self, number, text, parts):
+        text = text[:self.width].ljust(self.width)
+        if self.lines.get(number) != text:
+            self.lines[number] = text
+            parts.append(_goto(self.top + number, self.left) + text)
+
+    def frame(self, board, title="", health="", status=""):
+        """
+        Return the escape sequences that bring the tile up to date.
+
+        :param board: The chess board as a 2D list.
+        :param title: The line above the board.
+        :param health: The first line below the board.
+        :param status: The second line below the board.
+        :return: The text to write; empty if nothing changed.
+        """
+        parts = []
+        if self.cells is None:
+            # First frame: draw the parts that never change and every square
+            self.cells = [None] * 64
+            self._line(1, "  a b c d e f g h", parts)
+            for row in range(8):
+                self._line(2 + row, f"{8 - row} {'  ' * 8}{8 - row}", parts)
+            self._line(10, "  a b c d e f g h", parts)
+
+        self._line(0, title, parts)
+        cells = self.cells
+        for row in range(8):
+            board_row = board[row]
+            for col in range(8):
+                piece = board_row[col]
+                cell = '.' if piece is None else piece.symbol
+                sq = row * 8 + col
+                if cells[sq] != cell:
+                    cells[sq] = cell
+                    text = cell if piece is None else BOLD + cell + RESET
+                    parts.append(_goto(self.top + 2 + row, self.left + 2 + 2 * col) + text)
+        self._line(11, health, parts)
+        self._line(12, status, parts)
+        return "".join(parts)
+
+    def invalidate(self):
+        """
+        Forget what was drawn, so the next frame redraws the whole tile.
+        """
+        self.cells = None
+        self.lines = {}
+
+
+def describe_state(state):
+    """
+    Return the (health, status) lines for a GameState.
+    """
+    index = state.index
+    health = f"W {index.health['white']:>5}  B {index.health['black']:>5}"
+    if state.result() is not None:
+        status = f"{state.result()} wins"
+    elif state.battle is not None:
+        battle = state.battle
+        status = (f"{battle.attacker.symbol} {battle.attacker.health} vs "
+                  f"{battle.defender.symbol} {battle.defender.health}")
+    else:
+        status = f"{state.turn} to move ({state.move_count})"
+    return health, status
+
+
+class Screen:
+    def __init__(self, boards, columns=None, out=None):
+        """
+        Tile boards in the terminal.
+
+        :param boards: The number of boards.
+        :param columns: Boards per row of tiles (defaults to as many as fit the terminal width).
+        :param out: The text stream to write to (defaults to sys.stdout).
+        """
+        self.out = out or sys.stdout
+        if columns is None:
+            try:
+                width = os.get_terminal_size(self.out.fileno()).columns
+            except (AttributeError, OSError, ValueError):
+                width = 80
+            columns = max(1, width // TILE_WIDTH)
+        self.columns = columns
+        self.tiles = [BoardRenderer(1 + (number // columns) * TILE_HEIGHT, 1 + (number % columns) * TILE_WIDTH,
+                                    TILE_WIDTH - 2)
+                      for number in range(boards)]
+        self.bottom = 1 + ((boards + columns - 1) // columns) * TILE_HEIGHT
+        self.frames = 0
+        self.bytes_written = 0
+
+    def _write(self, text):
+        data = text.encode()
+        self.bytes_written += len(data)
+        buffer = getattr(self.out, 'buffer', None)
+        if buffer is None:
+            self.out.write(text)
+            self.out.flush()
+            return
+        # One write on the binary buffer puts the whole frame out in a single system call
+        self.out.flush()
+        buffer.write(data)
+        buffer.flush()
+
+    def start(self):
+        """
+        Clear the terminal and hide the cursor.
+        """
+        for tile in self.tiles:
+            tile.invalidate()
+        self._write(ESC + "2J" + ESC + "?25l")
+
+    def draw(self, views):
+        """
+        Bring every tile up to date in one write.
+
+        :param views: One (board, title, health, status) tuple per tile, or None to leave a tile alone.
+        """
+        parts = [tile.frame(*view) for tile, view in zip(self.tiles, views) if view is not None]
+        parts.append(_goto(self.bottom, 1))
+        self._write("".join(parts))
+        self.frames += 1
+
+    def draw_states(self, states, titles=None):
+        """
+        Draw GameStates, one per tile.
+        """
+        views = []
+        for number, state in enumerate(states):
+            if state is None:
+                views.append(None)
+                continue
+            title = titles[number] if titles else f"game {number}"
+            views.append((state.board, title) + describe_state(state))
+        self.draw(views)
+
+    def stop(self):
+        """
+        Show the cursor again below the tiles.
+        """
+        self._write(_goto(self.bottom, 1) + ESC + "?25h")
+
+
+class TerminalView:
+    def __init__(self, out=None):
+        """
+        The terminal game's board: a BoardRenderer tile kept at the top of the terminal while
+        prompts and messages scroll in a region below it, so each move only redraws the squares
+        and lines that changed.
+
+        :param out: The text stream to write to (defaults to sys.stdout).
+        """
+        self.out = out or sys.stdout
+        self.tile = BoardRenderer(1, 1, 2 * TILE_WIDTH)
+        self.bytes_written = 0
+
+    def _write(self, text):
+        self.bytes_written += len(text.encode())
+        self.out.write(text)
+        self.out.flush()
+
+    def start(self):
+        """
+        Clear the terminal and limit scrolling to the lines below the tile.
+        """
+        try:
+            lines = os.get_terminal_size(self.out.fileno()).lines
+        except (AttributeError, OSError, ValueError):
+            lines = 24
+        self.tile.invalidate()
+        self._write(f"{ESC}2J{ESC}{TILE_HEIGHT + 1};{max(lines, TILE_HEIGHT + 2)}r" + _goto(TILE_HEIGHT + 1, 1))
+
+    def draw(self, board, title="", health="", status=""):
+        """
+        Bring the tile up to date in one write, leaving the cursor where the text below it was.
+        """
+        frame = self.tile.frame(board, title, health, status)
+        if frame:
+            # Save and restore the cursor around the frame so the scrolling text carries on
+            self._write("\0337" + frame + "\0338")
+
+    def draw_state(self, state, title=""):
+        self.draw(state.board, title, *describe_state(state))
+
+    def stop(self):
+        """
+        Let the whole terminal scroll again.
+        """
+        self._write(f"{ESC}r")
+
+
+def _live_games(count, seed, max_moves):
+    from BattleBoards import GameState
+    from tournament import RandomPlayer
+
+    def play(number):
+        state = GameState()
+        player = RandomPlayer(seed + number)
+        while state.result() is None and state.move_count < max_moves:
+            if state.battle is not None:
+                state.apply_attack_choice(player.choose_attack(state))
+            else:
+                state.apply_move(*player.choose_move(state))
+            yield state
+
+    return [play(number) for number in range(count)]
+
+
+def _recorded_games(path, count):
+    from gamerecord import GameReader, iter_replay
+
+    def play(record):
+        for state, _ in iter_replay(record):
+            yield state
+
+    reader = GameReader(path)
+    return [play(reader.game(number)) for number in range(min(count, len(reader)))]
+
+
+def watch(games, columns=None, delay=0.05, out=None):
+    """
+    Step several games together and show them tiled until all are over.
+
+    :param games: Iterators that yield a GameState after every step of their game.
+    :param delay: Seconds to wait between frames.
+    :return: The Screen, for its frame and byte counts.
+    """
+    screen = Screen(len(games), columns, out)
+    screen.start()
+    states = [None] * len(games)
+    running = list(range(len(games)))
+    try:
+        while running:
+            for number in list(running):
+                try:
+                    states[number] = next(games[number])
+                except StopIteration:
+                    running.remove(number)
+            screen.draw_states(states)
+            if delay:
+                time.sleep(delay)
+    finally:
+        screen.stop()
+    return screen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch BattleBoards games tiled in the terminal.")
+    parser.add_argument('--boards', type=int, default=4, help="number of games to show")
+    parser.add_argument('--columns', type=int, help="boards per row (default: as many as fit)")
+    parser.add_argument('--record', help="replay games from this game record file instead of playing new ones")
+    parser.add_argument('--delay', type=float, default=0.05, help="seconds between frames")
+    parser.add_argument('--seed', type=int, default=random.randrange(1 << 30))
+    parser.add_argument('--max-moves', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.record:
+        games = _recorded_games(args.record, args.boards)
+    else:
+        games = _live_games(args.boards, args.seed, args.max_moves)
+
+    screen = watch(games, args.columns, args.delay)
+    print(f"{screen.frames} frames, {screen.bytes_written / max(1, screen.frames):.0f} bytes per frame")
+
+
+if __name__ == "__main__":
+    main()
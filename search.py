@@ -0,0 +1,422 @@
+"""
+Alpha-beta computer player for BattleBoards.
+
+The search plays every capture out as an optimal battle with the solver, so
+each move leads to a single position. The tree is walked with
+GameState.make_move/unmake_move, and game over and evaluation are read from
+the state's piece index. Positions are hashed with Zobrist keys that cover
+every piece's square, type, color, current health and remaining special uses, since two boards that look the same can still
+differ in those. Search results are kept in a fixed-size transposition
+table with depth-preferred replacement that always gives way to entries
+left over from an earlier search. With a tablebase (see tablebase.py), the
+search stops at positions of the endings it holds and uses their exact
+values, and plays positions it holds straight from it. With an evaluator
+(see evaluator.py), the positions one move above the horizon have all their
+moves made and the resulting leaves scored in one batch. With an opening
+book (see book.py), positions it holds are played from it before any
+search.
+"""
+
+import hashlib
+import time
+
+from BattleBoards import MATERIAL_VALUES, GameState
+from solver import battle_outcome, best_attack_choice
+
+MATE_SCORE = 1000000
+INFINITY = 2 * MATE_SCORE
+# Nodes searched between checks of the clock when there is a time limit
+TIME_CHECK_NODES = 1024
+
+EXACT, LOWER_BOUND, UPPER_BOUND = range(3)
+
+
+def _random_key(*parts):
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class ZobristKeys:
+    def __init__(self):
+        """
+        Create Zobrist keys. Keys are derived from a hash of what they describe, so
+        every process produces the same key for the same position.
+        """
+        self.side_key = _random_key('black to move')
+        self._keys = {}
+
+    def piece_key(self, row, col, piece):
+        """
+        Return the key for a piece in its current state on a square.
+        """
+        state = (row, col, piece.color, piece.name, piece.health, piece.special_uses)
+        key = self._keys.get(state)
+        if key is None:
+            key = self._keys[state] = _random_key(*state)
+        return key
+
+    def position_key(self, board, turn):
+        """
+        Return the key of a whole position.
+
+        :param board: The chess board as a 2D list.
+        :param turn: The player to move ('white' or 'black').
+        """
+        key = self.side_key if turn == 'black' else 0
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece is not None:
+                    key ^= self.piece_key(row, col, piece)
+        return key
+
+
+ZOBRIST = ZobristKeys()
+
+
+class TranspositionTable:
+    def __init__(self, size=1 << 18):
+        """
+        Create a transposition table with a fixed number of slots.
+
+        :param size: The number of slots; a key is stored in slot key % size.
+        """
+        self.size = size
+        self.keys = [None] * size
+        self.entries = [None] * size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        """
+        Mark the entries stored so far as old, so any new result may replace them.
+        """
+        self.generation += 1
+
+    def probe(self, key):
+        """
+        Return the (depth, score, flag, move, generation) entry stored for a key, or None.
+        """
+        self.probes += 1
+        index = key % self.size
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.entries[index]
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = key % self.size
+        entry = self.entries[index]
+        if entry is None or entry[4] != self.generation or depth >= entry[0] or self.keys[index] == key:
+            self.keys[index] = key
+            self.entries[index] = (depth, score, flag, move, self.generation)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+
+def tablebase_score(value):
+    """
+    Turn a tablebase value into a search score: wins and losses score just inside MATE_SCORE,
+    sooner wins and later losses higher, and draws score 0.
+    """
+    if value > 0:
+        return MATE_SCORE - value
+    if value < 0:
+        return -MATE_SCORE - value
+    return 0
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class AlphaBetaPlayer:
+    def __init__(self, max_depth=3, time_limit=None, tt_size=1 << 18, tablebase=None, evaluator=None, book=None):
+        """
+        Create a computer player.
+
+        :param max_depth: The deepest iteration of iterative deepening, in moves.
+        :param time_limit: Seconds allowed per move, or None to always finish max_depth.
+        :param tt_size: The number of transposition table slots.
+        :param tablebase: An open tablebase.Tablebase to consult, or None.
+        :param evaluator: An evaluator.Evaluator to score leaves with in batches, or None for GameState.evaluate.
+        :param book: An open book.OpeningBook to play from, or None.
+        """
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.table = TranspositionTable(tt_size)
+        self.tablebase = tablebase
+        self.evaluator = evaluator
+        self.book = book
+        self.leaves = None
+        if evaluator is not None:
+            from evaluator import LeafBatch
+            self.leaves = LeafBatch(evaluator)
+        self.nodes = 0
+        self.deadline = None
+        self.next_check = 0
+        self.root_move_count = 0
+        self.last_report = {}
+
+    def choose_attack(self, state):
+        """
+        Return the optimal attack for the battle in progress on a GameState.
+        """
+        return best_attack_choice(state.battle)
+
+    def choose_move(self, state):
+        """
+        Pick a move for the player to move in a GameState.
+
+        :param state: A GameState with no battle in progress.
+        :return: ((start_row, start_col), (end_row, end_col)), or None if the player has no legal move.
+        """
+        if self.book is not None:
+            move = self.book.best_move(state)
+            if move is not None:
+                self.last_report = {'depth': 0, 'score': 0, 'nodes': 0, 'seconds': 0.0, 'nodes_per_sec': 0.0,
+                                    'tt_hit_rate': 0.0, 'book': True}
+                return move
+
+        if self.tablebase is not None:
+            move = self.tablebase.best_move(state)
+            if move is not None:
+                self.last_report = {'depth': 0, 'score': tablebase_score(self.tablebase.probe(state)), 'nodes': 0,
+                                    'seconds': 0.0, 'nodes_per_sec': 0.0, 'tt_hit_rate': 0.0, 'tablebase': True}
+                return move
+
+        key = ZOBRIST.position_key(state.board, state.turn)
+        self.table.new_search()
+        self.nodes = 0
+        self.root_move_count = state.move_count
+        probes, hits = self.table.probes, self.table.hits
+        started = time.perf_counter()
+        self.deadline = started + self.time_limit if self.time_limit else None
+        self.next_check = TIME_CHECK_NODES
+
+        best_move = None
+        best_score = 0
+        depth_reached = 0
+        for depth in range(1, self.max_depth + 1):
+            try:
+                best_score, move = self._root(state, key, depth)
+            except SearchTimeout:
+                # make_move/unmake_move pairs were cut short; take back what is still made
+                while state.move_count > self.root_move_count:
+                    state.unmake_move()
+                break
+            if move is not None:
+                best_move = move
+            depth_reached = depth
+            if abs(best_score) >= MATE_SCORE:
+                break
+
+        if best_move is None:
+            moves = state.legal_moves()
+            best_move = moves[0] if moves else None
+
+        elapsed = time.perf_counter() - started
+        probes = self.table.probes - probes
+        self.last_report = {
+            'depth': depth_reached,
+            'score': best_score,
+            'nodes': self.nodes,
+            'seconds': elapsed,
+            'nodes_per_sec': self.nodes / elapsed if elapsed > 0 else 0.0,
+            'tt_hit_rate': (self.table.hits - hits) / probes if probes else 0.0,
+        }
+        return best_move
+
+    def _root(self, state, key, depth):
+        entry = self.table.probe(key)
+        moves = self._ordered_moves(state, entry[3] if entry else None)
+        alpha, beta = -INFINITY, INFINITY
+        best_move = None
+        for move in moves:
+            score = self._play_and_search(state, key, move, depth, alpha, beta)
+            if best_move is None or score > alpha:
+                alpha = score
+                best_move = move
+        self.table.store(key, depth, alpha, EXACT, best_move)
+        return alpha, best_move
+
+    def _search(self, state, key, depth, alpha, beta):
+        self.nodes += 1
+        # The frontier search adds many nodes at once, so the count is compared, not matched
+        if self.deadline is not None and self.nodes >= self.next_check:
+            self.next_check = self.nodes + TIME_CHECK_NODES
+            if time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+
+        if self.tablebase is not None:
+            value = self.tablebase.probe(state)
+            if value is not None:
+                return tablebase_score(value)
+
+        if depth == 0:
+            return self._evaluate(state)
+
+        entry = self.table.probe(key)
+        tt_move = None
+        if entry is not None:
+            entry_depth, score, flag, tt_move, _ = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return score
+                if flag == LOWER_BOUND and score >= beta:
+                    return score
+                if flag == UPPER_BOUND and score <= alpha:
+                    return score
+
+        if depth == 1 and self.evaluator is not None:
+            best_score, best_move = self._search_frontier(state)
+            if best_move is None:
+                return self._evaluate(state)
+            self.table.store(key, depth, best_score, EXACT, best_move)
+            return best_score
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        for move in self._ordered_moves(state, tt_move):
+            score = self._play_and_search(state, key, move, depth, alpha, beta)
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_move is None:
+            return self._evaluate(state)
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.table.store(key, depth, best_score, flag, best_move)
+        return best_score
+
+    def _play_and_search(self, state, key, move, depth, alpha, beta):
+        """
+        Make a move, search the position after it and take it back.
+
+        :return: The score from the point of view of the player making the move.
+        """
+        board = state.board
+        (start_row, start_col), (end_row, end_col) = move
+        target = board[end_row][end_col]
+        child_key = key ^ ZOBRIST.side_key ^ ZOBRIST.piece_key(start_row, start_col, board[start_row][start_col])
+        if target is not None:
+            child_key ^= ZOBRIST.piece_key(end_row, end_col, target)
+
+        mover = state.turn
+        state.make_move(move[0], move[1], best_attack_choice)
+
+        if state.is_game_over():
+            # Defeating the King sooner (with more depth left) scores higher; a King that attacks
+            # and loses its battle loses the game for the mover
+            score = MATE_SCORE + depth if state.winner == mover else -(MATE_SCORE + depth)
+        else:
+            child_key ^= ZOBRIST.piece_key(end_row, end_col, board[end_row][end_col])
+            score = -self._search(state, child_key, depth - 1, -beta, -alpha)
+
+        state.unmake_move()
+        return score
+
+    def _search_frontier(self, state):
+        """
+        Search a position one move above the horizon: make every move, gather the positions
+        they lead to into the leaf batch, and score them with one call to the evaluator.
+        Every move is scored, so the result is exact rather than a bound.
+
+        :return: (best score, best move) for the player to move.
+        """
+        leaves = self.leaves
+        leaves.clear()
+        mover = state.turn
+        moves = state.legal_moves()
+        scores = []
+        rows = []
+        for start, end in moves:
+            state.make_move(start, end, best_attack_choice)
+            # Game over and tablebase positions score as they do in _play_and_search with one move of depth left
+            score = row = None
+            if state.is_game_over():
+                score = MATE_SCORE + 1 if state.winner == mover else -(MATE_SCORE + 1)
+            elif self.tablebase is not None:
+                value = self.tablebase.probe(state)
+                if value is not None:
+                    score = -tablebase_score(value)
+            if score is None:
+                row = leaves.add(state)
+            scores.append(score)
+            rows.append(row)
+            state.unmake_move()
+        self.nodes += len(moves)
+
+        leaf_scores = leaves.scores()
+        best_score = -INFINITY
+        best_move = None
+        for move, score, row in zip(moves, scores, rows):
+            if row is not None:
+                score = -float(leaf_scores[row])
+            if score > best_score:
+                best_score = score
+                best_move = move
+        return best_score, best_move
+
+    def _evaluate(self, state):
+        """
+        Score a position for the player to move with the evaluator, or with GameState.evaluate if there is none.
+        """
+        return state.evaluate() if self.evaluator is None else self.evaluator.evaluate(state)
+
+    def _ordered_moves(self, state, tt_move):
+        """
+        Order moves for the search: the transposition table move first, then captures
+        the attacker wins (most valuable victims first), then quiet moves, then
+        captures that would lose the attacking piece.
+        """
+        board = state.board
+        scored = []
+        for move in state.legal_moves():
+            (start_row, start_col), (end_row, end_col) = move
+            target = board[end_row][end_col]
+            if move == tt_move:
+                order = 1 << 30
+            elif target is None:
+                order = 0
+            else:
+                outcome = battle_outcome(board[start_row][start_col], target)
+                if outcome.mover_wins:
+                    order = 100000 if target.name == 'King' else 1000 + MATERIAL_VALUES[target.name]
+                else:
+                    order = -1000
+            scored.append((order, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+
+
+if __name__ == "__main__":
+    state = GameState()
+    player = AlphaBetaPlayer(max_depth=3)
+    for _ in range(4):
+        move = player.choose_move(state)
+        if move is None:
+            print(f"{state.turn} has no legal move")
+            break
+        report = player.last_report
+        print(f"{state.turn} plays {move}: depth {report['depth']}, {report['nodes']} nodes, "
+              f"{report['nodes_per_sec']:.0f} nodes/sec, TT hit rate {report['tt_hit_rate']:.1%}")
+        state.apply_move(*move)
+        while state.battle is not None:
+            state.apply_attack_choice(player.choose_attack(state))
+        if state.result() is not None:
+            print(f"{state.result()} wins")
+            break
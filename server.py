@@ -0,0 +1,377 @@
+"""
+Asyncio TCP server hosting many BattleBoards games at once.
+
+Clients speak a line protocol. Every game has its own GameState, so moves
+are checked with the same rules as is_valid_move and battles take turns the
+same way battle_scene runs them, but nothing ever waits on input(): a game
+only does work when a command for it arrives, so an idle game is just its
+state in a dictionary.
+
+Commands (one per line):
+    NEW [white|black|both]   start a game holding the given seats (default both)
+    JOIN <id>                take the free seat of a game
+    MOVE <id> <e2 e3>        move for the player to move
+    ATTACK <id> <1|2>        strike for the piece whose turn it is in the battle
+    BOARD <id>               show the board
+    STATS [id]               server metrics, or one game's metrics, as JSON
+    LEAVE <id>               give up the seats held in a game
+
+Replies:
+    GAME <id> <seats>                       after NEW and JOIN
+    EVENT <id> <what happened>              sent to every seat of the game
+    OK <id> <color> move|attack / OK <id> over
+                                            after MOVE and ATTACK, with who acts next
+    OK <id> left                            after LEAVE
+    BOARD <id> <turn> <64 squares>          '.' for an empty square
+    STATS <json>
+    ERR <id or -> <message>
+
+Example:
+    python server.py --port 8765
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+from BattleBoards import (BASIC_ATTACK, SPECIAL_ATTACK, GameState, convert_to_coordinates, convert_to_position,
+                          parse_move)
+from instrumentation import CallStats
+
+COLORS = ('white', 'black')
+# The longest command line accepted; longer lines are read, thrown away and answered with an error
+LINE_LIMIT = 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Game:
+    __slots__ = ('id', 'state', 'seats', 'commands', 'total_ns', 'max_ns', 'started')
+
+    def __init__(self, game_id):
+        """
+        A game hosted by the server.
+
+        :param game_id: The number clients use to refer to the game.
+        """
+        self.id = game_id
+        self.state = GameState()
+        self.seats = {}
+        self.commands = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.started = time.monotonic()
+
+    def next_to_act(self):
+        """
+        Return (color, 'move' or 'attack') for the player who acts next, or None once the game is over.
+        """
+        state = self.state
+        if state.result() is not None:
+            return None
+        if state.battle is not None:
+            return state.battle.current.color, 'attack'
+        return state.turn, 'move'
+
+    def metrics(self):
+        return {
+            'game': self.id,
+            'seconds': time.monotonic() - self.started,
+            'moves': self.state.move_count,
+            'commands': self.commands,
+            'mean_us': self.total_ns / self.commands / 1000 if self.commands else 0.0,
+            'max_us': self.max_ns / 1000,
+        }
+
+
+def describe(event):
+    """
+    Return the protocol text for an engine event, or None if clients are not told about it.
+    """
+    kind = event['type']
+    if kind == 'piece_moved':
+        return f"moved {convert_to_position(*event['from'])} {convert_to_position(*event['to'])}"
+    if kind == 'battle_started':
+        return f"battle {convert_to_position(*event['from'])} {convert_to_position(*event['to'])}"
+    if kind == 'damage_dealt':
+        return f"strike {event['piece'].color} {event['choice']} {event['damage']} {event['health']}"
+    if kind == 'battle_won':
+        return f"battle_won {event['winner'].color}"
+    if kind == 'piece_removed':
+        return f"removed {convert_to_position(*event['square'])}"
+    if kind == 'king_defeated':
+        return f"game_over {event['winner']}"
+    return None
+
+
+class Session:
+    __slots__ = ('writer', 'games')
+
+    def __init__(self, writer):
+        """
+        One client connection and the games it holds seats in.
+        """
+        self.writer = writer
+        self.games = set()
+
+    def send(self, line):
+        self.writer.write(line.encode() + b"\n")
+
+    async def drain(self):
+        """
+        Wait until the connection has taken what was sent. A closed connection is left to its own handler.
+        """
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+
+async def read_line(reader):
+    """
+    Read one command line.
+
+    :return: The line, None for a line longer than the reader's limit (which is read to its end
+             and thrown away), or b'' at the end of the stream.
+    """
+    overlong = False
+    while True:
+        try:
+            line = await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as error:
+            return b"" if overlong else error.partial
+        except asyncio.LimitOverrunError as error:
+            await reader.readexactly(error.consumed)
+            overlong = True
+            continue
+        return None if overlong else line
+
+
+class BattleServer:
+    def __init__(self):
+        """
+        Create a server with no games. Serve it with start() or handle connections with handle().
+        """
+        self.games = {}
+        self.sessions = set()
+        self.next_id = itertools.count(1)
+        self.latency = CallStats()
+        self.games_started = 0
+        self.games_finished = 0
+        self.games_abandoned = 0
+        # Sessions a broadcast wrote to during the command being handled, drained after it
+        self.written = set()
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        Start listening.
+
+        :param port: The port, or 0 for any free one.
+        :return: The port listened on.
+        """
+        self.server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        session = Session(writer)
+        self.sessions.add(session)
+        try:
+            while True:
+                line = await read_line(reader)
+                if line is None:
+                    session.send(f"ERR - Lines are limited to {LINE_LIMIT} bytes")
+                    await session.drain()
+                    continue
+                if not line:
+                    break
+                started = time.perf_counter_ns()
+                game = self.dispatch(session, line.decode(errors='replace').split())
+                elapsed = time.perf_counter_ns() - started
+                self.latency.add(elapsed)
+                if game is not None:
+                    game.commands += 1
+                    game.total_ns += elapsed
+                    if elapsed > game.max_ns:
+                        game.max_ns = elapsed
+                # Every seat a broadcast wrote to is drained, so a slow client holds up the
+                # players of its games instead of having its buffer grow without limit
+                receivers, self.written = self.written, set()
+                receivers.add(session)
+                await asyncio.gather(*(receiver.drain() for receiver in receivers))
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions.discard(session)
+            for game_id in list(session.games):
+                self.leave(session, game_id)
+            writer.close()
+
+    def dispatch(self, session, words):
+        """
+        Run one command and send the replies.
+
+        :return: The Game the command was about, or None.
+        """
+        if not words:
+            return None
+        command, args = words[0].upper(), words[1:]
+        game_id = args[0] if args else '-'
+        try:
+            if command == 'NEW':
+                return self.new_game(session, args[0].lower() if args else 'both')
+            if command == 'STATS':
+                session.send("STATS " + json.dumps(self.game(args[0]).metrics() if args else self.metrics()))
+                return None
+
+            if not args:
+                raise ProtocolError(f"{command} needs a game id")
+            game = self.game(game_id)
+            if command == 'JOIN':
+                self.join(session, game)
+            elif command == 'MOVE':
+                self.move(session, game, args[1:])
+            elif command == 'ATTACK':
+                self.attack(session, game, args[1:])
+            elif command == 'BOARD':
+                self.show_board(session, game)
+            elif command == 'LEAVE':
+                self.leave(session, game.id)
+                session.send(f"OK {game.id} left")
+            else:
+                raise ProtocolError(f"Unknown command: {command}")
+            return game
+        except (ProtocolError, ValueError) as error:
+            session.send(f"ERR {game_id} {error}")
+            return None
+
+    def game(self, game_id):
+        try:
+            return self.games[int(game_id)]
+        except (ValueError, KeyError):
+            raise ProtocolError(f"No game {game_id}") from None
+
+    def new_game(self, session, seats):
+        if seats not in COLORS and seats != 'both':
+            raise ProtocolError("Seats must be white, black or both")
+        game = Game(next(self.next_id))
+        for color in COLORS if seats == 'both' else (seats,):
+            game.seats[color] = session
+        self.games[game.id] = game
+        session.games.add(game.id)
+        self.games_started += 1
+        session.send(f"GAME {game.id} {seats}")
+        return game
+
+    def join(self, session, game):
+        free = [color for color in COLORS if color not in game.seats]
+        if not free:
+            raise ProtocolError("The game is full")
+        game.seats[free[0]] = session
+        session.games.add(game.id)
+        session.send(f"GAME {game.id} {free[0]}")
+
+    def leave(self, session, game_id):
+        game = self.games.get(game_id)
+        session.games.discard(game_id)
+        if game is None:
+            return
+        for color in [color for color, seat in game.seats.items() if seat is session]:
+            del game.seats[color]
+        if not game.seats:
+            # Nobody is left to finish the game
+            del self.games[game_id]
+            self.games_abandoned += 1
+
+    def check_seat(self, session, game, color):
+        if game.seats.get(color) is not session:
+            raise ProtocolError(f"It is {color}'s turn")
+
+    def move(self, session, game, args):
+        state = game.state
+        if state.result() is not None:
+            raise ProtocolError("The game is over")
+        if state.battle is not None:
+            raise ProtocolError("The battle in progress has to be finished first")
+        parsed = parse_move(" ".join(args).lower())
+        if parsed is None:
+            raise ProtocolError("Moves look like 'e2 e3'")
+        self.check_seat(session, game, state.turn)
+        events = state.apply_move(convert_to_coordinates(parsed[0]), convert_to_coordinates(parsed[1]))
+        self.report(game, events)
+
+    def attack(self, session, game, args):
+        battle = game.state.battle
+        if battle is None:
+            raise ProtocolError("There is no battle in progress")
+        if len(args) != 1 or args[0] not in ('1', '2'):
+            raise ProtocolError("Attacks are 1 (regular) or 2 (special)")
+        self.check_seat(session, game, battle.current.color)
+        choice = BASIC_ATTACK if args[0] == '1' else SPECIAL_ATTACK
+        if choice not in battle.attack_choices():
+            raise ProtocolError(f"{battle.current.name} has no special attack uses left")
+        self.report(game, game.state.apply_attack_choice(choice))
+
+    def report(self, game, events):
+        """
+        Send the events of a command to every seat, then tell them who acts next.
+        """
+        receivers = set(game.seats.values())
+        lines = [f"EVENT {game.id} {text}" for text in map(describe, events) if text]
+        next_to_act = game.next_to_act()
+        lines.append(f"OK {game.id} over" if next_to_act is None else f"OK {game.id} {' '.join(next_to_act)}")
+        for session in receivers:
+            for line in lines:
+                session.send(line)
+        self.written.update(receivers)
+
+        if next_to_act is None:
+            self.games_finished += 1
+            del self.games[game.id]
+            for session in receivers:
+                session.games.discard(game.id)
+
+    def show_board(self, session, game):
+        squares = "".join(piece.symbol if piece is not None else '.' for row in game.state.board for piece in row)
+        session.send(f"BOARD {game.id} {game.state.turn} {squares}")
+
+    def metrics(self):
+        """
+        Return the server-wide numbers: games in flight, games started, finished and abandoned,
+        open connections and the latency of handling a command.
+        """
+        return {
+            'games_in_flight': len(self.games),
+            'games_started': self.games_started,
+            'games_finished': self.games_finished,
+            'games_abandoned': self.games_abandoned,
+            'connections': len(self.sessions),
+            'latency': self.latency.summary(),
+        }
+
+
+async def serve(host, port):
+    server = BattleServer()
+    port = await server.start(host, port)
+    print(f"Serving BattleBoards on {host}:{port}")
+    async with server.server:
+        await server.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host BattleBoards games over TCP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
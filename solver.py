@@ -0,0 +1,202 @@
+"""
+Exact battle solver for BattleBoards.
+
+A battle only depends on the two pieces' damage values, their current
+health, their remaining special attack uses and whose turn it is, so it can
+be solved exactly by memoized search over that state. The search keeps an
+explicit stack instead of recursing, so however long custom piece stats
+make a battle it cannot exceed the recursion limit, and its cache is
+bounded. Both sides play optimally: the side that can win does so with as
+much health left as possible, and the side that cannot win deals as much
+damage as it can before falling, since health is not recovered after a
+battle. When both attacks are equally good the regular attack is chosen to
+save special uses.
+"""
+
+import time
+from collections import namedtuple
+
+from BattleBoards import BASIC_ATTACK, PIECE_TYPES, SPECIAL_ATTACK, Battle
+
+BattleResult = namedtuple('BattleResult', ['mover_wins', 'winner_health', 'choice'])
+
+
+# Battle states kept between calls; the cache is emptied when a solve starts with more than this
+SOLVE_CACHE_SIZE = 1 << 20
+_solved = {}
+
+
+def solve(basic, special, other_basic, other_special, health, other_health, uses, other_uses):
+    """
+    Solve a battle from the point of view of the piece about to strike.
+
+    :param basic: Regular attack damage of the piece to move.
+    :param special: Special attack damage of the piece to move.
+    :param other_basic: Regular attack damage of its opponent.
+    :param other_special: Special attack damage of its opponent.
+    :param health: Current health of the piece to move.
+    :param other_health: Current health of its opponent.
+    :param uses: Remaining special attack uses of the piece to move.
+    :param other_uses: Remaining special attack uses of its opponent.
+    :return: (score, choice). The score is the winner's remaining health, positive
+             if the piece to move wins and negative if it loses; choice is the
+             optimal BASIC_ATTACK or SPECIAL_ATTACK.
+    """
+    state = (basic, special, other_basic, other_special, health, other_health, uses, other_uses)
+    result = _solved.get(state)
+    if result is None:
+        if len(_solved) > SOLVE_CACHE_SIZE:
+            _solved.clear()
+        result = _solve_states(state)
+    return result
+
+
+def _solve_states(root):
+    """
+    Solve a battle state and every state after it that is not cached yet, with an explicit
+    stack rather than recursion, so long battles from custom piece stats cannot exceed the
+    recursion limit. Every state solved is added to the cache.
+    """
+    solved = _solved
+    stack = [root]
+    while stack:
+        state = stack[-1]
+        if state in solved:
+            stack.pop()
+            continue
+        basic, special, other_basic, other_special, health, other_health, uses, other_uses = state
+        if other_health - basic <= 0:
+            solved[state] = health, BASIC_ATTACK
+            stack.pop()
+            continue
+        if uses > 0 and other_health - special <= 0:
+            solved[state] = health, SPECIAL_ATTACK
+            stack.pop()
+            continue
+
+        after_basic = (other_basic, other_special, basic, special, other_health - basic, health, other_uses, uses)
+        after_special = (other_basic, other_special, basic, special, other_health - special, health,
+                         other_uses, uses - 1) if uses > 0 else None
+        waiting = [after for after in (after_basic, after_special) if after is not None and after not in solved]
+        if waiting:
+            stack.extend(waiting)
+            continue
+
+        best = -solved[after_basic][0]
+        choice = BASIC_ATTACK
+        if after_special is not None:
+            score = -solved[after_special][0]
+            if score > best:
+                best = score
+                choice = SPECIAL_ATTACK
+        solved[state] = best, choice
+        stack.pop()
+    return solved[root]
+
+
+def solve_pieces(mover, other):
+    """
+    Solve a battle between two pieces in their current state, with mover to strike next.
+
+    :param mover: The chess piece whose turn it is.
+    :param other: Its opponent.
+    :return: A BattleResult.
+    """
+    mover_stats, other_stats = mover.stats, other.stats
+    if (mover.health == mover_stats.health and other.health == other_stats.health and
+            mover.special_uses == mover_stats.special_uses and other.special_uses == other_stats.special_uses):
+        result = FULL_HEALTH_TABLE.get((mover_stats, other_stats))
+        if result is None:
+            # Stats installed with apply_piece_stats after the table was built
+            result = FULL_HEALTH_TABLE[mover_stats, other_stats] = _solve_full_health(mover_stats, other_stats)
+        return result
+
+    score, choice = solve(mover.stats.attack_damage, mover.stats.special_damage,
+                          other.stats.attack_damage, other.stats.special_damage,
+                          mover.health, other.health, mover.special_uses, other.special_uses)
+    return BattleResult(score > 0, abs(score), choice)
+
+
+def battle_outcome(attacker, defender):
+    """
+    Return the result of a battle that is about to start, where the attacker strikes first.
+
+    :param attacker: The chess piece making the capture.
+    :param defender: The chess piece being captured.
+    :return: A BattleResult; mover_wins tells whether the attacker wins.
+    """
+    return solve_pieces(attacker, defender)
+
+
+def best_attack_choice(battle):
+    """
+    Return the optimal attack for the piece whose turn it is in a Battle.
+
+    :param battle: A Battle in progress.
+    :return: BASIC_ATTACK or SPECIAL_ATTACK.
+    """
+    return solve_pieces(battle.current, battle.opponent_of(battle.current)).choice
+
+
+def fight(attacker, defender):
+    """
+    Play out a battle with both pieces choosing optimal attacks, updating their
+    health and special attack uses the way Battle does.
+
+    :param attacker: The chess piece making the capture; it strikes first.
+    :param defender: The chess piece being captured.
+    :return: The Battle, with winner and loser set.
+    """
+    battle = Battle(attacker, defender)
+    while battle.winner is None:
+        battle.strike(best_attack_choice(battle))
+    return battle
+
+
+def _solve_full_health(a, b):
+    score, choice = solve(a.attack_damage, a.special_damage, b.attack_damage, b.special_damage,
+                          a.health, b.health, a.special_uses, b.special_uses)
+    return BattleResult(score > 0, abs(score), choice)
+
+
+def build_full_health_table():
+    """
+    Solve every pairing of piece types with both pieces at full health and uses.
+
+    Entries are keyed by the two pieces' PieceStats, so results for stats loaded later
+    with apply_piece_stats are added next to these instead of being confused with them.
+
+    :return: A dictionary mapping (mover stats, other stats) to a BattleResult.
+    """
+    return {(mover.stats, other.stats): _solve_full_health(mover.stats, other.stats)
+            for mover in PIECE_TYPES for other in PIECE_TYPES}
+
+
+FULL_HEALTH_TABLE = build_full_health_table()
+
+
+if __name__ == "__main__":
+    names = [piece_class.stats.name for piece_class in PIECE_TYPES]
+    print("Attacker vs defender at full health (winner, winner's remaining health):")
+    print("         " + "".join(f"{name:>12}" for name in names))
+    for attacker in PIECE_TYPES:
+        cells = []
+        for defender in PIECE_TYPES:
+            result = FULL_HEALTH_TABLE[attacker.stats, defender.stats]
+            cells.append(f"{('A ' if result.mover_wins else 'D ') + str(result.winner_health):>12}")
+        print(f"{attacker.stats.name:>9}" + "".join(cells))
+
+    print(f"\n{len(_solved)} battle states cached.")
+
+    pieces = [piece_class('white') for piece_class in PIECE_TYPES]
+    targets = [piece_class('black') for piece_class in PIECE_TYPES]
+    for piece in targets:
+        piece.health -= 10
+    start = time.perf_counter()
+    calls = 0
+    while time.perf_counter() - start < 1:
+        for attacker in pieces:
+            for defender in targets:
+                solve_pieces(attacker, defender)
+        calls += 36
+    print(f"{calls / (time.perf_counter() - start):.0f} cached solves/sec")
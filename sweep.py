@@ -0,0 +1,229 @@
+"""
+Parallel stat-balance sweeps for BattleBoards.
+
+A sweep takes the piece stats from pieces.json (or another stats file) and
+a grid of changes, such as three Queen healths times four King special
+damages, and measures every combination on a process pool: the win rate of
+every attacker against every defender at full health, and the winner and
+length of a number of self-play games.
+
+Battles between two pieces only depend on the two pieces' stats, and most
+variants of a grid share most pairs of stats with some other variant, so
+each worker keeps the matchup results it has computed, keyed by the two
+PieceStats, and the solver's memo is shared by every battle in the worker.
+Variants are handed out in grid order in chunks, so neighbouring variants,
+which differ in one value, land on the same worker.
+
+Example:
+    python sweep.py --vary Queen.health=100:150:10 --vary King.special_damage=40,50,60 --games 20
+    python sweep.py --vary Pawn.special_uses=1:5 --output pawns.jsonl --attacker-policy random
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from BattleBoards import PIECE_STATS, PIECE_TYPES, PieceStats, apply_piece_stats, load_piece_stats, validate_piece_stats
+from batch_battles import POLICIES, simulate
+from tournament import RandomPlayer, play_one_game
+
+NUMBER_FIELDS = ('health', 'attack_damage', 'special_damage', 'special_uses')
+
+# Matchup results of this process, keyed by both pieces' stats and how the battles are fought
+_MATCHUPS = {}
+_MATCHUP_COUNTS = {'reused': 0, 'computed': 0}
+
+
+def parse_axis(text):
+    """
+    Parse one --vary argument: Piece.field=values, where values are a comma separated
+    list or a start:stop[:step] range that includes stop.
+
+    :return: (piece name, field, list of values).
+    """
+    target, separator, values = text.partition('=')
+    piece, _, field = target.partition('.')
+    if not separator or piece not in PIECE_STATS or field not in NUMBER_FIELDS:
+        raise ValueError(f"Expected Piece.field=values with a field among {', '.join(NUMBER_FIELDS)}, not {text}")
+    if ':' in values:
+        start, stop, *step = (int(part) for part in values.split(':'))
+        numbers = list(range(start, stop + 1, step[0] if step else 1))
+    else:
+        numbers = [int(part) for part in values.split(',')]
+    if not numbers:
+        raise ValueError(f"{text} has no values")
+    return piece, field, numbers
+
+
+def variants(base, axes):
+    """
+    Yield (changes, stats) for every point of the grid: changes maps "Piece.field" to its
+    value, stats is the full table of PieceStats with those changes made. Changed pieces are
+    checked like load_piece_stats checks a stats file.
+
+    :param base: A dictionary mapping piece names to PieceStats.
+    :param axes: What parse_axis returns, for each axis of the grid.
+    """
+    for point in itertools.product(*(numbers for _, _, numbers in axes)):
+        stats = dict(base)
+        changes = {}
+        for (piece, field, _), value in zip(axes, point):
+            stats[piece] = stats[piece]._replace(**{field: value})
+            changes[f"{piece}.{field}"] = value
+        for piece in {piece for piece, _, _ in axes}:
+            validate_piece_stats(stats[piece], f"--vary {', '.join(f'{name}={value}' for name, value in changes.items())}")
+        yield changes, stats
+
+
+def _piece_arrays(stats, battles):
+    return {
+        'basic': np.full(battles, stats.attack_damage),
+        'special': np.full(battles, stats.special_damage),
+        'health': np.full(battles, stats.health),
+        'uses': np.full(battles, stats.special_uses),
+    }
+
+
+def matchup(attacker, defender, battles, attacker_policy, defender_policy, seed=0):
+    """
+    Return the attacker's win rate and the mean number of strikes of battles between
+    two pieces at full health, reusing the result if this process has fought them before.
+
+    :param attacker: The attacking piece's PieceStats.
+    :param defender: The defending piece's PieceStats.
+    """
+    key = (attacker, defender, battles, attacker_policy, defender_policy, seed)
+    result = _MATCHUPS.get(key)
+    if result is not None:
+        _MATCHUP_COUNTS['reused'] += 1
+        return result
+    _MATCHUP_COUNTS['computed'] += 1
+    attacker_won, strikes = simulate(_piece_arrays(attacker, battles), _piece_arrays(defender, battles),
+                                     attacker_policy, defender_policy, seed)
+    result = _MATCHUPS[key] = (float(attacker_won.mean()), float(strikes.mean()))
+    return result
+
+
+def evaluate_variant(job):
+    """
+    Measure one variant in this process: install its stats, fight every matchup and play the games.
+
+    :param job: (number, changes, stats as lists, games, battles, attacker policy, defender policy,
+                 seed, max moves).
+    :return: A result dictionary.
+    """
+    number, changes, stats, games, battles, attacker_policy, defender_policy, seed, max_moves = job
+    stats = {name: PieceStats(*fields) for name, fields in stats.items()}
+    apply_piece_stats(stats)
+    reused, computed = _MATCHUP_COUNTS['reused'], _MATCHUP_COUNTS['computed']
+
+    matchups = {}
+    for attacker in PIECE_TYPES:
+        for defender in PIECE_TYPES:
+            win_rate, strikes = matchup(attacker.stats, defender.stats, battles, attacker_policy, defender_policy, seed)
+            matchups[f"{attacker.stats.name}>{defender.stats.name}"] = {'win_rate': win_rate, 'strikes': strikes}
+
+    wins = {'white': 0, 'black': 0, None: 0}
+    moves = battles_fought = 0
+    for game in range(games):
+        game_seed = (seed + game) * 2
+        result = play_one_game({'white': RandomPlayer(game_seed), 'black': RandomPlayer(game_seed + 1)}, max_moves)
+        wins[result['winner']] += 1
+        moves += result['moves']
+        battles_fought += result['battles']
+
+    return {
+        'variant': number,
+        'changes': changes,
+        'matchups': matchups,
+        'games': games,
+        'white_win_rate': wins['white'] / games if games else 0.0,
+        'black_win_rate': wins['black'] / games if games else 0.0,
+        'draw_rate': wins[None] / games if games else 0.0,
+        'mean_moves': moves / games if games else 0.0,
+        'mean_battles': battles_fought / games if games else 0.0,
+        'matchups_reused': _MATCHUP_COUNTS['reused'] - reused,
+        'matchups_computed': _MATCHUP_COUNTS['computed'] - computed,
+    }
+
+
+def run_sweep(axes, base=None, games=20, battles=1, attacker_policy='optimal', defender_policy='optimal',
+              seed=0, max_moves=500, workers=None, on_result=None):
+    """
+    Measure every variant of a grid across a process pool.
+
+    :param axes: What parse_axis returns, for each axis of the grid.
+    :param base: The stats the grid changes (default: PIECE_STATS).
+    :param games: Random self-play games per variant; every variant plays the same seeds.
+    :param battles: Battles per matchup; 1 is enough when both policies are deterministic.
+    :param workers: The number of worker processes (defaults to the CPU count).
+    :param on_result: Called with each variant's result as it arrives, in no particular order.
+    :return: Totals over the sweep.
+    """
+    workers = workers or cpu_count()
+    grid = list(variants(base or PIECE_STATS, axes))
+    jobs = ((number, changes, {name: list(piece_stats) for name, piece_stats in stats.items()}, games, battles,
+             attacker_policy, defender_policy, seed, max_moves)
+            for number, (changes, stats) in enumerate(grid))
+    totals = {'variants': 0, 'matchups_reused': 0, 'matchups_computed': 0}
+
+    with Pool(workers) as pool:
+        # Contiguous chunks keep neighbouring variants, which share most matchups, on one worker
+        chunksize = max(1, min(64, len(grid) // (workers * 4)))
+        for result in pool.imap_unordered(evaluate_variant, jobs, chunksize=chunksize):
+            totals['variants'] += 1
+            totals['matchups_reused'] += result['matchups_reused']
+            totals['matchups_computed'] += result['matchups_computed']
+            if on_result is not None:
+                on_result(result)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep a grid of BattleBoards piece stat variants.")
+    parser.add_argument('--vary', action='append', required=True, metavar='PIECE.FIELD=VALUES',
+                        help="an axis of the grid, e.g. Queen.health=100:150:10 or King.special_uses=2,3,4")
+    parser.add_argument('--pieces', help="stats file the grid starts from (default: pieces.json)")
+    parser.add_argument('--games', type=int, default=20, help="random self-play games per variant")
+    parser.add_argument('--battles', type=int, default=1, help="battles per matchup (raise it for random policies)")
+    parser.add_argument('--attacker-policy', choices=POLICIES, default='optimal')
+    parser.add_argument('--defender-policy', choices=POLICIES, default='optimal')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-moves', type=int, default=500, help="moves before a game is a draw")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--output', help="write one JSON line per variant to this file (default: stdout)")
+    args = parser.parse_args()
+
+    base = load_piece_stats(args.pieces) if args.pieces else PIECE_STATS
+    try:
+        axes = [parse_axis(text) for text in args.vary]
+        # Check every variant before any worker starts
+        for _ in variants(base, axes):
+            pass
+    except ValueError as error:
+        parser.error(str(error))
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    started = time.perf_counter()
+    try:
+        totals = run_sweep(axes, base, args.games, args.battles, args.attacker_policy, args.defender_policy,
+                           args.seed, args.max_moves, args.workers,
+                           lambda result: output.write(json.dumps(result) + "\n"))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+
+    matchups = totals['matchups_reused'] + totals['matchups_computed']
+    print(f"{totals['variants']} variants in {elapsed:.1f}s ({totals['variants'] / elapsed if elapsed > 0 else 0:.1f}"
+          f" variants/sec); {totals['matchups_reused'] / matchups if matchups else 0:.1%} of matchups reused",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
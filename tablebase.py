@@ -0,0 +1,661 @@
+"""
+Endgame tablebases for BattleBoards.
+
+Chess tablebases do not apply here: a capture starts a battle, and who wins
+it depends on both pieces' health and special attack uses. This module
+solves small endings (King and one piece against a bare King, and King
+against King) exactly, by retrograde analysis over every placement of the
+pieces, the side to move, and the health and special uses of every piece.
+
+Health is kept in buckets. Every damage a piece can take from the enemy
+pieces of an ending is a multiple of one unit (the gcd of those damages),
+so a piece's health divided by its unit and rounded up decides every battle
+it can fight exactly as its health does. Health and uses only change in
+battles, and in these endings a battle either defeats a King or leaves a
+smaller ending, so all placements for one health and uses vector are solved
+together, with the battles looked up in the smaller ending's tables. Most
+vectors give every battle the same result as some other vector; those
+share a table, and a small index maps each vector to its table.
+
+Values are from the point of view of the player to move: n > 0 means that
+player defeats the enemy King within n moves, n < 0 that its King falls
+within -n moves, and 0 a draw. A capture counts as one move however long
+its battle lasts. Battles are assumed to be fought with the solver's
+optimal attacks, as the computer player and make_move do.
+
+File layout (all integers little-endian):
+    header      b'BBTB', u16 version, u16 reserved, u32 directory length
+    directory   JSON: the piece stats the file was built for and, per
+                ending, the offsets of its stats index and tables
+    data        per ending: u16 table number for every health and uses
+                vector, then its tables of one i8 per position
+
+The file is read through mmap, so probing a position costs a few index
+computations and one byte read, and a tablebase is shared between processes
+by the page cache.
+
+Example:
+    python tablebase.py --build endings.bbtb               # KvK and every KXvK
+    python tablebase.py --build small.bbtb KRvK             # KRvK and the KvK it needs
+    python tablebase.py endings.bbtb --verify 5000
+"""
+
+import argparse
+import itertools
+import json
+import math
+import mmap
+import random
+import struct
+import time
+from array import array
+
+import numpy as np
+
+from BattleBoards import PIECE_TYPES, GameState, King, opponent, piece_targets
+from solver import best_attack_choice, fight
+
+MAGIC = b'BBTB'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHHI')
+
+COLORS = ('white', 'black')
+LETTERS = {piece_class.stats.symbol: piece_class for piece_class in PIECE_TYPES}
+TYPE_ORDER = {piece_class.__name__: number for number, piece_class in enumerate(PIECE_TYPES)}
+
+# Endings built when none are named: King against King, and King and one piece against a King
+ENDINGS = ['KvK'] + ['K' + piece_class.stats.symbol + 'vK' for piece_class in PIECE_TYPES[1:]]
+
+# Outcomes of a battle that defeats a King, from the point of view of the side that attacked
+WIN, LOSS = 'win', 'loss'
+
+# Moves are ranked so the larger rank is the better value: quick wins, then draws, then slow losses
+_RANK_WIN = 1000
+_NO_CAPTURE = -2000
+MAX_DISTANCE = 127
+
+
+def _rank(values):
+    return np.where(values > 0, _RANK_WIN - values, np.where(values < 0, -_RANK_WIN - values, 0))
+
+
+def _back(values):
+    """
+    Turn values for the player to move after a move into values for the player who made it.
+    """
+    values = values.astype(np.int16)
+    return np.where(values > 0, -(values + 1), np.where(values < 0, 1 - values, 0))
+
+
+def back_value(value):
+    """
+    Turn the value of the position after a move into the value of the move for the player making it.
+    """
+    if value > 0:
+        return -(value + 1)
+    if value < 0:
+        return 1 - value
+    return 0
+
+
+def value_rank(value):
+    """
+    Return a number that orders values from best to worst for the player they belong to.
+    """
+    if value > 0:
+        return _RANK_WIN - value
+    if value < 0:
+        return -_RANK_WIN - value
+    return 0
+
+
+class Material:
+    def __init__(self, name):
+        """
+        Describe an ending by its name: white's pieces, 'v', black's pieces, e.g. 'KRvK'.
+
+        Pieces are numbered white's first, each side King first, then in PIECE_TYPES order.
+        """
+        white, separator, black = name.partition('v')
+        if not separator:
+            raise ValueError(f"Endings are named like KRvK, not {name}")
+        self.pieces = []
+        for color, letters in (('white', white), ('black', black)):
+            if letters.count('K') != 1 or any(letter not in LETTERS for letter in letters):
+                raise ValueError(f"Each side of {name} needs one King and known piece letters")
+            classes = sorted((LETTERS[letter] for letter in letters), key=lambda cls: TYPE_ORDER[cls.__name__])
+            self.pieces.extend((color, piece_class) for piece_class in classes)
+        if len(black) != 1 or len(white) > 2:
+            raise ValueError(f"Only King against King and King and one piece against a King are supported, not {name}")
+
+        self.name = material_name(self.pieces)
+        self.count = len(self.pieces)
+        self.sides = [COLORS.index(color) for color, _ in self.pieces]
+        self.weights = [64 ** (self.count - 1 - number) for number in range(self.count)]
+        self.positions = 2 * 64 ** self.count
+
+        self.units = []
+        for color, piece_class in self.pieces:
+            damages = set()
+            for other_color, other_class in self.pieces:
+                if other_color != color:
+                    damages.update((other_class.stats.attack_damage, other_class.stats.special_damage))
+            self.units.append(math.gcd(*damages))
+        self.buckets = [-(-piece_class.stats.health // unit) for (_, piece_class), unit in zip(self.pieces, self.units)]
+        self.uses = [piece_class.stats.special_uses + 1 for _, piece_class in self.pieces]
+        self.stats_count = math.prod(buckets * uses for buckets, uses in zip(self.buckets, self.uses))
+
+        # Battles that can happen: (attacker, defender) for pieces of opposite sides
+        self.captures = [(attacker, defender) for attacker in range(self.count) for defender in range(self.count)
+                         if self.sides[attacker] != self.sides[defender]]
+
+    def without(self, number):
+        """
+        Return the name of the ending left when piece number is removed.
+        """
+        return material_name(self.pieces[:number] + self.pieces[number + 1:])
+
+    def position(self, squares, side):
+        """
+        Return the position number of the pieces on squares (row * 8 + col), side (0 white, 1 black) to move.
+        """
+        code = 0
+        for square in squares:
+            code = code * 64 + square
+        return code * 2 + side
+
+    def stats_index(self, stats):
+        """
+        Return the number of a health and uses vector: one (bucket, uses) pair per piece, buckets from 1.
+        """
+        index = 0
+        for (bucket, uses), buckets, uses_count in zip(stats, self.buckets, self.uses):
+            index = (index * buckets + bucket - 1) * uses_count + uses
+        return index
+
+    def iter_stats(self):
+        """
+        Yield every health and uses vector in stats_index order.
+        """
+        ranges = [[(bucket, uses) for bucket in range(1, buckets + 1) for uses in range(uses_count)]
+                  for buckets, uses_count in zip(self.buckets, self.uses)]
+        return itertools.product(*ranges)
+
+
+def material_name(pieces):
+    """
+    Return the name of an ending from its (color, piece class) pairs.
+    """
+    sides = []
+    for color in COLORS:
+        classes = sorted((piece_class for piece_color, piece_class in pieces if piece_color == color),
+                         key=lambda cls: TYPE_ORDER[cls.__name__])
+        sides.append("".join(piece_class.stats.symbol for piece_class in classes))
+    return "v".join(sides)
+
+
+class MoveGraph:
+    def __init__(self, material):
+        """
+        Generate every move of every placement of an ending's pieces. Quiet moves are kept as
+        an edge list grouped by position; captures by (attacker, defender) pair, with the
+        position each battle result leaves in the smaller ending.
+
+        :param material: A Material.
+        """
+        count, weights, sides = material.count, material.weights, material.sides
+        pieces = [piece_class(color) for color, piece_class in material.pieces]
+        board = [[None] * 8 for _ in range(8)]
+        sources, targets = array('i'), array('i')
+        captures = {pair: array('i') for pair in material.captures}
+
+        for squares in itertools.permutations(range(64), count):
+            code = 0
+            for number, square in enumerate(squares):
+                code = code * 64 + square
+                board[square >> 3][square & 7] = pieces[number]
+            holder = {square: number for number, square in enumerate(squares)}
+            for number, square in enumerate(squares):
+                side = sides[number]
+                source = code * 2 + side
+                for row, col in piece_targets(pieces[number], square >> 3, square & 7, board):
+                    end = row * 8 + col
+                    defender = holder.get(end)
+                    if defender is None:
+                        sources.append(source)
+                        targets.append((code + (end - square) * weights[number]) * 2 + 1 - side)
+                    else:
+                        captures[number, defender].append(source)
+            for square in squares:
+                board[square >> 3][square & 7] = None
+
+        sources = np.frombuffer(sources, dtype=np.int32)
+        targets = np.frombuffer(targets, dtype=np.int32)
+        order = np.argsort(sources, kind='stable')
+        sources, self.targets = sources[order], targets[order]
+        # Every placement has quiet moves (a King always has a free square), so each valid
+        # position owns one nonempty run of edges starting at its entry in starts
+        self.valid, self.starts = np.unique(sources, return_index=True)
+
+        self.captures = {}
+        for (attacker, defender), positions in captures.items():
+            positions = np.frombuffer(positions, dtype=np.int32).astype(np.int64)
+            digits = [(positions >> 1) // weight % 64 for weight in weights]
+            side = 1 - (positions & 1)
+            won = lost = None
+            if material.pieces[defender][1] is not King:
+                moved = list(digits)
+                moved[attacker] = digits[defender]
+                won = _encode([digit for number, digit in enumerate(moved) if number != defender], side)
+            if material.pieces[attacker][1] is not King:
+                lost = _encode([digit for number, digit in enumerate(digits) if number != attacker], side)
+            self.captures[attacker, defender] = (positions, won, lost)
+
+
+def _encode(digits, side):
+    code = 0
+    for digit in digits:
+        code = code * 64 + digit
+    return code * 2 + side
+
+
+def _battle_result(material, attacker, defender, stats, cache):
+    """
+    Fight the battle between two pieces of an ending with bucketed health.
+
+    :return: (winner, winner's bucket, winner's uses) with winner a piece number.
+    """
+    key = (attacker, defender, stats[attacker], stats[defender])
+    result = cache.get(key)
+    if result is None:
+        fighters = []
+        for number in (attacker, defender):
+            color, piece_class = material.pieces[number]
+            piece = piece_class(color)
+            # Any health in the bucket fights the same battle; use the top of it
+            piece.health = stats[number][0] * material.units[number]
+            piece.special_uses = stats[number][1]
+            fighters.append(piece)
+        battle = fight(*fighters)
+        winner = attacker if battle.winner is fighters[0] else defender
+        result = cache[key] = (winner, battle.winner.health // material.units[winner], battle.winner.special_uses)
+    return result
+
+
+def _signature(material, stats, smaller, cache):
+    """
+    Return what every battle of an ending leads to for one health and uses vector: WIN or LOSS
+    for the attacking side when a King falls, otherwise (attacker won, table number in the
+    smaller ending).
+
+    :param smaller: Maps ending names to (Material, stats index array) of the endings already built.
+    """
+    outcomes = []
+    for attacker, defender in material.captures:
+        winner, bucket, uses = _battle_result(material, attacker, defender, stats, cache)
+        loser = defender if winner == attacker else attacker
+        if material.pieces[loser][1] is King:
+            outcomes.append(WIN if winner == attacker else LOSS)
+            continue
+        sub_material, sub_index = smaller[material.without(loser)]
+        sub_stats = []
+        for number in range(material.count):
+            if number == loser:
+                continue
+            piece_bucket, piece_uses = (bucket, uses) if number == winner else stats[number]
+            # The smaller ending's unit is a multiple of this one, so its bucket follows from ours
+            ratio = sub_material.units[len(sub_stats)] // material.units[number]
+            sub_stats.append((-(-piece_bucket // ratio), piece_uses))
+        outcomes.append((winner == attacker, int(sub_index[sub_material.stats_index(sub_stats)])))
+    return tuple(outcomes)
+
+
+def _capture_ranks(material, graph, signature, built):
+    """
+    Return the rank of the best capture in every position, or _NO_CAPTURE where there is none.
+
+    :param built: Maps ending names to the (Material, stats index, tables) of the endings already built.
+    """
+    ranks = np.full(material.positions, _NO_CAPTURE, dtype=np.int16)
+    for pair, outcome in zip(material.captures, signature):
+        positions, won, lost = graph.captures[pair]
+        if not len(positions):
+            continue
+        if outcome == WIN:
+            values = np.ones(len(positions), dtype=np.int16)
+        elif outcome == LOSS:
+            values = -np.ones(len(positions), dtype=np.int16)
+        else:
+            attacker_won, table = outcome
+            tables = built[material.without(pair[1] if attacker_won else pair[0])][2]
+            values = _back(tables[table][won if attacker_won else lost])
+        ranks[positions] = np.maximum(ranks[positions], _rank(values))
+    return ranks
+
+
+def retrograde(graph, capture_ranks, positions):
+    """
+    Solve every position of one table by retrograde analysis: a position is won in n moves if
+    some move leads to a position lost in n - 1 (or a capture wins in n), and lost in n if every
+    move leads to a won position and the longest of those losses takes n moves. Whatever is left
+    when nothing changes any more is a draw.
+
+    :param graph: The ending's MoveGraph.
+    :param capture_ranks: The rank of the best capture in each position, from _capture_ranks.
+    :param positions: The size of the table.
+    :return: An int8 array of values.
+    """
+    valid, starts, targets = graph.valid, graph.starts, graph.targets
+    values = np.zeros(positions, dtype=np.int8)
+    captures = capture_ranks[valid].astype(np.int32)
+    capture_win = np.where(captures > 0, _RANK_WIN - captures, 0)
+    capture_loss = np.where((captures < 0) & (captures > _NO_CAPTURE), captures + _RANK_WIN, 0)
+    capture_holds = captures >= 0
+    solved = np.zeros(len(valid), dtype=bool)
+    last = int(max(capture_win.max(initial=0), capture_loss.max(initial=0)))
+
+    distance = 0
+    while True:
+        distance += 1
+        if distance > MAX_DISTANCE:
+            raise ValueError(f"A position takes more than {MAX_DISTANCE} moves to decide")
+        after = values[targets]
+        wins = capture_win == distance
+        if distance > 1:
+            wins |= np.logical_or.reduceat(after == -(distance - 1), starts)
+        wins &= ~solved
+        all_won = np.logical_and.reduceat(after > 0, starts)
+        longest = np.maximum(np.maximum.reduceat(after, starts).astype(np.int32) + 1, capture_loss)
+        losses = ~solved & ~wins & ~capture_holds & all_won & (longest <= distance)
+
+        values[valid[wins]] = distance
+        values[valid[losses]] = -longest[losses]
+        solved |= wins | losses
+        if distance > last and not wins.any() and not losses.any():
+            return values
+
+
+def build(names=None, log=None):
+    """
+    Build the tables of some endings and of the smaller endings they need.
+
+    :param names: Ending names (default ENDINGS).
+    :param log: Called with a line of progress text, if given.
+    :return: A list of (Material, stats index array, list of value arrays), smaller endings first.
+    """
+    materials = {}
+    for name in names or ENDINGS:
+        material = Material(name)
+        pending = [material]
+        while pending:
+            material = pending.pop()
+            materials[material.name] = material
+            for number, (_, piece_class) in enumerate(material.pieces):
+                if piece_class is not King and material.without(number) not in materials:
+                    pending.append(Material(material.without(number)))
+
+    built = {}
+    results = []
+    for material in sorted(materials.values(), key=lambda material: material.count):
+        started = time.perf_counter()
+        graph = MoveGraph(material)
+        cache = {}
+        smaller = {name: (built[name][0], built[name][1]) for name in built}
+        signatures = {}
+        stats_index = np.empty(material.stats_count, dtype=np.uint16)
+        for number, stats in enumerate(material.iter_stats()):
+            signature = _signature(material, stats, smaller, cache)
+            stats_index[number] = signatures.setdefault(signature, len(signatures))
+
+        tables = [retrograde(graph, _capture_ranks(material, graph, signature, built), material.positions)
+                  for signature in signatures]
+        built[material.name] = (material, stats_index, tables)
+        results.append(built[material.name])
+        if log is not None:
+            log(f"{material.name}: {material.stats_count} health and uses vectors, {len(tables)} tables, "
+                f"{len(graph.valid)} positions each, {time.perf_counter() - started:.1f}s")
+    return results
+
+
+def write_tablebase(path, endings):
+    """
+    Write built endings to a tablebase file.
+
+    :param endings: What build returns.
+    """
+    directory = {'piece_stats': {piece_class.__name__: list(piece_class.stats) for piece_class in PIECE_TYPES},
+                 'endings': {}}
+    offset = 0
+    for material, stats_index, tables in endings:
+        directory['endings'][material.name] = {'stats': offset, 'tables': offset + stats_index.nbytes,
+                                               'count': len(tables)}
+        offset += stats_index.nbytes + len(tables) * material.positions
+    text = json.dumps(directory).encode()
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, 0, len(text)) + text)
+        file.write(bytes(-file.tell() % 8))
+        for material, stats_index, tables in endings:
+            file.write(stats_index.astype('<u2').tobytes())
+            for values in tables:
+                file.write(values.tobytes())
+
+
+class Ending:
+    __slots__ = ('material', 'stats', 'values')
+
+    def __init__(self, material, stats, values):
+        """
+        One ending of an open tablebase: its Material, its stats index and its tables, both
+        memoryviews into the file's map.
+        """
+        self.material = material
+        self.stats = stats
+        self.values = values
+
+
+class Tablebase:
+    def __init__(self, path):
+        """
+        Open a tablebase file through a memory map.
+
+        :param path: The file to read.
+        """
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, _, length = _HEADER.unpack_from(self.map, 0)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} tablebase file.")
+        directory = json.loads(bytes(self.map[_HEADER.size:_HEADER.size + length]))
+        current = {piece_class.__name__: list(piece_class.stats) for piece_class in PIECE_TYPES}
+        if directory['piece_stats'] != current:
+            self.close()
+            raise ValueError(f"{path} was built for different piece stats.")
+
+        data = _HEADER.size + length
+        data += -data % 8
+        view = memoryview(self.map)
+        self.endings = {}
+        for name, entry in directory['endings'].items():
+            material = Material(name)
+            stats = view[data + entry['stats']:data + entry['tables']].cast('H')
+            values = view[data + entry['tables']:data + entry['tables'] + entry['count'] * material.positions]
+            self.endings[name] = Ending(material, stats, values.cast('b'))
+        self.max_pieces = max((ending.material.count for ending in self.endings.values()), default=0)
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, state):
+        """
+        Look up a position of a GameState with no battle in progress.
+
+        :return: The value for the player to move (see the module docstring), or None if the
+                 position's ending is not in the tablebase.
+        """
+        self.probes += 1
+        squares = state.index.squares
+        if len(squares['white']) + len(squares['black']) > self.max_pieces:
+            return None
+        for strong in COLORS:
+            # Endings are stored with white as the side with more pieces; mirror the board
+            # top to bottom and swap colors to look up the others
+            weak = opponent(strong)
+            pieces = (sorted(squares[strong].items(), key=_piece_order) +
+                      sorted(squares[weak].items(), key=_piece_order))
+            name = ("".join(piece.stats.symbol for _, piece in pieces[:len(squares[strong])]) + "v" +
+                    "".join(piece.stats.symbol for _, piece in pieces[len(squares[strong]):]))
+            ending = self.endings.get(name)
+            if ending is not None:
+                break
+        else:
+            return None
+
+        material = ending.material
+        code = 0
+        stats = 0
+        for ((row, col), piece), unit, buckets, uses in zip(pieces, material.units, material.buckets, material.uses):
+            code = code * 64 + (row if strong == 'white' else 7 - row) * 8 + col
+            stats = (stats * buckets + (-(-piece.health // unit)) - 1) * uses + piece.special_uses
+        table = ending.stats[stats]
+        self.hits += 1
+        return ending.values[table * material.positions + code * 2 + (state.turn != strong)]
+
+    def move_values(self, state):
+        """
+        Value every legal move of a position in the tablebase, playing captures out with the
+        solver's attacks.
+
+        :return: A list of (value for the player moving, move), or None if some position after
+                 a move is not in the tablebase.
+        """
+        mover = state.turn
+        moves = []
+        for move in state.legal_moves():
+            state.make_move(move[0], move[1], best_attack_choice)
+            if state.winner is not None:
+                value = 1 if state.winner == mover else -1
+            else:
+                value = self.probe(state)
+                if value is not None:
+                    value = back_value(value)
+            state.unmake_move()
+            if value is None:
+                return None
+            moves.append((value, move))
+        return moves
+
+    def best_move(self, state):
+        """
+        Return the move with the best value, or None if the position is not covered.
+        """
+        if self.probe(state) is None:
+            return None
+        moves = self.move_values(state)
+        if not moves:
+            return None
+        return max(moves, key=lambda item: value_rank(item[0]))[1]
+
+    def close(self):
+        for ending in getattr(self, 'endings', {}).values():
+            ending.stats.release()
+            ending.values.release()
+        self.endings = {}
+        if not self.map.closed:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _piece_order(item):
+    return TYPE_ORDER[item[1].name]
+
+
+def random_position(material, rng, mirror=False):
+    """
+    Set up a random position of an ending on a GameState, with random health and uses.
+
+    :param mirror: Put the ending's white pieces on the black side, mirrored top to bottom.
+    """
+    board = [[None] * 8 for _ in range(8)]
+    for (color, piece_class), square in zip(material.pieces, rng.sample(range(64), material.count)):
+        row, col = divmod(square, 8)
+        if mirror:
+            color, row = opponent(color), 7 - row
+        piece = piece_class(color)
+        piece.health = rng.randint(1, piece_class.stats.health)
+        piece.special_uses = rng.randint(0, piece_class.stats.special_uses)
+        board[row][col] = piece
+    return GameState(board, rng.choice(COLORS))
+
+
+def verify(tablebase, samples=1000, seed=0):
+    """
+    Check random positions against the game itself: the value of a position has to be the best
+    value among its moves, each made with GameState.make_move and its battle fought with the
+    solver's attacks, at exact (not bucketed) health, in both color orientations.
+
+    :return: The number of positions whose value did not match.
+    """
+    rng = random.Random(seed)
+    names = sorted(tablebase.endings)
+    mismatches = 0
+    for _ in range(samples):
+        state = random_position(tablebase.endings[rng.choice(names)].material, rng, mirror=rng.random() < 0.5)
+        value = tablebase.probe(state)
+        moves = tablebase.move_values(state)
+        best = max(value_rank(move_value) for move_value, _ in moves)
+        if value is None or best != value_rank(value):
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, check and time BattleBoards endgame tablebases.")
+    parser.add_argument('path', help="the tablebase file")
+    parser.add_argument('endings', nargs='*', help=f"endings to build (default: {' '.join(ENDINGS)})")
+    parser.add_argument('--build', action='store_true', help="build the tablebase file")
+    parser.add_argument('--verify', type=int, metavar='N', help="check N random positions against the game")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.build:
+        write_tablebase(args.path, build(args.endings or None, log=print))
+
+    with Tablebase(args.path) as tablebase:
+        rng = random.Random(args.seed)
+        for name, ending in sorted(tablebase.endings.items(), key=lambda item: item[1].material.count):
+            material = ending.material
+            tables = len(ending.values) // material.positions
+            wins = draws = losses = 0
+            for _ in range(10000):
+                value = tablebase.probe(random_position(material, rng))
+                wins += value > 0
+                draws += value == 0
+                losses += value < 0
+            print(f"{name}: {material.stats_count} vectors in {tables} tables; random positions "
+                  f"{wins / 100:.0f}% won, {draws / 100:.0f}% drawn, {losses / 100:.0f}% lost for the side to move")
+
+        states = [random_position(tablebase.endings[name].material, rng, mirror=rng.random() < 0.5)
+                  for name in itertools.islice(itertools.cycle(sorted(tablebase.endings)), 1000)]
+        started = time.perf_counter()
+        for state in states * 20:
+            tablebase.probe(state)
+        elapsed = time.perf_counter() - started
+        print(f"{elapsed / (len(states) * 20) * 1e6:.2f} us per probe")
+
+        if args.verify:
+            mismatches = verify(tablebase, args.verify, args.seed)
+            print(f"{args.verify} random positions checked against the game, {mismatches} mismatches")
+
+
+if __name__ == "__main__":
+    main()
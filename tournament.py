@@ -0,0 +1,265 @@
+"""
+Self-play tournament runner for BattleBoards.
+
+Games are spread over a process pool. Every game gets its own seed derived
+from the tournament seed and its game number, so any single game can be
+replayed on its own. Results stream back to the parent as they finish and
+are folded into a running summary, so memory use does not grow with the
+number of games.
+
+Example:
+    python tournament.py --games 1000 --white random --black alphabeta --depth 2
+    python tournament.py --games 100 --white mcts --black alphabeta --playouts 500
+    python tournament.py --games 500 --white alphabeta --black alphabeta --book book.bbob --record batch.bbgr
+"""
+
+import argparse
+import json
+import random
+import time
+from multiprocessing import Pool, cpu_count
+
+from BattleBoards import GameState
+
+PLAYER_TYPES = ('random', 'alphabeta', 'mcts')
+
+# Opening books opened in this process, by path, shared by the games it plays
+_BOOKS = {}
+
+
+class RandomPlayer:
+    def __init__(self, seed=None):
+        """
+        Create a player that picks uniformly among legal moves and attack choices.
+
+        :param seed: The random seed, so games can be replayed.
+        """
+        self.rng = random.Random(seed)
+
+    def choose_move(self, state):
+        moves = state.legal_moves()
+        return self.rng.choice(moves) if moves else None
+
+    def choose_attack(self, state):
+        return self.rng.choice(state.battle.attack_choices())
+
+
+def make_player(kind, seed, depth=2, playouts=200, book=None):
+    """
+    Create a player by name.
+
+    :param kind: 'random', 'alphabeta' or 'mcts'.
+    :param seed: The seed for players that make random choices.
+    :param depth: The search depth for 'alphabeta'.
+    :param playouts: The playouts per move for 'mcts'.
+    :param book: The path of an opening book for 'alphabeta' (see book.py), or None.
+    """
+    if kind == 'random':
+        return RandomPlayer(seed)
+    if kind == 'alphabeta':
+        from search import AlphaBetaPlayer
+        opening_book = None
+        if book is not None:
+            opening_book = _BOOKS.get(book)
+            if opening_book is None:
+                from book import OpeningBook
+                opening_book = _BOOKS[book] = OpeningBook(book)
+        return AlphaBetaPlayer(max_depth=depth, tt_size=1 << 16, book=opening_book)
+    if kind == 'mcts':
+        from mcts import MCTSPlayer
+        return MCTSPlayer(playouts=playouts, seed=seed)
+    raise ValueError(f"Unknown player type: {kind}")
+
+
+def play_one_game(players, max_moves=500, state=None, recorder=None):
+    """
+    Play a game between two players without any console output.
+
+    :param players: A dictionary mapping 'white' and 'black' to players.
+    :param max_moves: The number of moves after which the game counts as a draw, once any battle
+                      in progress is over.
+    :param state: The GameState to play on, or None for the initial position.
+    :param recorder: A gamerecord.GameRecorder for the state, given every event.
+    :return: A dictionary with the winner (None for a draw), moves, battles and pieces lost per color.
+    """
+    state = GameState() if state is None else state
+    pieces_lost = {'white': 0, 'black': 0}
+
+    # A battle started before the move cap is always fought to the end
+    while state.result() is None and (state.move_count < max_moves or state.battle is not None):
+        if state.battle is not None:
+            player = players[state.battle.current.color]
+            events = state.apply_attack_choice(player.choose_attack(state))
+        else:
+            move = players[state.turn].choose_move(state)
+            if move is None:
+                # The player to move cannot move; the game counts as a draw
+                break
+            events = state.apply_move(*move)
+
+        if recorder is not None:
+            recorder.observe(events)
+        for event in events:
+            if event['type'] == 'piece_removed':
+                pieces_lost[event['piece'].color] += 1
+
+    return {
+        'winner': state.result(),
+        'moves': state.move_count,
+        'battles': state.battle_count,
+        'pieces_lost': pieces_lost,
+    }
+
+
+def _run_game(job):
+    game, seed, white, black, depth, playouts, max_moves, profile, record, book = job
+    players = {
+        'white': make_player(white, seed * 2, depth, playouts, book),
+        'black': make_player(black, seed * 2 + 1, depth, playouts, book),
+    }
+    if profile:
+        import instrumentation
+        instrumentation.enable()
+    state = GameState()
+    recorder = None
+    if record:
+        from gamerecord import GameRecorder, encode_game
+        recorder = GameRecorder(state, tag=game)
+    result = play_one_game(players, max_moves, state, recorder)
+    result['game'] = game
+    result['seed'] = seed
+    if record:
+        result['record'] = encode_game(recorder.record())
+    if profile:
+        result['profile'] = instrumentation.raw_snapshot()
+        instrumentation.reset()
+    return result
+
+
+class TournamentSummary:
+    def __init__(self):
+        """
+        Running totals over the games of a tournament.
+        """
+        self.games = 0
+        self.wins = {'white': 0, 'black': 0, None: 0}
+        self.total_moves = 0
+        self.total_battles = 0
+        self.pieces_lost = {'white': 0, 'black': 0}
+        self.shortest = None
+        self.longest = None
+
+    def add(self, result):
+        self.games += 1
+        self.wins[result['winner']] += 1
+        self.total_moves += result['moves']
+        self.total_battles += result['battles']
+        for color, lost in result['pieces_lost'].items():
+            self.pieces_lost[color] += lost
+        self.shortest = result['moves'] if self.shortest is None else min(self.shortest, result['moves'])
+        self.longest = result['moves'] if self.longest is None else max(self.longest, result['moves'])
+
+    def as_dict(self):
+        games = self.games or 1
+        return {
+            'games': self.games,
+            'white_wins': self.wins['white'],
+            'black_wins': self.wins['black'],
+            'draws': self.wins[None],
+            'mean_moves': self.total_moves / games,
+            'shortest_game': self.shortest,
+            'longest_game': self.longest,
+            'mean_battles': self.total_battles / games,
+            'mean_pieces_lost': {color: lost / games for color, lost in self.pieces_lost.items()},
+        }
+
+
+def run_tournament(games, white='random', black='random', depth=2, seed=0, max_moves=500,
+                   workers=None, on_result=None, profile=False, record=None, playouts=200, book=None):
+    """
+    Play a number of games across a process pool.
+
+    :param games: The number of games to play.
+    :param white: The player type for white.
+    :param black: The player type for black.
+    :param depth: The search depth for 'alphabeta' players.
+    :param seed: The tournament seed; game n is played with seed + n.
+    :param max_moves: The number of moves after which a game counts as a draw.
+    :param workers: The number of worker processes (defaults to the CPU count).
+    :param on_result: Called with each game's result as it arrives.
+    :param profile: Instrument the workers and merge their numbers into this process's instrumentation.
+    :param record: A gamerecord.GameWriter to store every game in, tagged with its game number,
+                   in the order games finish.
+    :param playouts: The playouts per move for 'mcts' players.
+    :param book: The path of an opening book for 'alphabeta' players, or None.
+    :return: The TournamentSummary.
+    """
+    workers = workers or cpu_count()
+    jobs = ((game, seed + game, white, black, depth, playouts, max_moves, profile, record is not None, book)
+            for game in range(games))
+    summary = TournamentSummary()
+
+    with Pool(workers) as pool:
+        chunksize = max(1, min(64, games // (workers * 8)))
+        for result in pool.imap_unordered(_run_game, jobs, chunksize=chunksize):
+            if profile:
+                import instrumentation
+                instrumentation.merge(result.pop('profile'))
+            if record is not None:
+                record.write_encoded(result.pop('record'))
+            summary.add(result)
+            if on_result is not None:
+                on_result(result)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a BattleBoards self-play tournament.")
+    parser.add_argument('--games', type=int, default=100, help="number of games to play")
+    parser.add_argument('--white', choices=PLAYER_TYPES, default='random', help="player type for white")
+    parser.add_argument('--black', choices=PLAYER_TYPES, default='random', help="player type for black")
+    parser.add_argument('--depth', type=int, default=2, help="search depth for alphabeta players")
+    parser.add_argument('--playouts', type=int, default=200, help="playouts per move for mcts players")
+    parser.add_argument('--seed', type=int, default=0, help="tournament seed")
+    parser.add_argument('--max-moves', type=int, default=500, help="moves before a game is a draw")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--output', help="write one JSON line per game to this file")
+    parser.add_argument('--profile', action='store_true', help="time the engine's hot paths and print a report")
+    parser.add_argument('--profile-output', help="also write the profiling numbers to this JSON file")
+    parser.add_argument('--record', help="store every game in this game record file (see gamerecord.py)")
+    parser.add_argument('--book', help="let alphabeta players play openings from this book file (see book.py)")
+    args = parser.parse_args()
+    profile = args.profile or bool(args.profile_output)
+
+    output = open(args.output, 'w') if args.output else None
+    on_result = (lambda result: output.write(json.dumps(result) + "\n")) if output else None
+    record = None
+    if args.record:
+        from gamerecord import GameWriter
+        record = GameWriter(args.record)
+
+    started = time.perf_counter()
+    summary = run_tournament(args.games, args.white, args.black, args.depth, args.seed,
+                             args.max_moves, args.workers, on_result, profile, record, args.playouts, args.book)
+    elapsed = time.perf_counter() - started
+
+    if output:
+        output.close()
+    if record:
+        record.close()
+
+    report = summary.as_dict()
+    report['seconds'] = elapsed
+    report['games_per_sec'] = summary.games / elapsed if elapsed > 0 else 0.0
+    print(json.dumps(report, indent=2))
+
+    if profile:
+        import instrumentation
+        print(instrumentation.report())
+        if args.profile_output:
+            instrumentation.export_json(args.profile_output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Large-board variants of BattleBoards.
+
+The engine in BattleBoards.py is fixed at 8x8: its precomputed move
+tables, MoveCache, bitboards and Zobrist keys all assume 64 squares.
+Variants play the same pieces, moves and battles on an N x N board whose
+position is stored sparsely, as a dictionary from square number
+(row * size + col) to piece for the whole board and one for each side.
+
+Tables for an N x N board would grow with N^3 (every square's rays), so
+moves are generated from the engine's offsets and directions with bounds
+checks instead, visiting only the pieces of the side to move. On 8x8 the
+moves and battle results are checked against the engine after every move
+of seeded random games.
+
+A sparse position costs memory per piece rather than per square, which
+pays off once a board is mostly empty: a dictionary entry costs about ten
+times a grid slot, so boards at least a tenth full are smaller as a plain
+grid. Two starting layouts are provided:
+    ranks       the back rank R N B Q K B N R repeated across the width,
+                with a King only in the middle copy (Knights take the other
+                King squares), and one row of Pawns; pieces grow with the width
+    centred     the 32 pieces of the 8x8 game in the middle of the board;
+                pieces stay the same however large the board
+
+Example:
+    python variants.py --size 16 --games 5
+    python variants.py --size 64 --layout centred --games 2
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from BattleBoards import (DIAGONAL_DIRECTIONS, KING_OFFSETS, KNIGHT_OFFSETS, ORTHOGONAL_DIRECTIONS,
+                          PAWN_CAPTURE_OFFSETS, PAWN_STEP_OFFSETS, Bishop, GameState, King, Knight, Pawn,
+                          Queen, Rook, convert_to_position, initialize_board, legal_moves, opponent)
+from solver import best_attack_choice, fight
+
+LAYOUTS = ('ranks', 'centred')
+BACK_RANK = [Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook]
+_KING_STEPS = [offset for offset in KING_OFFSETS if offset != (0, 0)]
+_QUEEN_DIRECTIONS = ORTHOGONAL_DIRECTIONS + DIAGONAL_DIRECTIONS
+
+
+class SparseBoard:
+    __slots__ = ('size', 'squares', 'sides')
+
+    def __init__(self, size):
+        """
+        Create an empty size x size board.
+
+        squares maps the number (row * size + col) of every occupied square to its piece,
+        and sides[color] maps the squares of that side's pieces to the pieces.
+        """
+        self.size = size
+        self.squares = {}
+        self.sides = {'white': {}, 'black': {}}
+
+    def place(self, square, piece):
+        self.squares[square] = piece
+        self.sides[piece.color][square] = piece
+
+    def remove(self, square):
+        piece = self.squares.pop(square)
+        del self.sides[piece.color][square]
+        return piece
+
+    def move(self, start, end):
+        """
+        Move the piece on start to the empty square end.
+        """
+        self.place(end, self.remove(start))
+
+    def nbytes(self):
+        """
+        Return the memory held by the position, not counting the pieces: the dictionaries and
+        the square numbers too large to be shared by the interpreter.
+        """
+        size = sys.getsizeof(self.squares) + sum(sys.getsizeof(side) for side in self.sides.values())
+        return size + sum(sys.getsizeof(square) for square in self.squares if square > 256)
+
+    def to_grid(self):
+        """
+        Return the board as a dense 2D list, the representation BattleBoards uses.
+        """
+        grid = [[None] * self.size for _ in range(self.size)]
+        for square, piece in self.squares.items():
+            grid[square // self.size][square % self.size] = piece
+        return grid
+
+    @classmethod
+    def from_grid(cls, grid):
+        board = cls(len(grid))
+        for row, pieces in enumerate(grid):
+            for col, piece in enumerate(pieces):
+                if piece is not None:
+                    board.place(row * board.size + col, piece)
+        return board
+
+
+def grid_bytes(grid):
+    """
+    Return the memory held by a dense 2D list board, not counting the pieces.
+    """
+    return sys.getsizeof(grid) + sum(sys.getsizeof(row) for row in grid)
+
+
+def _jumps(color, row, col, offsets, board, targets):
+    size, squares = board.size, board.squares
+    for dr, dc in offsets:
+        end_row, end_col = row + dr, col + dc
+        if 0 <= end_row < size and 0 <= end_col < size:
+            end = end_row * size + end_col
+            target = squares.get(end)
+            if target is None or target.color != color:
+                targets.append(end)
+
+
+def _slides(color, row, col, directions, board, targets, stop):
+    size, squares = board.size, board.squares
+    for dr, dc in directions:
+        end_row, end_col = row + dr, col + dc
+        while 0 <= end_row < size and 0 <= end_col < size:
+            end = end_row * size + end_col
+            target = squares.get(end)
+            if target is None or target.color != color:
+                targets.append(end)
+            if stop and target is not None:
+                break
+            end_row, end_col = end_row + dr, end_col + dc
+
+
+def piece_targets(piece, square, board):
+    """
+    Return the squares a piece may move to on a SparseBoard, by the rules of the pieces'
+    iter_moves: Rooks take their whole rank and file whatever stands in the way, Bishops
+    and Queens stop at the first piece, Pawns step forward or backward and move diagonally
+    only onto an enemy. Squares held by the piece's own side are left out.
+
+    :param square: The piece's square number.
+    :return: A list of square numbers.
+    """
+    color = piece.color
+    row, col = divmod(square, board.size)
+    kind = type(piece)
+    targets = []
+    if kind is King:
+        _jumps(color, row, col, _KING_STEPS, board, targets)
+    elif kind is Knight:
+        _jumps(color, row, col, KNIGHT_OFFSETS, board, targets)
+    elif kind is Rook:
+        _slides(color, row, col, ORTHOGONAL_DIRECTIONS, board, targets, stop=False)
+    elif kind is Bishop:
+        _slides(color, row, col, DIAGONAL_DIRECTIONS, board, targets, stop=True)
+    elif kind is Queen:
+        _slides(color, row, col, _QUEEN_DIRECTIONS, board, targets, stop=True)
+    else:
+        _jumps(color, row, col, PAWN_STEP_OFFSETS, board, targets)
+        captures = []
+        _jumps(color, row, col, PAWN_CAPTURE_OFFSETS, board, captures)
+        targets.extend(end for end in captures if end in board.squares)
+    return targets
+
+
+def initial_board(size, layout='ranks'):
+    """
+    Set up the starting position of a size x size variant (size 8 or more).
+
+    :param layout: 'ranks' or 'centred' (see the module docstring).
+    :return: A SparseBoard.
+    """
+    if size < 8:
+        raise ValueError("Variant boards are at least 8x8")
+    board = SparseBoard(size)
+    if layout == 'centred':
+        offset = (size - 8) // 2
+        for row, pieces in enumerate(initialize_board()):
+            for col, piece in enumerate(pieces):
+                if piece is not None:
+                    board.place((row + offset) * size + col + offset, piece)
+        return board
+    if layout != 'ranks':
+        raise ValueError(f"Unknown layout: {layout}")
+
+    king_col = (size // 8) // 2 * 8 + 4
+    for col in range(size):
+        piece_class = BACK_RANK[col % 8]
+        if piece_class is King and col != king_col:
+            piece_class = Knight
+        board.place(col, piece_class('black'))
+        board.place((size - 1) * size + col, piece_class('white'))
+        board.place(size + col, Pawn('black'))
+        board.place((size - 2) * size + col, Pawn('white'))
+    return board
+
+
+class VariantGame:
+    def __init__(self, size=16, board=None, turn='white', layout='ranks'):
+        """
+        A game on a variant board, played with method calls. Battles are fought with the
+        solver's optimal attacks, as the computer players fight them.
+
+        :param size: The board size, used when board is None.
+        :param board: A SparseBoard, or None for initial_board(size, layout).
+        :param turn: The player to move.
+        """
+        self.board = initial_board(size, layout) if board is None else board
+        self.size = self.board.size
+        self.turn = turn
+        self.winner = None
+        self.move_count = 0
+        self.battle_count = 0
+
+    def legal_moves(self):
+        """
+        Return every move of the player to move, visiting only that player's pieces.
+
+        :return: A list of (start, end) square number pairs.
+        """
+        if self.winner is not None:
+            return []
+        board = self.board
+        moves = []
+        for start, piece in board.sides[self.turn].items():
+            moves.extend((start, end) for end in piece_targets(piece, start, board))
+        return moves
+
+    def play(self, start, end):
+        """
+        Play a move from legal_moves, fighting out the battle of a capture.
+
+        :return: True if the move started a battle.
+        """
+        board = self.board
+        target = board.squares.get(end)
+        self.move_count += 1
+        if target is None:
+            board.move(start, end)
+            self.turn = opponent(self.turn)
+            return False
+
+        battle = fight(board.squares[start], target)
+        self.battle_count += 1
+        if battle.winner is battle.attacker:
+            board.remove(end)
+            board.move(start, end)
+        else:
+            board.remove(start)
+        if isinstance(battle.loser, King):
+            self.winner = battle.winner.color
+        else:
+            self.turn = opponent(self.turn)
+        return True
+
+    def result(self):
+        return self.winner
+
+
+def play_random_game(size, seed=0, max_moves=2000, layout='ranks'):
+    """
+    Play a game of random moves with optimal battles on a variant board.
+
+    :return: The finished (or abandoned) VariantGame.
+    """
+    rng = random.Random(seed)
+    game = VariantGame(size, layout=layout)
+    while game.winner is None and game.move_count < max_moves:
+        moves = game.legal_moves()
+        if not moves:
+            break
+        game.play(*rng.choice(moves))
+    return game
+
+
+def check_against_engine(games=10, seed=0):
+    """
+    Play random games on an 8x8 variant board next to a GameState and check after every move
+    that both list the same moves and agree on the winner.
+    """
+    rng = random.Random(seed)
+    for _ in range(games):
+        state = GameState()
+        # Its own pieces, so each side fights its own (deterministic) battles
+        game = VariantGame(board=SparseBoard.from_grid(GameState().board))
+        while state.result() is None and state.move_count < 300:
+            expected = sorted(legal_moves(state.board, state.turn))
+            moves = sorted((divmod(start, 8), divmod(end, 8)) for start, end in game.legal_moves())
+            if moves != expected:
+                raise AssertionError(f"Moves differ from the engine after {state.move_count} moves")
+            start, end = rng.choice(expected)
+            state.make_move(start, end, best_attack_choice)
+            game.play(start[0] * 8 + start[1], end[0] * 8 + end[1])
+            if game.winner != state.winner or game.turn != state.turn:
+                raise AssertionError(f"Results differ from the engine after {state.move_count} moves")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play random games on large BattleBoards variants.")
+    parser.add_argument('--size', type=int, default=16, help="rows and columns of the board")
+    parser.add_argument('--layout', choices=LAYOUTS, default='ranks', help="the starting position")
+    parser.add_argument('--games', type=int, default=3, help="random games to play")
+    parser.add_argument('--max-moves', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    check_against_engine(seed=args.seed)
+    board = initial_board(args.size, args.layout)
+    kings = ', '.join(convert_to_position(*divmod(square, args.size), args.size)
+                      for square, piece in board.squares.items() if isinstance(piece, King))
+    print(f"{args.size}x{args.size}: {len(board.squares)} pieces, Kings on {kings}; position "
+          f"{board.nbytes()} bytes sparse, {grid_bytes(board.to_grid())} bytes as a grid")
+    for number in range(args.games):
+        started = time.perf_counter()
+        game = play_random_game(args.size, args.seed + number, args.max_moves, args.layout)
+        elapsed = time.perf_counter() - started
+        print(f"game {number}: {game.winner or 'unfinished'} after {game.move_count} moves, "
+              f"{game.battle_count} battles, {game.move_count / elapsed:.0f} moves/sec")
+
+
+if __name__ == "__main__":
+    main()